@@ -1,33 +1,99 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import os
+import base64
 from dotenv import load_dotenv
-import google.generativeai as genai
 from datetime import datetime, timedelta
 import json
 import time
-from src.chatbot.chatbot import MedicalChatbot
-from src.voice.voice_assistant import VoiceAssistant
-from src.document.document_processor import DocumentProcessor
-from src.location.location_services import LocationServices
-from src.utils.utils import save_chat_history, format_timestamp
+from src.api.sessions import issue_session, is_valid_token, session_token
+from src.chatbot.chatbot import Conversation
+from src.document.lab_parser import format_reference
+from src.document.report_analysis import cache_extraction, cached_extraction, extract_report
+from src.services.services import (
+    get_chatbot,
+    get_voice_assistant,
+    get_document_processor,
+    get_location_services,
+    get_document_cache,
+    get_report_store,
+    start_warm_up
+)
+from src.document.report_store import UploadTooLarge
+from src.location.location_services import LocationNotFound
+from src.utils.utils import (
+    append_chat_messages,
+    claim_legacy_session,
+    count_chat_messages,
+    load_chat_history_range,
+    format_timestamp
+)
+from src.utils.rate_limiter import rate_limiter_stats
+from src.utils.metrics import record_error, start_trace, start_metrics_server
 import glob
 
 
 # Load environment variables
 load_dotenv()
 
-# Function to load chat history
-def load_most_recent_chat():
-    try:
-        chat_file = 'data/chats/chat_history.json'
-        if not os.path.exists(chat_file):
-            return []
-        
-        with open(chat_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception as e:
-        st.error(f"Error loading chat history: {str(e)}")
-        return []
+# Number of most recent messages kept in a session; older ones stay in the
+# history store and are paged back in when the transcript is expanded
+CHAT_HISTORY_TAIL = 50
+
+# Number of messages rendered per transcript page
+CHAT_PAGE_SIZE = 20
+
+# Number of earlier pages that can be loaded into the transcript at once
+MAX_TRANSCRIPT_PAGES = 10
+
+# Number of uploaded reports remembered per session
+MAX_SESSION_UPLOADS = 10
+
+# Browser cookie holding the signed session id, so a reload resumes the chat
+SESSION_COOKIE = 'medical_chatbot_session'
+SESSION_COOKIE_DAYS = 30
+
+def resume_session():
+    """Return the session id of the browser's session cookie, or start a new session"""
+    session_id, _, token = st.context.cookies.get(SESSION_COOKIE, '').partition('.')
+    if is_valid_token(session_id, token):
+        return session_id
+    # The history imported from the old single-file store goes to the first browser
+    session_id = claim_legacy_session() or issue_session()[0]
+    remember_session(session_id)
+    return session_id
+
+def remember_session(session_id):
+    """Set the session cookie; it carries an HMAC token, so ids cannot be guessed or forged"""
+    value = f"{session_id}.{session_token(session_id)}"
+    components.html(
+        f"""<script>
+        window.parent.document.cookie = "{SESSION_COOKIE}={value}; path=/; max-age={SESSION_COOKIE_DAYS * 86400}; SameSite=Strict"
+            + (window.parent.location.protocol === "https:" ? "; Secure" : "");
+        </script>""",
+        height=0
+    )
+
+# Function to load chat history; returns (store index of the first message, messages)
+def load_most_recent_chat(session_id):
+    count = count_chat_messages(session_id)
+    if isinstance(count, str):
+        st.error(count)
+        return 0, []
+    start = max(0, count - CHAT_HISTORY_TAIL)
+    history = load_chat_history_range(session_id, start, count)
+    if isinstance(history, str):
+        st.error(history)
+        return count, []
+    # Fewer come back when the start of the session was compacted away
+    return count - len(history), add_display_times(history)
+
+def add_display_times(messages):
+    # Format timestamps once here rather than on every rerun
+    for message in messages:
+        if "display_time" not in message:
+            message["display_time"] = format_timestamp(message["timestamp"])
+    return messages
 
 # Configure Streamlit page
 st.set_page_config(
@@ -37,30 +103,160 @@ st.set_page_config(
 )
 
 # Initialize session state
+if 'session_id' not in st.session_state:
+    # The id travels in a cookie rather than the URL: anyone holding it could
+    # read the conversation, so it must never end up in a link that is shared or logged
+    st.session_state.session_id = resume_session()
 if 'chat_history' not in st.session_state:
-    st.session_state.chat_history = load_most_recent_chat()
+    st.session_state.history_start, st.session_state.chat_history = load_most_recent_chat(st.session_state.session_id)
+if 'conversation' not in st.session_state:
+    st.session_state.conversation = Conversation.from_history(st.session_state.chat_history)
+if 'transcript_start' not in st.session_state:
+    # Store index of the first message shown. The transcript shows the latest
+    # page plus the pages the user loaded; paged-in messages from before
+    # chat_history are kept in earlier_messages
+    st.session_state.transcript_start = st.session_state.history_start + max(0, len(st.session_state.chat_history) - CHAT_PAGE_SIZE)
+    st.session_state.transcript_pages = 0
+    st.session_state.earlier_messages = []
+    # Messages before this index were compacted out of the store
+    st.session_state.transcript_floor = 0
 if 'uploaded_files' not in st.session_state:
     st.session_state.uploaded_files = []
-if 'initialized' not in st.session_state:
-    st.session_state.initialized = False
 if 'user_input' not in st.session_state:
     st.session_state.user_input = ""
-if 'last_message_time' not in st.session_state:
-    st.session_state.last_message_time = None
-if 'message_cooldown' not in st.session_state:
-    st.session_state.message_cooldown = 2  # Reduced to 2 seconds cooldown
 
 
-try:
-    if not st.session_state.initialized:
-        st.session_state.chatbot = MedicalChatbot()
-        st.session_state.voice_assistant = VoiceAssistant()
-        st.session_state.document_processor = DocumentProcessor()
-        st.session_state.location_services = LocationServices()
-        st.session_state.initialized = True
-except Exception as e:
-    st.error(f"Error initializing components: {str(e)}")
-    st.stop()
+# Pre-establish upstream connections once per server process
+warm_up_setting = os.getenv('WARM_UP_SERVICES', 'true').lower()
+if warm_up_setting not in ('', '0', 'false', 'no'):
+    if warm_up_setting in ('1', 'true', 'yes'):
+        start_warm_up()
+    elif warm_up_setting == 'all':
+        start_warm_up('all')
+    else:
+        start_warm_up(warm_up_setting.split(','))
+
+# Streamlit cannot serve extra routes, so metrics get their own port
+if os.getenv('METRICS_PORT'):
+    start_metrics_server(int(os.getenv('METRICS_PORT')), os.getenv('METRICS_HOST', '127.0.0.1'))
+
+
+def load_service(name, getter):
+    """Attach a shared service to the session, importing its subsystem on first use"""
+    if name not in st.session_state:
+        try:
+            st.session_state[name] = getter()
+        except Exception as e:
+            st.error(f"Error initializing components: {str(e)}")
+            st.stop()
+    return st.session_state[name]
+
+
+def visible_transcript():
+    """Messages from transcript_start on, without touching the history store"""
+    history_start = st.session_state.history_start
+    transcript_start = st.session_state.transcript_start
+    if transcript_start >= history_start:
+        return st.session_state.chat_history[transcript_start - history_start:]
+    return st.session_state.earlier_messages + st.session_state.chat_history
+
+
+def record_exchange(messages):
+    """Add messages to the session, keeping both the tail and the transcript bounded"""
+    state = st.session_state
+    state.chat_history.extend(messages)
+    # The window moves forward with the conversation: the latest page plus
+    # any pages the user loaded stay on screen, older messages drop off
+    end = state.history_start + len(state.chat_history)
+    state.transcript_start = max(state.transcript_start, end - CHAT_PAGE_SIZE * (1 + state.transcript_pages))
+    # Older messages are in the store now; keep the session's copy bounded.
+    # Only those still on screen (when the user has paged back) are kept
+    trimmed = state.chat_history[:-CHAT_HISTORY_TAIL]
+    if trimmed:
+        del state.chat_history[:len(trimmed)]
+        state.earlier_messages.extend(trimmed[max(0, state.transcript_start - state.history_start):])
+        state.history_start += len(trimmed)
+    shown_earlier = max(0, state.history_start - state.transcript_start)
+    del state.earlier_messages[:max(0, len(state.earlier_messages) - shown_earlier)]
+
+
+# The player lives in the page rather than in the component frame, so
+# playback carries on after the frame is removed by the next rerun
+SPEECH_PLAYER_SCRIPT = """<script>
+const page = window.parent;
+if (!page.medicalChatbotSpeech) {
+    page.medicalChatbotSpeech = new page.Function(`
+        const queue = [];
+        let playing = false;
+        function next() {
+            if (!queue.length) { playing = false; return; }
+            playing = true;
+            const audio = new Audio(queue.shift());
+            audio.onended = next;
+            audio.onerror = next;
+            audio.play().catch(next);
+        }
+        return function (clip) { queue.push(clip); if (!playing) next(); };
+    `)();
+}
+page.medicalChatbotSpeech("data:audio/mpeg;base64,{clip}");
+</script>"""
+
+
+def feed_utterance(chunks, utterance):
+    """Pass streamed text through while feeding it to a speech utterance.
+
+    Each sentence's clip is queued for playback as soon as it is ready, so
+    speech starts while the rest of the answer is still streaming.
+    """
+    for chunk in chunks:
+        utterance.feed(chunk)
+        yield chunk
+        queue_speech(utterance.ready_clips())
+
+
+def queue_speech(clips):
+    """Queue clips on the browser's player; returns at once, the browser plays them back to back"""
+    try:
+        for clip in clips:
+            components.html(SPEECH_PLAYER_SCRIPT.replace("{clip}", base64.b64encode(clip).decode('ascii')), height=0)
+    except Exception as e:
+        record_error('tts.synthesize', e)
+        print(f"Error in text-to-speech: {str(e)}")
+
+
+
+
+def render_clinic(clinic, user_location):
+    """Show one clinic, fetching directions only when they are asked for"""
+    title = f"{clinic['name']} - Rating: {clinic.get('rating', 'N/A')}"
+    if clinic.get('travel_duration'):
+        title += f" - {clinic['travel_duration']} ({clinic['travel_distance']})"
+    with st.expander(title):
+        st.write(f"Address: {clinic['address']}")
+        if clinic.get('phone'):
+            st.write(f"Phone: {clinic['phone']}")
+        if clinic.get('website'):
+            st.write(f"Website: {clinic['website']}")
+        if clinic.get('opening_hours'):
+            st.write("Opening Hours:")
+            for hours in clinic['opening_hours']:
+                st.write(f"- {hours}")
+        if st.button("Get directions", key=f"directions_{clinic['place_id']}"):
+            st.session_state.directions_for = clinic['place_id']
+        if st.session_state.get('directions_for') == clinic['place_id']:
+            # Cached per origin and clinic, so reruns from other widgets do not call the API again
+            directions = st.session_state.location_services.get_directions(
+                user_location,
+                clinic['address'],
+                place_id=clinic['place_id']
+            )
+            if isinstance(directions, str):
+                st.error(directions)
+            else:
+                st.write(f"{directions['total_distance']}, {directions['total_duration']}")
+                for step in directions['steps']:
+                    st.write(f"- {step['instruction']} ({step['distance']})")
 
 
 with st.sidebar:
@@ -79,18 +275,62 @@ with st.sidebar:
     
     user_location = st.text_input("Enter your location (for clinic suggestions)")
 
+    # Upstream requests are throttled process-wide; show how busy the queues are
+    if os.getenv('DEBUG', 'false').lower() in ('1', 'true', 'yes'):
+        with st.expander("Request queues"):
+            for api, stats in rate_limiter_stats().items():
+                st.caption(
+                    f"{api}: {stats['queue_depth']} waiting, "
+                    f"avg wait {stats['average_wait']:.2f}s, max wait {stats['max_wait']:.2f}s, "
+                    f"{stats['rejected']} rejected"
+                )
+        # Filled in at the end of the run, once this run's request has been traced
+        trace_panel = st.empty()
+
 
 st.title("Medical Assistant")
 
 
 if mode == "Chat":
+    load_service('chatbot', get_chatbot)
+    if voice_enabled:
+        load_service('voice_assistant', get_voice_assistant)
     st.subheader("Ask your health-related questions")
+    if 'pending_speech' in st.session_state:
+        queue_speech(st.session_state.pop('pending_speech').clips())
     
-    # Display chat history first
-    for message in st.session_state.chat_history:
+    # Display chat history first, only the most recent page(s) so the
+    # render cost per rerun stays bounded however long the chat gets
+    history_start = st.session_state.history_start
+    transcript_start = st.session_state.transcript_start
+    visible_messages = visible_transcript()
+    hidden_count = transcript_start - st.session_state.transcript_floor
+    if hidden_count > 0 and st.session_state.transcript_pages >= MAX_TRANSCRIPT_PAGES:
+        st.caption(f"{hidden_count} earlier messages are not shown")
+    elif hidden_count > 0:
+        if st.button(f"Load earlier messages ({hidden_count} more)"):
+            # Each page is read from the store once, when it is asked for,
+            # and dropped from the session again once it scrolls out of view
+            new_start = max(st.session_state.transcript_floor, transcript_start - CHAT_PAGE_SIZE)
+            if new_start < history_start:
+                end = min(transcript_start, history_start)
+                earlier = load_chat_history_range(st.session_state.session_id, new_start, end)
+                if isinstance(earlier, str):
+                    st.error(earlier)
+                    new_start = transcript_start
+                else:
+                    if len(earlier) < end - new_start:
+                        # The rest was compacted away
+                        new_start = st.session_state.transcript_floor = end - len(earlier)
+                    st.session_state.earlier_messages[:0] = add_display_times(earlier)
+            if new_start != transcript_start:
+                st.session_state.transcript_start = new_start
+                st.session_state.transcript_pages += 1
+                st.rerun()
+    for message in visible_messages:
         with st.chat_message(message["role"]):
             st.write(message["content"])
-            st.caption(format_timestamp(message["timestamp"]))
+            st.caption(message["display_time"])
     
     # Initialize the form key in session state if not present
     if 'form_submitted' not in st.session_state:
@@ -107,57 +347,84 @@ if mode == "Chat":
     
     # Voice input handling
     if voice_enabled:
+        voice_assistant = st.session_state.voice_assistant
+        voice_input, voice_error = None, None
         col1, col2 = st.columns([1, 5])
         with col1:
             if st.button("🎤", help="Start Voice Input"):
                 with st.spinner("Listening..."):
-                    voice_input = st.session_state.voice_assistant.listen()
-                    if voice_input and voice_input != "PyAudio is not installed. Please install PyAudio to enable voice input.":
-                        st.session_state.form_submitted = True
-                        st.session_state.last_message = voice_input
+                    voice_input, voice_error, voice_timings = voice_assistant.listen_with_timings(st.session_state.session_id)
+        with col2:
+            # Recorded in the browser, so it also works when the server has no microphone
+            recording = st.audio_input("Or record your question")
+            if recording is not None:
+                recording_bytes = recording.getvalue()
+                recording_id = hash(recording_bytes)
+                if st.session_state.get('last_recording_id') != recording_id:
+                    st.session_state.last_recording_id = recording_id
+                    with st.spinner("Transcribing..."):
+                        voice_input, voice_error, voice_timings = voice_assistant.transcribe_audio(recording_bytes)
+        if voice_input is not None or voice_error is not None:
+            if os.getenv('DEBUG', 'false').lower() in ('1', 'true', 'yes'):
+                st.caption(" | ".join(f"{stage} {seconds:.2f}s" for stage, seconds in voice_timings.items()))
+            if voice_error:
+                st.warning(voice_error)
+            else:
+                st.session_state.form_submitted = True
+                st.session_state.last_message = voice_input
     
     # Process the message if form was submitted
     if st.session_state.form_submitted:
         current_time = datetime.now()
         
-        # Check cooldown period
-        if st.session_state.last_message_time:
-            time_since_last_message = (current_time - st.session_state.last_message_time).total_seconds()
-            if time_since_last_message < st.session_state.message_cooldown:
-                st.warning(f"Please wait {st.session_state.message_cooldown - int(time_since_last_message)} seconds before sending another message.")
-                st.session_state.form_submitted = False
-                st.rerun()
-        
         try:
-            # Add user message
             new_message = {
                 "role": "user",
                 "content": st.session_state.last_message,
-                "timestamp": current_time.strftime("%Y-%m-%d %H:%M:%S")
+                "timestamp": current_time.strftime("%Y-%m-%d %H:%M:%S"),
+                "display_time": current_time.strftime("%I:%M %p")
             }
-            st.session_state.chat_history.append(new_message)
+            with st.chat_message("user"):
+                st.write(new_message["content"])
+                st.caption(new_message["display_time"])
             
-            # Get bot response
-            with st.spinner("Thinking..."):
-                response = st.session_state.chatbot.get_response(st.session_state.last_message)
-                
+            with start_trace('chat') as trace:
+                # Stream bot response; the history is only touched once the stream
+                # completes, so a cancelled run leaves no unanswered user message
+                completed = []
+                response_stream = st.session_state.chatbot.stream_response(
+                    st.session_state.last_message,
+                    conversation=st.session_state.conversation,
+                    on_complete=completed.append
+                )
+                utterance = None
+                if voice_enabled:
+                    # Sentences are synthesized in the background as they stream in
+                    utterance = st.session_state.voice_assistant.start_speech()
+                    response_stream = feed_utterance(response_stream, utterance)
+                with st.chat_message("assistant"):
+                    st.write_stream(response_stream)
+            
+                # Error and busy messages are shown but not kept, so the stored
+                # history matches the conversation the model sees
+                response = completed[0] if completed else None
                 if response:
-                    # Add bot response
                     bot_message = {
                         "role": "assistant",
                         "content": response,
-                        "timestamp": current_time.strftime("%Y-%m-%d %H:%M:%S")
+                        "timestamp": current_time.strftime("%Y-%m-%d %H:%M:%S"),
+                        "display_time": current_time.strftime("%I:%M %p")
                     }
-                    st.session_state.chat_history.append(bot_message)
-                    
+                    record_exchange([new_message, bot_message])
+                
                     # Save chat history only once after both messages are added
-                    save_chat_history(st.session_state.chat_history)
-                    
-                    if voice_enabled:
-                        st.session_state.voice_assistant.speak(response)
+                    append_chat_messages(st.session_state.session_id, [new_message, bot_message])
+            st.session_state.last_trace = trace.to_dict()
+            if response and utterance is not None:
+                # The rerun below replaces this run's page, so the rest of the
+                # answer is queued from the next run
+                st.session_state.pending_speech = utterance
             
-            # Update last message time
-            st.session_state.last_message_time = current_time
             st.session_state.form_submitted = False
             st.rerun()
             
@@ -167,6 +434,8 @@ if mode == "Chat":
 
 
 elif mode == "Lab Report Analysis":
+    load_service('chatbot', get_chatbot)
+    load_service('document_processor', get_document_processor)
     st.subheader("Upload and Analyze Lab Reports")
     
     uploaded_file = st.file_uploader(
@@ -176,53 +445,131 @@ elif mode == "Lab Report Analysis":
     
     if uploaded_file:
         try:
+            document_cache = get_document_cache()
             
-            file_path = os.path.join("data/reports", uploaded_file.name)
-            with open(file_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-            
-            st.session_state.uploaded_files.append({
-                "name": uploaded_file.name,
-                "path": file_path,
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            })
+            # Uploads are stored by content hash, so reruns and re-uploads of
+            # the same report reuse the stored file, text and analysis. Reruns
+            # recognise the upload by its id and skip copying it again.
+            stored = next(
+                (f for f in st.session_state.uploaded_files if f.get("file_id") == uploaded_file.file_id),
+                None
+            )
+            if stored is None or not os.path.exists(stored["path"]):
+                digest, file_path = get_report_store().save(uploaded_file, uploaded_file.name)
+                st.session_state.uploaded_files = [
+                    f for f in st.session_state.uploaded_files if f.get("file_id") != uploaded_file.file_id
+                ][-(MAX_SESSION_UPLOADS - 1):] + [{
+                    "name": uploaded_file.name,
+                    "file_id": uploaded_file.file_id,
+                    "path": file_path,
+                    "hash": digest,
+                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                }]
+            else:
+                digest, file_path = stored["hash"], stored["path"]
             
             st.success(f"File {uploaded_file.name} uploaded successfully!")
             
             
-            with st.spinner("Analyzing document..."):
-                text = st.session_state.document_processor.process_document(file_path)
-                if text:
-                    analysis = st.session_state.chatbot.analyze_lab_report(text)
+            with start_trace('lab_report') as trace:
+                # Values are parsed and flagged locally first; they are shown
+                # straight away and give the model a much smaller prompt
+                extraction = cached_extraction(digest)
+                if extraction is None:
+                    with st.spinner("Extracting text..."):
+                        extraction = extract_report(file_path, st.session_state.document_processor)
+                    # A failed extraction is not cached, so a retry can succeed
+                    cache_extraction(digest, extraction)
+                text, lab_values = extraction['text'], extraction['lab_values']
+                if extraction['error']:
+                    st.error(extraction['error'])
+                elif not text.strip():
+                    st.warning("No text could be extracted from this report.")
+                else:
+                    if lab_values:
+                        flagged = sum(1 for row in lab_values if row['flag'])
+                        st.write(f"Extracted Values ({flagged} outside the reference range):")
+                        st.dataframe(
+                            [
+                                {
+                                    "Test": row['analyte'],
+                                    "Value": f"{row['comparator']}{row['value']:g}",
+                                    "Unit": row['unit'],
+                                    "Reference": format_reference(row),
+                                    "Flag": row['flag']
+                                }
+                                for row in lab_values
+                            ],
+                            hide_index=True
+                        )
+                
                     st.write("Analysis Results:")
-                    st.write(analysis)
+                    chatbot = st.session_state.chatbot
+                    variant = chatbot.analysis_variant(lab_values)
+                    analysis = document_cache.get_analysis(digest, variant)
+                    if analysis is not None:
+                        st.write(analysis)
+                    elif chatbot.is_long_report(text, lab_values):
+                        # Long reports are analyzed in parallel chunks; each part is
+                        # shown as soon as it is ready, followed by the merged result
+                        progress = st.progress(0.0, text="Analyzing report sections...")
+                        partial_results = st.container()
+                        completed = 0
+                        for event in chatbot.iter_long_report_analysis(text, lab_values=lab_values):
+                            if event['chunk'] is None:
+                                progress.empty()
+                                st.write(event['text'])
+                                if not event['text'].startswith("Error analyzing lab report"):
+                                    document_cache.put_analysis(digest, variant, event['text'])
+                            else:
+                                completed += 1
+                                progress.progress(
+                                    completed / event['total'],
+                                    text=f"Analyzed {completed} of {event['total']} report sections"
+                                )
+                                with partial_results.expander(f"Section {event['chunk'] + 1} of {event['total']}"):
+                                    st.write(event['text'])
+                    else:
+                        st.write_stream(chatbot.stream_lab_report_analysis(
+                            text,
+                            lab_values=lab_values,
+                            on_complete=lambda result: document_cache.put_analysis(digest, variant, result)
+                        ))
+            st.session_state.last_trace = trace.to_dict()
         
+        except UploadTooLarge as e:
+            st.error(str(e))
         except Exception as e:
             st.error(f"Error processing document: {str(e)}")
 
 
 elif mode == "Appointments":
+    load_service('location_services', get_location_services)
     st.subheader("Book Appointments")
     
     if user_location:
         st.write(f"Finding clinics near {user_location}")
+        sort_by_travel_time = st.checkbox("Sort by travel time")
         with st.spinner("Searching for nearby clinics..."):
             try:
-                clinics = st.session_state.location_services.find_nearby_healthcare(user_location)
-                if isinstance(clinics, list):
+                with start_trace('clinic_search') as trace:
+                    location_services = st.session_state.location_services
+                    if sort_by_travel_time:
+                        # Ranking needs every clinic, so it is one batched travel-time lookup
+                        clinics = location_services.find_nearby_healthcare(user_location)
+                        if not isinstance(clinics, str):
+                            clinics = location_services.rank_by_travel_time(user_location, clinics)
+                        if isinstance(clinics, str):
+                            st.error(clinics)
+                            clinics = []
+                    else:
+                        # Each clinic is rendered as soon as its details arrive
+                        clinics = location_services.iter_nearby_healthcare(user_location)
                     for clinic in clinics:
-                        with st.expander(f"{clinic['name']} - Rating: {clinic.get('rating', 'N/A')}"):
-                            st.write(f"Address: {clinic['address']}")
-                            if clinic.get('phone'):
-                                st.write(f"Phone: {clinic['phone']}")
-                            if clinic.get('website'):
-                                st.write(f"Website: {clinic['website']}")
-                            if clinic.get('opening_hours'):
-                                st.write("Opening Hours:")
-                                for hours in clinic['opening_hours']:
-                                    st.write(f"- {hours}")
-                else:
-                    st.error(clinics)
+                        render_clinic(clinic, user_location)
+                st.session_state.last_trace = trace.to_dict()
+            except LocationNotFound as e:
+                st.error(str(e))
             except Exception as e:
                 st.error(f"Error searching for clinics: {str(e)}")
     else:
@@ -230,4 +577,16 @@ elif mode == "Appointments":
 
 
 st.write("---")
-st.caption("Chaudhary Medical Assistant - Powered by Harshit Chaudhary") 
\ No newline at end of file
+st.caption("Chaudhary Medical Assistant - Powered by Harshit Chaudhary") 
+
+
+if os.getenv('DEBUG', 'false').lower() in ('1', 'true', 'yes') and st.session_state.get('last_trace'):
+    last_trace = st.session_state.last_trace
+    with trace_panel.container():
+        with st.expander("Last request timing"):
+            st.caption(
+                f"{last_trace['name']}: {last_trace['seconds']:.2f}s, "
+                f"{last_trace['tokens']['prompt']} prompt / {last_trace['tokens']['response']} response tokens"
+            )
+            if last_trace['spans']:
+                st.dataframe(last_trace['spans'], hide_index=True)
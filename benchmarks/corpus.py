@@ -0,0 +1,132 @@
+"""Generated lab-report corpus for the benchmarks.
+
+Builds text PDFs of several lengths, a scanned (image-only) PDF and scanned
+PNG/JPEG pages from a fixed seed, so every run processes identical input.
+
+    python benchmarks/corpus.py /tmp/corpus
+"""
+import os
+import random
+import sys
+
+PANELS = {
+    'COMPLETE BLOOD COUNT': [
+        ('Hemoglobin', 'g/dL', 13.0, 17.0),
+        ('WBC Count', '10^3/uL', 4.0, 11.0),
+        ('Platelet Count', '10^3/uL', 150, 450),
+        ('RBC Count', '10^6/uL', 4.5, 5.9),
+        ('MCV', 'fL', 80, 100),
+    ],
+    'LIPID PROFILE': [
+        ('Total Cholesterol', 'mg/dL', 125, 200),
+        ('HDL Cholesterol', 'mg/dL', 40, 60),
+        ('LDL Cholesterol', 'mg/dL', 50, 130),
+        ('Triglycerides', 'mg/dL', 50, 150),
+    ],
+    'KIDNEY FUNCTION TEST': [
+        ('Creatinine', 'mg/dL', 0.7, 1.3),
+        ('Urea', 'mg/dL', 15, 45),
+        ('Uric Acid', 'mg/dL', 3.5, 7.2),
+        ('Sodium', 'mmol/L', 135, 145),
+        ('Potassium', 'mmol/L', 3.5, 5.1),
+    ],
+    'LIVER FUNCTION TEST': [
+        ('Bilirubin Total', 'mg/dL', 0.3, 1.2),
+        ('SGOT', 'U/L', 5, 40),
+        ('SGPT', 'U/L', 7, 56),
+        ('Alkaline Phosphatase', 'U/L', 44, 147),
+    ],
+}
+
+LINES_PER_PAGE = 45
+
+
+def report_lines(rng, page_count):
+    """Lines of a lab report long enough to fill page_count pages"""
+    lines = ["CITY DIAGNOSTICS LABORATORY", "Patient: Test Patient    Age: 45    Sex: M", ""]
+    panels = list(PANELS.items())
+    while len(lines) < page_count * LINES_PER_PAGE:
+        title, tests = panels[len(lines) % len(panels)]
+        lines.append(title)
+        for analyte, unit, low, high in tests:
+            value = rng.uniform(low * 0.7, high * 1.3)
+            lines.append(f"{analyte:<24} {value:>8.1f} {unit:<10} {low:g} - {high:g}")
+        lines.append("")
+    return lines[:page_count * LINES_PER_PAGE]
+
+
+def write_text_pdf(path, lines):
+    """Write lines as a PDF with a text layer"""
+    import fitz
+
+    with fitz.open() as pdf:
+        for start in range(0, len(lines), LINES_PER_PAGE):
+            page = pdf.new_page()
+            page.insert_text((50, 50), "\n".join(lines[start:start + LINES_PER_PAGE]), fontname='cour', fontsize=9)
+        pdf.save(path)
+
+
+def render_scan(lines, dpi=300, seed=0):
+    """Render lines onto a greyscale page image that looks like a scan"""
+    from PIL import Image, ImageDraw, ImageFilter
+
+    width, height = int(8.27 * dpi), int(11.69 * dpi)
+    image = Image.new('L', (width, height), 235)
+    draw = ImageDraw.Draw(image)
+    line_height = height // (LINES_PER_PAGE + 4)
+    for index, line in enumerate(lines[:LINES_PER_PAGE]):
+        draw.text((dpi // 2, dpi // 2 + index * line_height), line, fill=20)
+    # Light noise and blur, as from a flatbed scanner
+    rng = random.Random(seed)
+    for _ in range(width * height // 400):
+        image.putpixel((rng.randrange(width), rng.randrange(height)), rng.randrange(150, 235))
+    return image.filter(ImageFilter.GaussianBlur(0.6))
+
+
+def write_scanned_pdf(path, pages):
+    """Write page images as a PDF without a text layer"""
+    import io
+    import fitz
+
+    with fitz.open() as pdf:
+        for image in pages:
+            buffer = io.BytesIO()
+            image.save(buffer, format='PNG')
+            page = pdf.new_page()
+            page.insert_image(page.rect, stream=buffer.getvalue())
+        pdf.save(path)
+
+
+def generate_corpus(directory, seed=1234):
+    """Generate the benchmark documents; return {name: path}"""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    documents = {}
+
+    for page_count in (2, 12, 40):
+        path = os.path.join(directory, f"text_{page_count}p.pdf")
+        if not os.path.exists(path):
+            write_text_pdf(path, report_lines(rng, page_count))
+        documents[f"text_pdf_{page_count}p"] = path
+
+    scanned_path = os.path.join(directory, "scanned_4p.pdf")
+    png_path = os.path.join(directory, "scan.png")
+    jpeg_path = os.path.join(directory, "scan.jpg")
+    if not all(os.path.exists(path) for path in (scanned_path, png_path, jpeg_path)):
+        lines = report_lines(rng, 4)
+        pages = [
+            render_scan(lines[start:start + LINES_PER_PAGE], seed=seed + start)
+            for start in range(0, len(lines), LINES_PER_PAGE)
+        ]
+        write_scanned_pdf(scanned_path, pages)
+        pages[0].save(png_path, dpi=(300, 300))
+        pages[0].save(jpeg_path, dpi=(300, 300), quality=85)
+    documents['scanned_pdf_4p'] = scanned_path
+    documents['scan_png'] = png_path
+    documents['scan_jpeg'] = jpeg_path
+    return documents
+
+
+if __name__ == '__main__':
+    for name, path in generate_corpus(sys.argv[1] if len(sys.argv) > 1 else 'benchmarks/corpus').items():
+        print(f"{name:16} {path}")
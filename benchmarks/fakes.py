@@ -0,0 +1,242 @@
+"""Deterministic local stand-ins for the upstream services.
+
+They mirror the parts of the client APIs the app uses, return stable data
+derived from their inputs, sleep for a configurable latency and count
+their calls, so caching and concurrency can be measured without network
+access or API keys.
+"""
+import asyncio
+import hashlib
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+
+
+def _stable_fraction(text):
+    """Deterministic number in [0, 1) derived from text"""
+    return int(hashlib.sha256(text.encode('utf-8')).hexdigest()[:8], 16) / 0x100000000
+
+
+class _FakeResponse:
+    """Response or stream chunk with a text attribute"""
+
+    def __init__(self, text):
+        self.text = text
+
+
+class _FakeStream:
+    """Async iterator over the chunks of a streamed fake response"""
+
+    def __init__(self, chunks, latency):
+        self._chunks = list(chunks)
+        self._latency = latency
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._chunks:
+            raise StopAsyncIteration
+        await asyncio.sleep(self._latency)
+        return _FakeResponse(self._chunks.pop(0))
+
+
+class FakeGenerativeModel:
+    """Local stand-in for google.generativeai.GenerativeModel"""
+
+    def __init__(self, latency=0.2, chunk_latency=0.02, words=60):
+        self.latency = latency
+        self.chunk_latency = chunk_latency
+        self.words = words
+        self.calls = {}
+        self.max_concurrent = 0
+        self._concurrent = 0
+        self._lock = threading.Lock()
+
+    def _record(self, name):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def _answer(self, contents):
+        """Deterministic answer text derived from the request"""
+        seed = _stable_fraction(repr(contents))
+        return " ".join(f"word{int(seed * 1000) + i}" for i in range(self.words))
+
+    def generate_content(self, contents, stream=False):
+        self._record('generate_content')
+        time.sleep(self.latency)
+        text = self._answer(contents)
+        if stream:
+            return [_FakeResponse(word + " ") for word in text.split()]
+        return _FakeResponse(text)
+
+    async def generate_content_async(self, contents, stream=False):
+        self._record('generate_content_async')
+        with self._lock:
+            self._concurrent += 1
+            self.max_concurrent = max(self.max_concurrent, self._concurrent)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            with self._lock:
+                self._concurrent -= 1
+        text = self._answer(contents)
+        if stream:
+            return _FakeStream((word + " " for word in text.split()), self.chunk_latency)
+        return _FakeResponse(text)
+
+
+class FakeMapsClient:
+    """Local stand-in for googlemaps.Client"""
+
+    def __init__(self, latency=0.05, places_per_search=20, spacing_meters=400):
+        self.latency = latency
+        self.places_per_search = places_per_search
+        self.spacing_meters = spacing_meters
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def _record(self, name):
+        """Count a call and simulate its network latency"""
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def geocode(self, address):
+        self._record('geocode')
+        if not address.strip():
+            return []
+        lat = 28.5 + _stable_fraction(address) * 0.2
+        lng = 77.1 + _stable_fraction(address[::-1]) * 0.2
+        return [{'geometry': {'location': {'lat': lat, 'lng': lng}}}]
+
+    def places_nearby(self, location, radius, type=None, keyword=None):
+        self._record('places_nearby')
+        # Places sit on a fixed global grid, so overlapping searches see the
+        # same places just like the real API would
+        lat, lng = location
+        lat_step = self.spacing_meters / 111320
+        lng_step = self.spacing_meters / (111320 * math.cos(math.radians(lat)))
+        results = []
+        span = int(radius // self.spacing_meters) + 1
+        base_row = round(lat / lat_step)
+        base_col = round(lng / lng_step)
+        for row in range(base_row - span, base_row + span + 1):
+            for col in range(base_col - span, base_col + span + 1):
+                place_lat = row * lat_step
+                place_lng = col * lng_step
+                dy = (place_lat - lat) * 111320
+                dx = (place_lng - lng) * 111320 * math.cos(math.radians(lat))
+                if math.hypot(dx, dy) > radius:
+                    continue
+                place_id = f"fake_{type}_{row}_{col}"
+                results.append({
+                    'place_id': place_id,
+                    'name': f"Clinic {row}-{col}",
+                    'vicinity': f"{abs(row) % 100} Fake Street",
+                    'rating': round(3 + 2 * _stable_fraction(place_id), 1),
+                    'geometry': {'location': {'lat': place_lat, 'lng': place_lng}},
+                    '_distance': math.hypot(dx, dy)
+                })
+        results.sort(key=lambda place: place.pop('_distance'))
+        return {'results': results[:self.places_per_search]}
+
+    def distance_matrix(self, origins, destinations, mode=None, departure_time=None):
+        self._record('distance_matrix')
+        if len(destinations) > 25:
+            raise ValueError("Too many destinations in one request")
+        elements = []
+        for destination in destinations:
+            key = f"{origins[0]}|{destination}"
+            seconds = int(300 + 1500 * _stable_fraction(key))
+            meters = seconds * 8
+            elements.append({
+                'status': 'OK',
+                'duration': {'value': seconds, 'text': f"{seconds // 60} mins"},
+                'distance': {'value': meters, 'text': f"{meters / 1000:.1f} km"}
+            })
+        return {'rows': [{'elements': elements}]}
+
+    def directions(self, origin, destination, mode=None, departure_time=None):
+        self._record('directions')
+        return [{'legs': [{
+            'distance': {'text': "3.2 km"},
+            'duration': {'text': "11 mins"},
+            'steps': [
+                {'html_instructions': "Head north", 'distance': {'text': "1.2 km"}, 'duration': {'text': "4 mins"}},
+                {'html_instructions': f"Arrive at {destination}", 'distance': {'text': "2.0 km"}, 'duration': {'text': "7 mins"}}
+            ]
+        }]}]
+
+    def place(self, place_id, fields=None):
+        self._record('place')
+        return {'result': {
+            'name': f"Clinic {place_id}",
+            'formatted_address': f"{place_id}, Fake City",
+            'rating': round(3 + 2 * _stable_fraction(place_id), 1),
+            'formatted_phone_number': f"+1 555 {int(_stable_fraction(place_id) * 10000):04d}",
+            'website': f"https://example.com/{place_id}",
+            'opening_hours': {'weekday_text': ["Monday: 9:00 AM - 5:00 PM"]}
+        }}
+
+
+class FakeTesseract:
+    """Local stand-in for the pytesseract module.
+
+    install() puts it in sys.modules, so src.document.ocr picks it up on its
+    next import of pytesseract. Worker processes are started fresh rather
+    than forked, so it also puts a pytesseract shim on sys.path, which they
+    inherit, that installs an equivalent fake in each worker.
+    """
+
+    class Output:
+        DICT = 'dict'
+
+    def __init__(self, latency=0.3, words_per_line=6):
+        self.latency = latency
+        self.words_per_line = words_per_line
+        self.calls = 0
+        # pytesseract.pytesseract.tesseract_cmd is set on Windows
+        self.pytesseract = self
+        self.tesseract_cmd = 'tesseract'
+
+    def install(self):
+        sys.modules['pytesseract'] = self
+        shim_dir = tempfile.mkdtemp(prefix='fake_tesseract_')
+        with open(os.path.join(shim_dir, 'pytesseract.py'), 'w', encoding='utf-8') as f:
+            f.write(
+                "import sys\n"
+                "from benchmarks.fakes import FakeTesseract\n"
+                f"sys.modules[__name__] = FakeTesseract(latency={self.latency!r}, words_per_line={self.words_per_line!r})\n"
+            )
+        sys.path.insert(0, shim_dir)
+        return self
+
+    def get_tesseract_version(self):
+        return '5.3.0'
+
+    def image_to_data(self, image, output_type=None):
+        self.calls += 1
+        time.sleep(self.latency)
+        # One recognized line per 60 pixels of height, like a 300 DPI scan
+        line_count = max(1, image.height // 60)
+        seed = f"{image.width}x{image.height}"
+        data = {'text': [], 'conf': [], 'block_num': [], 'par_num': [], 'line_num': []}
+        for line in range(line_count):
+            value = 1 + 99 * _stable_fraction(f"{seed}:{line}")
+            words = [f"Analyte{line}", f"{value:.1f}", "mg/dL", "10", "-", "100"][:self.words_per_line]
+            for word in words:
+                data['text'].append(word)
+                data['conf'].append(90)
+                data['block_num'].append(1)
+                data['par_num'].append(1)
+                data['line_num'].append(line + 1)
+        return data
+
+    def image_to_string(self, image):
+        data = self.image_to_data(image)
+        return " ".join(data['text'])
@@ -0,0 +1,119 @@
+"""Cold-start import check for the modules under src/.
+
+Imports each module in a fresh interpreter with ``python -X importtime``
+and reports its cumulative import time. The run fails when a module pulls
+in a heavy dependency at import time, when it takes much longer than
+the stored baseline, or when it has no baseline. Import times depend on
+the machine, so re-record the baseline with --update where the check runs.
+
+    python benchmarks/import_time.py            # compare against the baseline
+    python benchmarks/import_time.py --update   # record a new baseline
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'import_time_baseline.json')
+
+MODULES = [
+    'src.chatbot.chatbot',
+    'src.document.document_processor',
+    'src.location.location_services',
+    'src.voice.voice_assistant',
+    'src.utils.utils',
+    'src.services.services',
+]
+
+# Libraries that must only be imported when a feature is first used
+HEAVY_MODULES = [
+    'google.generativeai',
+    'googlemaps',
+    'speech_recognition',
+    'gtts',
+    'pdfplumber',
+    'pytesseract',
+    'PIL',
+    'fitz',
+]
+
+# A module regresses when it is both this much slower and this many
+# microseconds slower than its baseline
+SLOWDOWN_FACTOR = 1.5
+SLOWDOWN_SLACK_US = 20000
+
+
+def measure(module):
+    """Import module in a fresh interpreter; return (cumulative_us, imported module names)"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr.strip().splitlines()[-1]}")
+
+    cumulative_us = 0
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        imported.add(name)
+        if name == module:
+            cumulative_us = int(cumulative)
+    return cumulative_us, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check import time of the src modules")
+    parser.add_argument('--update', action='store_true', help="write the measured times as the new baseline")
+    parser.add_argument('--repeat', type=int, default=5, help="imports per module; the fastest is kept")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    measured = {}
+    failures = []
+    print(f"{'module':40} {'import (ms)':>12} {'baseline (ms)':>14}")
+    for module in MODULES:
+        runs = [measure(module) for _ in range(args.repeat)]
+        cumulative_us = min(run[0] for run in runs)
+        measured[module] = cumulative_us
+
+        leaked = sorted(heavy for heavy in HEAVY_MODULES if heavy in runs[0][1])
+        if leaked:
+            failures.append(f"{module} imports {', '.join(leaked)} at load time")
+
+        previous = baseline.get(module)
+        if previous is None and not args.update:
+            # Without a baseline the regression check would silently pass
+            failures.append(f"{module} has no baseline in {BASELINE_PATH}; record one with --update")
+        elif previous is not None and cumulative_us > previous * SLOWDOWN_FACTOR and cumulative_us - previous > SLOWDOWN_SLACK_US:
+            failures.append(f"{module} import time regressed: {previous / 1000:.1f} ms -> {cumulative_us / 1000:.1f} ms")
+
+        previous_text = f"{previous / 1000:.1f}" if previous is not None else "-"
+        print(f"{module:40} {cumulative_us / 1000:>12.1f} {previous_text:>14}")
+
+    if args.update:
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(measured, f, indent=4)
+        print(f"\nBaseline written to {BASELINE_PATH}")
+
+    if failures:
+        print("\nImport check failed:")
+        for failure in failures:
+            print(f"- {failure}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
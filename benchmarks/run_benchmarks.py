@@ -0,0 +1,275 @@
+"""Offline benchmarks for the chatbot, document, location and history paths.
+
+Gemini, Google Maps and Tesseract are replaced by the deterministic fakes
+in benchmarks/fakes.py, each with a configurable latency, so runs need no
+network or API keys and are comparable between machines. Each scenario
+reports p50/p95 latency, throughput and peak Python memory (tracemalloc;
+memory allocated by worker processes and C libraries is not included).
+The run fails when a scenario's p95 is much slower than the stored
+baseline, or when a scenario has no baseline at all. The committed
+baseline was recorded with the default fake latencies; re-record it with
+--update on the machine that runs the check.
+
+    python benchmarks/run_benchmarks.py                  # compare against the baseline
+    python benchmarks/run_benchmarks.py --update         # record a new baseline
+    python benchmarks/run_benchmarks.py --only document  # scenarios whose name contains 'document'
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from corpus import generate_corpus
+from fakes import FakeGenerativeModel, FakeMapsClient, FakeTesseract
+
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'benchmark_baseline.json')
+
+# A scenario regresses when its p95 is both this much slower and this many
+# milliseconds slower than its baseline. The slack is below the fastest fake
+# upstream call, so a lost cache hit still fails, but above the scheduler and
+# GC noise of millisecond-scale scenarios
+SLOWDOWN_FACTOR = 1.5
+SLOWDOWN_SLACK_MS = 20
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run_scenario(func, iterations, concurrency=1, warmup=1):
+    """Time func(i) for each iteration; return latency, throughput and memory stats"""
+    for i in range(warmup):
+        func(-1 - i)
+
+    latencies = []
+
+    def timed(i):
+        start = time.perf_counter()
+        func(i)
+        latencies.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(timed, range(iterations)))
+    else:
+        for i in range(iterations):
+            timed(i)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'iterations': iterations,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'throughput_per_s': round(iterations / elapsed, 2),
+        'peak_memory_kb': round(peak / 1024, 1)
+    }
+
+
+def chatbot_scenarios(args, workdir):
+    """Chat and lab report analysis against the fake Gemini model"""
+    from src.chatbot.async_client import AsyncLLMClient
+    from src.chatbot.chatbot import MedicalChatbot
+
+    def make_bot():
+        # No rate limiter: the benchmark measures the code, not the quota
+        bot = MedicalChatbot(use_cache=False, llm_client=AsyncLLMClient(max_concurrency=8))
+        bot.model = FakeGenerativeModel(latency=args.gemini_latency)
+        bot.summary_model = FakeGenerativeModel(latency=args.gemini_latency)
+        bot.lab_model = FakeGenerativeModel(latency=args.gemini_latency)
+        return bot
+
+    bot = make_bot()
+    report = "\n".join(f"Test {i}    {i % 90 + 5}.0 mg/dL    10 - 100" for i in range(60))
+    concurrent_bot = make_bot()
+    return {
+        'chat.get_response': lambda: run_scenario(
+            lambda i: bot.get_response(f"What causes headaches? ({i})"), 20
+        ),
+        # Half the prompts repeat, as when many users ask the same question
+        'chat.get_response.concurrent': lambda: run_scenario(
+            lambda i: concurrent_bot.get_response(f"Is a fever of 38C serious? ({i % 8})"), 64, concurrency=16
+        ),
+        'lab.analyze_lab_report': lambda: run_scenario(
+            lambda i: bot.analyze_lab_report(f"{report}\nSample {i}", use_cache=False), 10
+        ),
+    }
+
+
+def document_scenarios(args, workdir):
+    """Text extraction and OCR on the generated corpus"""
+    from src.document import ocr
+    from src.document.document_processor import DocumentProcessor
+
+    FakeTesseract(latency=args.ocr_latency).install()
+    ocr.tesseract_available.cache_clear()
+    documents = generate_corpus(os.path.join(workdir, 'corpus'))
+    processor = DocumentProcessor()
+
+    def process(name):
+        def call(i):
+            result = processor.process_document_detailed(documents[name])
+            if result['error']:
+                raise RuntimeError(result['text'])
+        return call
+
+    return {
+        'document.text_pdf_2p': lambda: run_scenario(process('text_pdf_2p'), 10),
+        'document.text_pdf_12p': lambda: run_scenario(process('text_pdf_12p'), 5),
+        'document.text_pdf_40p': lambda: run_scenario(process('text_pdf_40p'), 3),
+        'document.scanned_pdf_4p': lambda: run_scenario(process('scanned_pdf_4p'), 3),
+        'document.scan_png': lambda: run_scenario(process('scan_png'), 5),
+        'document.scan_jpeg': lambda: run_scenario(process('scan_jpeg'), 5),
+    }
+
+
+def location_scenarios(args, workdir):
+    """Clinic search against the fake Maps client, with cold and warm caches"""
+    from src.location.geo_cache import GeoCache
+    from src.location.location_services import LocationServices
+    from src.utils.rate_limiter import RateLimiter
+
+    def make_services():
+        return LocationServices(
+            client=FakeMapsClient(latency=args.maps_latency),
+            geo_cache=GeoCache(os.path.join(workdir, f"geo_{time.monotonic_ns()}.db")),
+            rate_limiter=RateLimiter('maps-benchmark', rate=1e6, burst=10 ** 6)
+        )
+
+    cold = make_services()
+    warm = make_services()
+    return {
+        'location.find_nearby.cold': lambda: run_scenario(
+            lambda i: cold.find_nearby_healthcare(f"{i + 10} Benchmark Road, Delhi"), 10
+        ),
+        'location.find_nearby.warm': lambda: run_scenario(
+            lambda i: warm.find_nearby_healthcare("1 Benchmark Road, Delhi"), 20
+        ),
+    }
+
+
+def history_scenarios(args, workdir):
+    """Saving large chat histories to the history store"""
+    from src.utils.utils import save_chat_history
+
+    start = datetime(2024, 1, 1)
+
+    def messages(count, offset=0):
+        return [
+            {
+                "role": "user" if i % 2 == 0 else "assistant",
+                "content": f"Message {i} about symptoms, medication and follow-up care. " * 4,
+                "timestamp": (start + timedelta(seconds=i)).strftime("%Y-%m-%d %H:%M:%S")
+            }
+            for i in range(offset, offset + count)
+        ]
+
+    large = messages(args.history_size)
+    growing = list(large)
+    save_chat_history(growing, 'benchmark-incremental')
+
+    def add_exchange(i):
+        growing.extend(messages(2, len(growing)))
+        save_chat_history(growing, 'benchmark-incremental')
+
+    return {
+        'history.save_full': lambda: run_scenario(
+            lambda i: save_chat_history(large, f"benchmark-full-{i}"), 5
+        ),
+        'history.save_incremental': lambda: run_scenario(add_exchange, 50),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline benchmarks")
+    parser.add_argument('--update', action='store_true', help="write the results as the new baseline")
+    parser.add_argument('--only', default='', help="only run scenarios whose name contains this text")
+    parser.add_argument('--gemini-latency', type=float, default=0.2, help="fake Gemini latency in seconds")
+    parser.add_argument('--maps-latency', type=float, default=0.05, help="fake Maps latency in seconds")
+    parser.add_argument('--ocr-latency', type=float, default=0.3, help="fake Tesseract latency per image in seconds")
+    parser.add_argument('--history-size', type=int, default=5000, help="messages in the large chat history")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    workdir = tempfile.mkdtemp(prefix='medical-chatbot-bench-')
+    previous_cwd = os.getcwd()
+    # Stores that default to relative data/ paths write into the scratch directory
+    os.chdir(workdir)
+    results = {}
+    failures = []
+    try:
+        scenarios = {}
+        for group in (chatbot_scenarios, document_scenarios, location_scenarios, history_scenarios):
+            try:
+                scenarios.update(group(args, workdir))
+            except Exception as e:
+                failures.append(f"{group.__name__} could not be set up: {str(e)}")
+
+        print(f"{'scenario':32} {'p50 (ms)':>10} {'p95 (ms)':>10} {'ops/s':>9} {'peak (KB)':>10} {'base p95':>9}")
+        for name, scenario in scenarios.items():
+            if args.only not in name:
+                continue
+            try:
+                result = scenario()
+            except Exception as e:
+                failures.append(f"{name} failed: {str(e)}")
+                continue
+            results[name] = result
+
+            previous = baseline.get(name, {}).get('p95_ms')
+            if previous is None and not args.update:
+                # Without a baseline the regression check would silently pass
+                failures.append(f"{name} has no baseline in {BASELINE_PATH}; record one with --update")
+            elif previous is not None and result['p95_ms'] > previous * SLOWDOWN_FACTOR and result['p95_ms'] - previous > SLOWDOWN_SLACK_MS:
+                failures.append(f"{name} p95 regressed: {previous:.1f} ms -> {result['p95_ms']:.1f} ms")
+
+            previous_text = f"{previous:.1f}" if previous is not None else "-"
+            print(
+                f"{name:32} {result['p50_ms']:>10.1f} {result['p95_ms']:>10.1f} "
+                f"{result['throughput_per_s']:>9.1f} {result['peak_memory_kb']:>10.0f} {previous_text:>9}"
+            )
+    finally:
+        os.chdir(previous_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+
+    if args.update:
+        baseline.update(results)
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=4)
+        print(f"\nBaseline written to {BASELINE_PATH}")
+
+    if failures:
+        print("\nBenchmark check failed:")
+        for failure in failures:
+            print(f"- {failure}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,26 @@
+# Settings for serving the API: gunicorn src.api.server:app
+import multiprocessing
+import os
+
+bind = os.getenv('API_BIND', '0.0.0.0:8000')
+
+# One process per core; threads let each process keep serving while
+# requests wait on Gemini, Maps or a streamed response
+workers = int(os.getenv('API_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.getenv('API_THREADS', 8))
+
+# Long reports and streamed answers can take a while
+timeout = int(os.getenv('API_TIMEOUT_SECONDS', 120))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then so a slow leak cannot grow without bound
+max_requests = int(os.getenv('API_MAX_REQUESTS', 1000))
+max_requests_jitter = 100
+
+# Every worker builds its own services, event loop and thread pools after
+# the fork rather than inheriting half-started ones
+preload_app = False
+
+accesslog = '-'
@@ -1,7 +1,7 @@
 import os
 import sys
 import subprocess
-from setuptools import setup, find_packages
+from setuptools import setup, find_namespace_packages
 
 def check_tesseract():
     """Check if Tesseract OCR is installed"""
@@ -97,10 +97,33 @@ GOOGLE_MAPS_API_KEY=your_google_maps_api_key_here
 # Application Settings
 DEBUG=True
 LOG_LEVEL=INFO
+WARM_UP_SERVICES=true  # chat only; "all", or a list such as gemini,maps,tesseract,voice
+LLM_MAX_CONCURRENCY=8  # concurrent Gemini requests per process
+LLM_TIMEOUT_SECONDS=60
+LLM_MAX_RETRIES=2
+GEMINI_REQUESTS_PER_MINUTE=60  # shared by every session in the process
+MAPS_REQUESTS_PER_SECOND=20
+RATE_LIMIT_MAX_QUEUE=100  # requests waiting beyond this are turned away
+RATE_LIMIT_MAX_WAIT=60
+METRICS_PORT=  # e.g. 9464 to serve /metrics and /metrics.json; empty disables it
+METRICS_HOST=127.0.0.1  # use 0.0.0.0 only if a scraper on another host needs it; there is no auth
+METRICS_JSON_LOG=false  # log each request's timing breakdown as a JSON line
+API_BIND=0.0.0.0:8000  # gunicorn src.api.server:app
+API_WORKERS=4
+API_THREADS=8
+REPORT_JOB_WORKERS=2  # background report analyses per API worker
+API_SECRET_KEY=  # signs API and browser session tokens; set the same value on every node
+CHAT_HISTORY_MAX_MESSAGES=5000  # older messages of a conversation are compacted away; 0 keeps all
 
 # File Storage
 MAX_UPLOAD_SIZE=10485760  # 10MB in bytes
+REPORT_RETENTION_DAYS=30  # uploaded reports older than this are deleted
 ALLOWED_FILE_TYPES=.pdf,.jpg,.jpeg,.png
+DOCUMENT_CACHE_MAX_BYTES=524288000  # 500MB of cached report text and analyses
+TTS_CACHE_MAX_BYTES=20971520  # 20MB of synthesized speech clips kept in memory
+TTS_WORKERS=4  # speech synthesis threads shared by all sessions; each answer uses at most 2
+SPEECH_RECOGNIZER=google  # or whisper / sphinx to transcribe locally without network
+WHISPER_MODEL=base.en
 """)
         print("\nCreated .env file. Please update it with your API keys.")
 
@@ -111,6 +134,27 @@ ALLOWED_FILE_TYPES=.pdf,.jpg,.jpeg,.png
     print("2. Update your .env file with API keys")
     print("3. Run the application:")
     print("   streamlit run app.py")
+    print("4. Or serve the JSON API:")
+    print("   gunicorn src.api.server:app")
+    print("5. Analyze a folder of reports (after pip install -e .):")
+    print("   medical-chatbot-batch path/to/reports --output results.jsonl")
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    # With setuptools arguments (e.g. pip install -e .) this registers the
+    # package and its command-line tools; run plainly it checks the environment
+    if len(sys.argv) > 1:
+        with open('requirements.txt', 'r') as f:
+            requirements = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+        setup(
+            name='medical-chatbot',
+            version='1.0.0',
+            packages=find_namespace_packages(include=['src', 'src.*']),
+            install_requires=requirements,
+            entry_points={
+                'console_scripts': [
+                    'medical-chatbot-batch=src.batch.batch_analyze:main'
+                ]
+            }
+        )
+    else:
+        main() 
\ No newline at end of file
@@ -0,0 +1,115 @@
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from src.document.report_analysis import analyze_report
+from src.utils.metrics import start_trace
+
+# Workers refresh the heartbeat of their unfinished jobs this often (seconds)
+HEARTBEAT_INTERVAL = 15
+
+# An unfinished job whose heartbeat is older than this lost its worker
+# (recycled or killed) and is reported as failed
+STALE_AFTER = 4 * HEARTBEAT_INTERVAL
+
+
+class JobStore:
+    """Report analysis jobs as JSON files, so any worker process can answer a poll"""
+
+    def __init__(self, root='data/jobs'):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def create(self, **fields):
+        """Create a queued job and return it"""
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        job = {'id': uuid.uuid4().hex, 'status': 'queued', 'created': now, 'updated': now, 'heartbeat': time.time(), **fields}
+        self._write(job)
+        return job
+
+    def get(self, job_id):
+        """Return a job by id, or None; unfinished jobs whose worker is gone come back failed"""
+        job = self._read(job_id)
+        if job is not None and job['status'] in ('queued', 'running') and time.time() - job.get('heartbeat', 0) > STALE_AFTER:
+            job = self.update(
+                job_id,
+                status='failed',
+                error="The worker processing this report stopped. Please upload it again."
+            )
+        return job
+
+    def update(self, job_id, **fields):
+        """Merge fields into a job"""
+        with self._lock:
+            job = self._read(job_id) or {'id': job_id}
+            job.update(fields, updated=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            self._write(job)
+        return job
+
+    def _read(self, job_id):
+        # Ids are generated hex strings; anything else cannot name a job file
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(self._path(job_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _path(self, job_id):
+        return os.path.join(self.root, job_id + ".json")
+
+    def _write(self, job):
+        """Write a job atomically, so a concurrent poll never reads half a file"""
+        os.makedirs(self.root, exist_ok=True)
+        temp_path = self._path(job['id']) + f".{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f)
+        os.replace(temp_path, self._path(job['id']))
+
+
+class ReportJobs:
+    """Runs uploaded lab report analyses in the background"""
+
+    def __init__(self, store=None, workers=2):
+        self.store = store if store is not None else JobStore()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report-job")
+        self._active = set()
+        self._active_lock = threading.Lock()
+        threading.Thread(target=self._heartbeat, name="report-job-heartbeat", daemon=True).start()
+
+    def submit(self, file_path, digest, filename):
+        """Queue the analysis of a stored upload and return its job"""
+        job = self.store.create(filename=filename, hash=digest, owner=os.getpid())
+        with self._active_lock:
+            self._active.add(job['id'])
+        self._executor.submit(self._run, job['id'], file_path, digest)
+        return job
+
+    def _run(self, job_id, file_path, digest):
+        self.store.update(job_id, status='running', heartbeat=time.time())
+        try:
+            with start_trace('lab_report'):
+                result = analyze_report(file_path, digest)
+            self.store.update(job_id, status='failed' if result['error'] else 'done', **result)
+        except Exception as e:
+            self.store.update(job_id, status='failed', error=str(e))
+        finally:
+            with self._active_lock:
+                self._active.discard(job_id)
+
+    def _heartbeat(self):
+        """Keep this process's unfinished jobs from being expired while it is alive"""
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            with self._active_lock:
+                active = list(self._active)
+            for job_id in active:
+                try:
+                    self.store.update(job_id, heartbeat=time.time())
+                except OSError:
+                    continue
+
@@ -0,0 +1,191 @@
+"""JSON API over the chatbot, lab report analysis and clinic search.
+
+The Streamlit UI reruns its whole script on every interaction; this app
+serves the same services statelessly, so it can run as many worker
+processes as there are cores:
+
+    gunicorn src.api.server:app      # settings in gunicorn.conf.py
+
+Chat history lives in the history store and report jobs in data/jobs, so
+any worker can serve any request. Metrics are per worker process.
+
+Chat sessions are issued by POST /sessions; every chat request then names
+its session_id and carries the session's token as "Authorization: Bearer".
+"""
+import os
+from datetime import datetime
+from dotenv import load_dotenv
+from flask import Flask, Response, jsonify, request, stream_with_context
+from src.api.jobs import ReportJobs
+from src.api.sessions import is_valid_token, issue_session
+from src.chatbot.chatbot import Conversation
+from src.document.report_store import UploadTooLarge
+from src.location.location_services import LocationNotFound
+from src.services.services import get_chatbot, get_location_services, get_report_store, warm_up_results
+from src.utils.metrics import get_metrics, start_trace
+from src.utils.utils import append_chat_messages, load_recent_chat_history, validate_file_type
+
+load_dotenv()
+
+ALLOWED_FILE_TYPES = os.getenv('ALLOWED_FILE_TYPES', '.pdf,.jpg,.jpeg,.png').split(',')
+
+# Most messages one history request may return
+MAX_HISTORY_LIMIT = 200
+
+
+def _chat_exchange(message, response):
+    """The user and assistant messages of one exchange, as stored in the history"""
+    now = datetime.now()
+    return [
+        {
+            "role": role,
+            "content": content,
+            "timestamp": now.strftime("%Y-%m-%d %H:%M:%S"),
+            "display_time": now.strftime("%I:%M %p")
+        }
+        for role, content in (("user", message), ("assistant", response))
+    ]
+
+
+def _load_conversation(session_id):
+    """Rebuild a session's conversation window from its stored history"""
+    history = load_recent_chat_history(session_id)
+    if isinstance(history, str):
+        raise RuntimeError(history)
+    return Conversation.from_history(history)
+
+
+def _session_error(session_id):
+    """An error response unless the request carries the token of session_id, else None"""
+    if not session_id or not isinstance(session_id, str):
+        return jsonify({'error': "'session_id' is required; create one with POST /sessions"}), 400
+    header = request.headers.get('Authorization', '')
+    token = header[len('Bearer '):] if header.startswith('Bearer ') else ''
+    if not is_valid_token(session_id, token):
+        return jsonify({'error': "Invalid or missing session token"}), 401
+    return None
+
+
+def create_app(report_jobs=None):
+    """Build the Flask app"""
+    app = Flask(__name__)
+    app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_UPLOAD_SIZE', 10 * 1024 * 1024))
+    jobs = report_jobs if report_jobs is not None else ReportJobs(workers=int(os.getenv('REPORT_JOB_WORKERS', 2)))
+
+    @app.get('/health')
+    def health():
+        return jsonify({'status': 'ok', 'warm_up': warm_up_results()})
+
+    @app.post('/sessions')
+    def create_session():
+        session_id, token = issue_session()
+        return jsonify({'session_id': session_id, 'token': token}), 201
+
+    @app.post('/chat')
+    def chat():
+        payload = request.get_json(silent=True) or {}
+        message = (payload.get('message') or '').strip()
+        session_id = payload.get('session_id')
+        error = _session_error(session_id)
+        if error is not None:
+            return error
+        if not message:
+            return jsonify({'error': "'message' is required"}), 400
+        try:
+            conversation = _load_conversation(session_id)
+        except Exception as e:
+            return jsonify({'error': f"Error loading chat history: {str(e)}"}), 500
+        chatbot = get_chatbot()
+
+        # Only an answered message is saved, as in the UI; error and busy
+        # messages reach the client but never the stored history
+        def save(response):
+            append_chat_messages(session_id, _chat_exchange(message, response))
+
+        if not payload.get('stream', True):
+            with start_trace('chat') as trace:
+                response = "".join(chatbot.stream_response(message, conversation=conversation, on_complete=save))
+            return jsonify({'response': response, 'trace': trace.to_dict()})
+
+        def generate():
+            with start_trace('chat'):
+                yield from chatbot.stream_response(message, conversation=conversation, on_complete=save)
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype='text/plain',
+            # Stop proxies from buffering the stream into one response
+            headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'}
+        )
+
+    @app.get('/chat/<session_id>/history')
+    def chat_history(session_id):
+        error = _session_error(session_id)
+        if error is not None:
+            return error
+        limit = min(max(1, request.args.get('limit', 50, type=int)), MAX_HISTORY_LIMIT)
+        history = load_recent_chat_history(session_id, limit=limit)
+        if isinstance(history, str):
+            return jsonify({'error': history}), 500
+        return jsonify({'messages': history})
+
+    @app.post('/reports')
+    def upload_report():
+        uploaded = request.files.get('file')
+        if uploaded is None or not uploaded.filename:
+            return jsonify({'error': "A 'file' upload is required"}), 400
+        if not validate_file_type(uploaded.filename, ALLOWED_FILE_TYPES):
+            return jsonify({'error': f"Unsupported file type. Allowed: {', '.join(ALLOWED_FILE_TYPES)}"}), 415
+
+        try:
+            # Copied in blocks from the request stream, never held whole in memory
+            digest, file_path = get_report_store().save(uploaded.stream, uploaded.filename)
+        except UploadTooLarge as e:
+            return jsonify({'error': str(e)}), 413
+
+        job = jobs.submit(file_path, digest, uploaded.filename)
+        return jsonify({'job_id': job['id'], 'status': job['status'], 'status_url': f"/reports/{job['id']}"}), 202
+
+    @app.get('/reports/<job_id>')
+    def report_status(job_id):
+        job = jobs.store.get(job_id)
+        if job is None:
+            return jsonify({'error': "Unknown job"}), 404
+        return jsonify(job)
+
+    @app.get('/clinics')
+    def clinics():
+        location = (request.args.get('location') or '').strip()
+        if not location:
+            return jsonify({'error': "'location' is required"}), 400
+        location_services = get_location_services()
+        with start_trace('clinic_search'):
+            try:
+                results = sorted(location_services.iter_nearby_healthcare(
+                    location,
+                    radius=request.args.get('radius', 5000, type=int),
+                    type=request.args.get('type', 'hospital')
+                ), key=lambda result: result['rank'])
+            except LocationNotFound as e:
+                # The client's address is at fault, not the upstream API
+                return jsonify({'error': str(e)}), 404
+            except Exception as e:
+                return jsonify({'error': f"Error finding healthcare facilities: {str(e)}"}), 502
+            if request.args.get('sort') == 'travel_time':
+                results = location_services.rank_by_travel_time(location, results, mode=request.args.get('mode', 'driving'))
+        if isinstance(results, str):
+            return jsonify({'error': results}), 502
+        return jsonify({'clinics': results})
+
+    @app.get('/metrics')
+    def metrics():
+        return Response(get_metrics().prometheus_text(), mimetype='text/plain; version=0.0.4')
+
+    @app.errorhandler(413)
+    def upload_too_large(error):
+        return jsonify({'error': f"File is larger than {app.config['MAX_CONTENT_LENGTH']} bytes"}), 413
+
+    return app
+
+
+app = create_app()
@@ -0,0 +1,60 @@
+import hashlib
+import hmac
+import os
+import secrets
+import uuid
+
+_secret = None
+
+
+def _secret_key():
+    """The key session tokens are signed with.
+
+    API_SECRET_KEY should be set when the API runs on several nodes. Without
+    it a key is generated once into data/api_secret_key, which every worker
+    process on this machine then shares.
+    """
+    global _secret
+    if _secret is None:
+        configured = os.getenv('API_SECRET_KEY')
+        if configured:
+            _secret = configured.encode('utf-8')
+        else:
+            _secret = _shared_key_file('data/api_secret_key')
+    return _secret
+
+
+def _shared_key_file(path):
+    """Read the key in path, creating it first if no worker has yet"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        pass
+    else:
+        with os.fdopen(fd, 'w') as f:
+            f.write(secrets.token_hex(32))
+    with open(path, 'r') as f:
+        key = f.read().strip()
+    if not key:
+        # Another worker created the file but has not written the key yet
+        raise RuntimeError("Session key is not ready; please retry")
+    return key.encode('utf-8')
+
+
+def session_token(session_id):
+    """The bearer token that grants access to a session"""
+    return hmac.new(_secret_key(), session_id.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def issue_session():
+    """Create a new session; return (session_id, token)"""
+    session_id = uuid.uuid4().hex
+    return session_id, session_token(session_id)
+
+
+def is_valid_token(session_id, token):
+    """Whether token grants access to session_id"""
+    if not session_id or not token:
+        return False
+    return hmac.compare_digest(session_token(session_id), token)
@@ -0,0 +1,236 @@
+"""Analyze a folder of lab reports from the command line.
+
+Text is extracted in a process pool and the extracted reports are analyzed
+by a bounded number of concurrent Gemini requests. Each finished report is
+appended to a JSONL file straight away; the same file is the checkpoint, so
+an interrupted run picks up where it stopped and only retries failures.
+
+    medical-chatbot-batch reports/ --output results.jsonl
+    python -m src.batch.batch_analyze reports/ --output results.jsonl
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent runs on one output are not detected
+    fcntl = None
+
+_processor = None
+
+
+class OutputInUse(Exception):
+    """Raised when another batch run is already appending to the output file"""
+
+
+def find_reports(directory, allowed_types):
+    """Paths of the reports under directory, in a stable order"""
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in allowed_types:
+                paths.append(os.path.join(root, name))
+    return paths
+
+
+def file_hash(path):
+    """SHA-256 of a file, the same key the app's document cache uses"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_checkpoint(output_path):
+    """Hashes of the reports already analyzed successfully in output_path.
+
+    A damaged line is skipped, so its report is simply analyzed again. Only
+    a final line without its newline, left by a run killed mid-write, is cut
+    off, so the next record starts on a line of its own.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    # newline='' keeps line endings as written, so byte offsets stay exact
+    with open(output_path, 'r+', encoding='utf-8', newline='') as f:
+        complete_bytes = 0
+        for line in f:
+            if not line.endswith("\n"):
+                # Only the last line can be unterminated
+                f.truncate(complete_bytes)
+                break
+            complete_bytes += len(line.encode('utf-8'))
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and record.get('status') == 'done' and record.get('hash'):
+                done.add(record['hash'])
+    return done
+
+
+def lock_output(output):
+    """Take an exclusive lock on the open output file, so two runs cannot append to it at once"""
+    if fcntl is None:
+        return
+    try:
+        fcntl.flock(output.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        raise OutputInUse(f"{output.name} is in use by another batch run")
+
+
+def _extract_in_worker(path):
+    """Extract one report; runs in the extraction worker processes"""
+    global _processor
+    from src.document.document_processor import DocumentProcessor
+    from src.document.report_analysis import extract_report
+
+    if _processor is None:
+        # The batch pool already uses every core, so each worker extracts its
+        # pages in-process rather than starting pools of its own
+        _processor = DocumentProcessor(max_workers=1)
+    start = time.perf_counter()
+    extraction = extract_report(path, _processor)
+    extraction['extract_seconds'] = round(time.perf_counter() - start, 3)
+    return extraction
+
+
+def _analyze(path, digest, extraction):
+    """Analyze one extracted report; runs on the LLM threads"""
+    from src.document.report_analysis import analyze_extraction
+
+    start = time.perf_counter()
+    try:
+        result = analyze_extraction(digest, extraction['text'], extraction['lab_values'])
+    except Exception as e:
+        result = {'analysis': None, 'error': f"Error analyzing lab report: {str(e)}"}
+    return {
+        'path': path,
+        'hash': digest,
+        'status': 'failed' if result['error'] else 'done',
+        'error': result['error'],
+        'lab_values': extraction['lab_values'],
+        'analysis': result['analysis'],
+        'extract_seconds': extraction.get('extract_seconds', 0.0),
+        'analyze_seconds': round(time.perf_counter() - start, 3),
+        'finished': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+
+def run_batch(paths, output_path, workers, llm_concurrency):
+    """Analyze paths, appending one JSON record per report to output_path; return the summary"""
+    from src.document.report_analysis import cache_extraction, cached_extraction
+    from src.utils.process_pool import pool_context
+
+    summary = {'found': len(paths), 'skipped': 0, 'done': 0, 'failed': 0}
+    start = time.perf_counter()
+
+    with open(output_path, 'a', encoding='utf-8') as output, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=pool_context()) as extract_pool, \
+            ThreadPoolExecutor(max_workers=llm_concurrency, thread_name_prefix="batch-llm") as llm_pool:
+        # Locked before the checkpoint is read, so it cannot change underneath this run
+        lock_output(output)
+        done = load_checkpoint(output_path)
+
+        def write(record):
+            output.write(json.dumps(record) + "\n")
+            # Flushed per report, so a crash loses at most the report in flight
+            output.flush()
+            os.fsync(output.fileno())
+            summary[record['status']] += 1
+            print(f"[{summary['done'] + summary['failed']}/{summary['found'] - summary['skipped']}] "
+                  f"{record['status']:6} {record['path']}", file=sys.stderr)
+
+        def analyze(path, digest, extraction):
+            if extraction['error']:
+                write({'path': path, 'hash': digest, 'status': 'failed', 'error': extraction['error']})
+                return None
+            return llm_pool.submit(_analyze, path, digest, extraction)
+
+        pending = set()
+        extracting = {}
+        for path in paths:
+            digest = file_hash(path)
+            if digest in done:
+                summary['skipped'] += 1
+                continue
+            # Reports extracted by an earlier run (or the app) go straight to analysis
+            extraction = cached_extraction(digest)
+            if extraction is not None:
+                future = analyze(path, digest, extraction)
+            else:
+                future = extract_pool.submit(_extract_in_worker, path)
+                extracting[future] = (path, digest)
+            if future is not None:
+                pending.add(future)
+            # Bounded lookahead keeps at most a few extracted reports in memory
+            while len(pending) >= 2 * (workers + llm_concurrency):
+                pending = _drain(pending, extracting, analyze, write, cache_extraction)
+        while pending:
+            pending = _drain(pending, extracting, analyze, write, cache_extraction)
+
+    summary['seconds'] = round(time.perf_counter() - start, 2)
+    processed = summary['done'] + summary['failed']
+    summary['reports_per_minute'] = round(processed / summary['seconds'] * 60, 1) if summary['seconds'] else 0.0
+    return summary
+
+
+def _drain(pending, extracting, analyze, write, cache_extraction):
+    """Handle finished futures: extractions move on to analysis, analyses are written"""
+    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+    for future in finished:
+        if future in extracting:
+            path, digest = extracting.pop(future)
+            try:
+                extraction = future.result()
+            except Exception as e:
+                extraction = {'text': None, 'lab_values': [], 'error': f"Error extracting text: {str(e)}"}
+            cache_extraction(digest, extraction)
+            next_future = analyze(path, digest, extraction)
+            if next_future is not None:
+                pending.add(next_future)
+        else:
+            write(future.result())
+    return pending
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Analyze every lab report in a folder")
+    parser.add_argument('directory', help="folder of reports; searched recursively")
+    parser.add_argument('--output', default='batch_results.jsonl', help="JSONL results file, also used to resume")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="text extraction processes")
+    parser.add_argument('--llm-concurrency', type=int, default=4, help="concurrent Gemini analyses")
+    args = parser.parse_args()
+
+    allowed_types = os.getenv('ALLOWED_FILE_TYPES', '.pdf,.jpg,.jpeg,.png').split(',')
+    paths = find_reports(args.directory, allowed_types)
+    if not paths:
+        print(f"No reports found in {args.directory}", file=sys.stderr)
+        return 1
+
+    try:
+        summary = run_batch(paths, args.output, max(1, args.workers), max(1, args.llm_concurrency))
+    except OutputInUse as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    print(
+        f"\n{summary['done']} analyzed, {summary['failed']} failed, {summary['skipped']} already done "
+        f"of {summary['found']} reports in {summary['seconds']:.1f}s "
+        f"({summary['reports_per_minute']:.1f} reports/min)"
+    )
+    print(f"Results: {args.output}")
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+
+def normalize_prompt(text):
+    """Normalize a prompt so trivially different phrasings share a cache entry.
+
+    Only case, whitespace and trailing punctuation are dropped: comparison
+    operators, signs and decimal points change a medical question's meaning
+    ("glucose <70" is not "glucose >70").
+    """
+    text = " ".join(text.lower().split())
+    return re.sub(r"[\s?!.,;:]+$", "", text)
+
+
+class ResponseCache:
+    """SQLite-backed response cache with TTL and size-bounded LRU eviction"""
+
+    def __init__(self, db_path='data/cache/responses.db', ttl_seconds=7 * 24 * 3600, max_entries=10000):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)")
+        self._conn.commit()
+
+    def make_key(self, kind, prompt, model_name, prompt_version, exact=False):
+        """Build the cache key for a prompt, model and system prompt version.
+
+        Chat questions are normalized so trivially different phrasings share
+        an entry. Pass exact=True for prompts where punctuation and case carry
+        meaning (a lab report's "<5.0" or "1,50,000"); they key on the exact text.
+        """
+        text = prompt if exact else normalize_prompt(prompt)
+        raw = "\x1f".join([kind, model_name, prompt_version, "exact" if exact else "normalized", text])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return the cached response for key, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            response, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return response
+
+    def put(self, key, response):
+        """Store a response, evicting the least recently used entries beyond max_entries"""
+        # An empty answer (a stream that produced nothing) must not be served again
+        if not response or not response.strip():
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, response, now, now)
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                cursor = self._conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+                self.evictions += cursor.rowcount
+            self._conn.commit()
+
+    def purge_expired(self):
+        """Delete all expired entries"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def clear(self):
+        """Delete every entry"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self):
+        """Return hit/miss counters and the current size"""
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'size': size
+        }
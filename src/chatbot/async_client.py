@@ -0,0 +1,220 @@
+import asyncio
+import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from src.utils.metrics import current_trace, get_metrics, record_tokens, set_current_trace
+from src.utils.rate_limiter import PRIORITY_INTERACTIVE, backoff_delay, is_retryable
+
+_STREAM_END = object()
+
+
+class AsyncLLMClient:
+    """Runs model calls on one shared asyncio event loop.
+
+    Every call goes through the same loop thread, so the SDK's async
+    transport keeps one pooled connection instead of a blocking request per
+    Streamlit script thread. A semaphore caps concurrent upstream calls,
+    each call has a timeout, and identical prompts already in flight are
+    coalesced into a single upstream call whose result every waiter shares.
+    Upstream calls take a token from the shared rate limiter before a
+    concurrency slot, so a call waiting on the quota never holds a slot, and
+    are retried with jittered backoff when rate limited or on server errors.
+
+    Models only need generate_content_async(contents, stream=False), so a
+    local fake can stand in for Gemini.
+    """
+
+    def __init__(self, max_concurrency=8, timeout=60, rate_limiter=None, retries=2):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.retries = retries
+        self.upstream_calls = 0
+        self.coalesced_calls = 0
+        self.timeouts = 0
+        self.retried_calls = 0
+        self._inflight = {}
+        self._loop = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._lock = threading.Lock()
+        # One thread for every request the limiter can queue, so waiters are
+        # ordered by the limiter's priority heap rather than by a FIFO in front of it
+        self._token_waiters = None
+        if rate_limiter is not None:
+            self._token_waiters = ThreadPoolExecutor(
+                max_workers=rate_limiter.max_queue + 1,
+                thread_name_prefix="llm-rate-limit"
+            )
+
+    def _get_loop(self):
+        """Start the background event loop on first use"""
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                threading.Thread(target=run, name="llm-event-loop", daemon=True).start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+    def _flight_key(self, model, contents):
+        """Identity of a request; equal keys share one upstream call"""
+        return id(model), json.dumps(contents, sort_keys=True, default=str)
+
+    async def _wait_for_token(self, priority):
+        """Take a rate limiter token; the limiter blocks, so it waits on a dedicated thread"""
+        if self.rate_limiter is not None:
+            await asyncio.get_running_loop().run_in_executor(self._token_waiters, self.rate_limiter.acquire, priority)
+
+    async def _with_retries(self, call, priority, retries):
+        """Await call() under the rate limiter, retrying retryable errors with backoff"""
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            await self._wait_for_token(priority)
+            try:
+                return await call()
+            except Exception as e:
+                if attempt == retries or not is_retryable(e):
+                    raise
+                self.retried_calls += 1
+                await asyncio.sleep(backoff_delay(attempt))
+
+    async def agenerate(self, model, contents, priority=PRIORITY_INTERACTIVE, retries=None):
+        """Generate text for contents, sharing the result with identical in-flight requests"""
+        key = self._flight_key(model, contents)
+        task = self._inflight.get(key)
+        if task is None:
+            self.upstream_calls += 1
+            task = asyncio.ensure_future(
+                self._with_retries(lambda: self._generate_once(model, contents), priority, retries)
+            )
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced_calls += 1
+        # Shielded so a waiter giving up does not cancel the call for the others
+        return await asyncio.shield(task)
+
+    async def _generate_once(self, model, contents):
+        """Make one upstream call under the concurrency limit; the timeout includes waiting for a slot"""
+        try:
+            response = await asyncio.wait_for(self._call_model(model, contents), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise TimeoutError(f"Model request timed out after {self.timeout} seconds")
+        record_tokens(getattr(response, 'usage_metadata', None))
+        return response.text
+
+    async def _call_model(self, model, contents):
+        async with self._semaphore:
+            get_metrics().increment('upstream_calls_total', api='gemini')
+            return await model.generate_content_async(contents)
+
+    async def _open_stream(self, model, contents):
+        """Start a streamed upstream call; once it has started, the caller must release the semaphore.
+
+        The timeout includes waiting for a slot.
+        """
+        try:
+            return await asyncio.wait_for(self._start_stream(model, contents), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise TimeoutError(f"Model request timed out after {self.timeout} seconds")
+
+    async def _start_stream(self, model, contents):
+        await self._semaphore.acquire()
+        try:
+            get_metrics().increment('upstream_calls_total', api='gemini')
+            return await model.generate_content_async(contents, stream=True)
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    async def astream(self, model, contents, priority=PRIORITY_INTERACTIVE, retries=None):
+        """Yield generated text chunks; the timeout applies to each chunk"""
+        # Streams are personal to the caller, so they are not coalesced.
+        # Only opening the stream is retried; text already yielded can't be taken back
+        self.upstream_calls += 1
+        response = await self._with_retries(lambda: self._open_stream(model, contents), priority, retries)
+        usage_metadata = None
+        try:
+            chunks = response.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), self.timeout)
+                except StopAsyncIteration:
+                    # The last chunk carries the usage of the whole response
+                    record_tokens(usage_metadata)
+                    return
+                usage_metadata = getattr(chunk, 'usage_metadata', None) or usage_metadata
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks without text parts (e.g. blocked by safety filters)
+                    continue
+                if text:
+                    yield text
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise TimeoutError(f"Model request timed out after {self.timeout} seconds")
+        finally:
+            self._semaphore.release()
+
+    def generate(self, model, contents, priority=PRIORITY_INTERACTIVE, retries=None):
+        """Blocking wrapper around agenerate for synchronous callers"""
+        trace = current_trace()
+
+        async def traced():
+            # Tasks copy the loop thread's context, so the caller's trace is carried over
+            set_current_trace(trace)
+            return await self.agenerate(model, contents, priority, retries)
+
+        future = asyncio.run_coroutine_threadsafe(traced(), self._get_loop())
+        return future.result()
+
+    def stream(self, model, contents, priority=PRIORITY_INTERACTIVE, retries=None):
+        """Blocking generator wrapper around astream for synchronous callers"""
+        chunks = queue.Queue()
+        trace = current_trace()
+
+        async def pump():
+            set_current_trace(trace)
+            try:
+                async for text in self.astream(model, contents, priority, retries):
+                    chunks.put(text)
+            except BaseException as e:
+                chunks.put(e)
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+            finally:
+                chunks.put(_STREAM_END)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._get_loop())
+        try:
+            while True:
+                item = chunks.get()
+                if item is _STREAM_END:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # Stop the upstream stream if the caller abandons it
+            future.cancel()
+
+    def stats(self):
+        """Return call counters and the number of requests in flight"""
+        return {
+            'upstream_calls': self.upstream_calls,
+            'coalesced_calls': self.coalesced_calls,
+            'timeouts': self.timeouts,
+            'retried_calls': self.retried_calls,
+            'in_flight': len(self._inflight)
+        }
@@ -1,15 +1,206 @@
-import google.generativeai as genai
+import contextvars
+import hashlib
 import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
+from src.cache.response_cache import ResponseCache
+from src.chatbot.async_client import AsyncLLMClient
+from src.utils.metrics import get_metrics, span
+from src.utils.rate_limiter import PRIORITY_BATCH, PRIORITY_INTERACTIVE, RateLimitExceeded, get_rate_limiter
+from src.document.lab_parser import MIN_ROWS_FOR_TABLE, PARSER_VERSION, format_lab_table
+
+MODEL_NAME = "models/gemini-1.5-pro"
+
+# Reports longer than this are analyzed chunk by chunk and then merged
+LONG_REPORT_CHARS = 12000
+REPORT_CHUNK_CHARS = 6000
+
+# Bumped whenever the lab report prompts change, so cached analyses are redone
+LAB_PROMPT_VERSION = 2
+
+# Lab report analyses run on their own model: the chat system prompt's
+# instructions (asking about headaches, say) have no place in a report
+LAB_SYSTEM_PROMPT = """You explain laboratory test results to patients.
+Describe the findings in plain language, point out values outside their
+reference ranges, never give a diagnosis, and recommend discussing the
+results with a healthcare professional."""
+
+# Shown instead of an error when the Gemini request queue is full
+BUSY_MESSAGE = "The assistant is handling a lot of requests right now. Please try again in a moment."
+
+# Models are created once per process and shared, so the system prompt is
+# sent as a system instruction instead of being concatenated on every turn
+_models = {}
+_models_lock = threading.Lock()
+_configured_api_key = None
+_llm_client = None
+
+
+def _genai():
+    """Import the Gemini SDK on first use"""
+    import google.generativeai as genai
+    return genai
+
+
+def _configure(api_key):
+    """Configure the Gemini client once per process"""
+    global _configured_api_key
+    with _models_lock:
+        if _configured_api_key != api_key:
+            _genai().configure(api_key=api_key)
+            _configured_api_key = api_key
+
+
+def _shared_model(model_name, system_instruction=None):
+    """Return the process-wide model for a name and system instruction"""
+    key = (model_name, system_instruction)
+    with _models_lock:
+        if key not in _models:
+            _models[key] = _genai().GenerativeModel(
+                model_name=model_name,
+                system_instruction=system_instruction
+            )
+        return _models[key]
+
+
+def _shared_llm_client():
+    """Return the process-wide async client every model call goes through"""
+    global _llm_client
+    with _models_lock:
+        if _llm_client is None:
+            _llm_client = AsyncLLMClient(
+                max_concurrency=int(os.getenv('LLM_MAX_CONCURRENCY', 8)),
+                timeout=float(os.getenv('LLM_TIMEOUT_SECONDS', 60)),
+                rate_limiter=get_rate_limiter('gemini'),
+                retries=int(os.getenv('LLM_MAX_RETRIES', 2))
+            )
+        return _llm_client
+
+
+def _is_section_heading(line):
+    """Whether a line looks like a panel heading such as 'LIPID PROFILE'"""
+    line = line.strip()
+    return 4 <= len(line) <= 60 and not re.search(r'\d', line) and line.isupper()
+
+
+def split_report(report_text, max_chars=REPORT_CHUNK_CHARS):
+    """Split a report into chunks of at most max_chars, breaking at panel headings where possible"""
+    sections = []
+    current = []
+    for line in report_text.splitlines():
+        if _is_section_heading(line) and current:
+            sections.append(current)
+            current = []
+        current.append(line)
+    if current:
+        sections.append(current)
+
+    chunks = []
+    chunk = []
+    size = 0
+    for section in sections:
+        section_size = sum(len(line) + 1 for line in section)
+        if chunk and size + section_size > max_chars:
+            chunks.append("\n".join(chunk))
+            chunk, size = [], 0
+        # Panels larger than a whole chunk are split at line boundaries
+        for line in section:
+            if chunk and size + len(line) + 1 > max_chars:
+                chunks.append("\n".join(chunk))
+                chunk, size = [], 0
+            chunk.append(line)
+            size += len(line) + 1
+    if chunk:
+        chunks.append("\n".join(chunk))
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def estimate_tokens(text):
+    """Roughly estimate the token count of text (about 4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+class Conversation:
+    """Token-budgeted window of recent turns plus a rolling summary of older ones"""
+
+    def __init__(self, max_context_tokens=2000):
+        self.max_context_tokens = max_context_tokens
+        self.summary = ""
+        self.turns = []
+
+    @classmethod
+    def from_history(cls, chat_history, max_context_tokens=2000):
+        """Build a conversation from stored chat messages"""
+        conversation = cls(max_context_tokens=max_context_tokens)
+        # Anything beyond twice the budget would be folded straight away;
+        # it is already persisted, so only keep the recent tail
+        budget = 2 * max_context_tokens
+        start = len(chat_history)
+        while start > 0:
+            budget -= estimate_tokens(chat_history[start - 1]["content"])
+            if budget < 0:
+                break
+            start -= 1
+
+        # Gemini expects turns to alternate starting with the user
+        for message in chat_history[start:]:
+            if not conversation.turns and message["role"] != "user":
+                continue
+            if conversation.turns and conversation.turns[-1]["role"] == message["role"]:
+                # Half of a broken pair (e.g. a reply that failed to save); fold it into its neighbour
+                conversation.turns[-1]["content"] += "\n\n" + message["content"]
+            else:
+                conversation.turns.append({"role": message["role"], "content": message["content"]})
+        # An unanswered question would sit right before the next one
+        if conversation.turns and conversation.turns[-1]["role"] == "user":
+            conversation.turns.pop()
+        return conversation
+
+    def add_exchange(self, user_input, response):
+        """Record a completed user/assistant exchange"""
+        self.turns.append({"role": "user", "content": user_input})
+        self.turns.append({"role": "assistant", "content": response})
+
+    def window_tokens(self):
+        """Estimated tokens used by the summary and the recent turns"""
+        return estimate_tokens(self.summary) + sum(estimate_tokens(turn["content"]) for turn in self.turns)
+
+    def needs_folding(self):
+        """Whether the window has outgrown its token budget"""
+        return self.window_tokens() > self.max_context_tokens
+
+    def pop_oldest_turns(self):
+        """Remove and return the oldest turns until the window is at half its budget"""
+        # Folding down to half the budget means a summary call only happens
+        # every few turns rather than on every turn once the budget is reached
+        folded = []
+        while self.turns and self.window_tokens() > self.max_context_tokens // 2:
+            folded.append(self.turns.pop(0))
+        # Keep the window starting with a user turn
+        while self.turns and self.turns[0]["role"] != "user":
+            folded.append(self.turns.pop(0))
+        return folded
+
+    def build_contents(self, user_input):
+        """Build the multi-turn request contents for a new user message"""
+        contents = []
+        if self.summary:
+            contents.append({"role": "user", "parts": [f"Summary of our conversation so far:\n{self.summary}"]})
+            contents.append({"role": "model", "parts": ["Understood, I will keep this in mind."]})
+        for turn in self.turns:
+            role = "model" if turn["role"] == "assistant" else "user"
+            contents.append({"role": role, "parts": [turn["content"]]})
+        contents.append({"role": "user", "parts": [user_input]})
+        return contents
+
 
 class MedicalChatbot:
-    def __init__(self):
+    def __init__(self, model_name=MODEL_NAME, cache=None, use_cache=True, llm_client=None):
         load_dotenv()
         self.api_key = os.getenv('GEMINI_API_KEY')
-        genai.configure(api_key=self.api_key)
-        
-        
-        self.model = genai.GenerativeModel(model_name="models/gemini-1.5-pro")
+        _configure(self.api_key)
         
         
         self.system_prompt = """You are a medical assistant chatbot. Your role is to:
@@ -35,36 +226,332 @@ class MedicalChatbot:
           * Any underlying conditions
         """
     
-    def get_response(self, user_input):
+
+        self.model_name = model_name
+        self.model = _shared_model(model_name, self.system_prompt)
+        self.summary_model = _shared_model(model_name)
+        self.lab_model = _shared_model(model_name, LAB_SYSTEM_PROMPT)
+        self.llm = llm_client or _shared_llm_client()
+
+        # Cached answers are invalidated whenever their system prompt changes
+        self.system_prompt_version = hashlib.sha256(self.system_prompt.encode('utf-8')).hexdigest()[:12]
+        self.lab_prompt_version = hashlib.sha256(LAB_SYSTEM_PROMPT.encode('utf-8')).hexdigest()[:12]
+        if cache is None and use_cache:
+            cache = ResponseCache()
+        self.cache = cache
+        
+        metrics = get_metrics()
+        metrics.register_collector('llm_client', self.llm.stats)
+        if cache is not None:
+            metrics.register_collector('response_cache', cache.stats)
+
+    def warm_up(self):
+        """Open the connection to the Gemini API with a cheap metadata call"""
+        _genai().get_model(self.model_name)
+    
+    def get_response(self, user_input, conversation=None, use_cache=True):
         try:
+            cache_key = self._cache_key('chat', user_input, conversation, use_cache)
+            cached = self.cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                if conversation is not None:
+                    conversation.add_exchange(user_input, cached)
+                return cached
             
-            prompt = f"{self.system_prompt}\n\nUser: {user_input}\n\nAssistant:"
+            contents = self._chat_contents(user_input, conversation)
             
            
-            response = self.model.generate_content(prompt)
-            
+            with span('gemini.chat'):
+                response = self.llm.generate(self.model, contents)
             
-            return response.text
+            if cache_key:
+                self.cache.put(cache_key, response)
+            if conversation is not None:
+                conversation.add_exchange(user_input, response)
+            return response
         
+        except RateLimitExceeded:
+            return BUSY_MESSAGE
         except Exception as e:
             return f"I apologize, but I encountered an error: {str(e)}. Please try again or contact support if the issue persists."
     
-    def analyze_lab_report(self, report_text):
+    def stream_response(self, user_input, conversation=None, use_cache=True, on_complete=None):
+        """Yield the response to user input as it is generated.
+
+        on_complete gets the full response only when it was answered; an
+        error or busy message is streamed to the user but never passed on,
+        so callers can keep it out of the stored history.
+        """
+        def record(response):
+            if cache_key:
+                self.cache.put(cache_key, response)
+            if conversation is not None:
+                conversation.add_exchange(user_input, response)
+            if on_complete is not None:
+                on_complete(response)
+
+        try:
+            cache_key = self._cache_key('chat', user_input, conversation, use_cache)
+            cached = self.cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                if conversation is not None:
+                    conversation.add_exchange(user_input, cached)
+                yield cached
+                if on_complete is not None:
+                    on_complete(cached)
+                return
+            
+            contents = self._chat_contents(user_input, conversation)
+        except Exception as e:
+            yield f"I apologize, but I encountered an error: {str(e)}. Please try again or contact support if the issue persists."
+            return
+
+        yield from self._stream_content(
+            self.model,
+            contents,
+            "I apologize, but I encountered an error: {error}. Please try again or contact support if the issue persists.",
+            on_complete=record
+        )
+
+    def summarize_turns(self, summary, turns):
+        """Fold turns into the running conversation summary"""
+        transcript = "\n".join(f"{turn['role'].capitalize()}: {turn['content']}" for turn in turns)
+        prompt = f"""Update the running summary of a conversation between a user and a medical assistant.
+        Keep symptoms, durations, medications, conditions and advice already given.
+        Reply with the updated summary only, in at most 150 words.
+
+        Current summary:
+        {summary or "None"}
+
+        New messages:
+        {transcript}
+        """
+        with span('gemini.summarize'):
+            return self.llm.generate(self.summary_model, prompt).strip()
+
+    def _chat_contents(self, user_input, conversation):
+        """Build request contents, folding old turns into the summary when over budget"""
+        if conversation is None:
+            return user_input
+
+        if conversation.needs_folding():
+            folded = conversation.pop_oldest_turns()
+            try:
+                conversation.summary = self.summarize_turns(conversation.summary, folded)
+            except Exception:
+                # Without a summary the old turns are simply dropped; the
+                # window still stays inside its budget
+                pass
+        return conversation.build_contents(user_input)
+    
+    def _cache_key(self, kind, prompt, conversation=None, use_cache=True):
+        """Return the response cache key, or None when the cache must be bypassed"""
+        if not use_cache or self.cache is None:
+            return None
+        # Answers that depend on earlier turns are personal to the conversation
+        if conversation is not None and (conversation.turns or conversation.summary):
+            return None
+        if kind == 'chat':
+            return self.cache.make_key(kind, prompt, self.model_name, self.system_prompt_version)
+        # Report prompts carry values whose punctuation matters, so only chat is normalized
+        return self.cache.make_key(kind, prompt, self.model_name, self.lab_prompt_version, exact=True)
+    
+    def analyze_lab_report(self, report_text, use_cache=True, lab_values=None):
         try:
+            prompt = self._lab_report_prompt(report_text, lab_values)
+            cache_key = self._cache_key('lab_report', prompt, use_cache=use_cache)
+            cached = self.cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                return cached
            
-            prompt = f"""Analyze the following lab report and provide:
+            
+            
+            with span('gemini.lab_report'):
+                response = self.llm.generate(self.lab_model, prompt, priority=PRIORITY_BATCH)
+            if cache_key:
+                self.cache.put(cache_key, response)
+            return response
+        
+        except Exception as e:
+            return f"Error analyzing lab report: {str(e)}"
+    
+    def stream_lab_report_analysis(self, report_text, use_cache=True, on_complete=None, lab_values=None):
+        """Yield the lab report analysis as it is generated; on_complete gets the full text on success"""
+        def record(analysis):
+            if cache_key:
+                self.cache.put(cache_key, analysis)
+            if on_complete is not None:
+                on_complete(analysis)
+
+        try:
+            prompt = self._lab_report_prompt(report_text, lab_values)
+            cache_key = self._cache_key('lab_report', prompt, use_cache=use_cache)
+            cached = self.cache.get(cache_key) if cache_key else None
+        except Exception as e:
+            yield f"Error analyzing lab report: {str(e)}"
+            return
+        if cached is not None:
+            if on_complete is not None:
+                on_complete(cached)
+            yield cached
+            return
+
+        yield from self._stream_content(
+            self.lab_model,
+            prompt,
+            "Error analyzing lab report: {error}",
+            on_complete=record,
+            priority=PRIORITY_BATCH
+        )
+    
+    def analysis_variant(self, lab_values=None):
+        """Document cache variant of a report analysis; changes whenever its prompt or parsed input would"""
+        prompt_kind = "table" if lab_values and len(lab_values) >= MIN_ROWS_FOR_TABLE else "text"
+        return f"{self.model_name}_{self.lab_prompt_version}_{prompt_kind}_v{LAB_PROMPT_VERSION}_p{PARSER_VERSION}"
+    
+    def is_long_report(self, report_text, lab_values=None):
+        """Whether a report is long enough to be analyzed chunk by chunk"""
+        return len(self._lab_report_body(report_text, lab_values)) > LONG_REPORT_CHARS
+    
+    def iter_long_report_analysis(self, report_text, lab_values=None, max_workers=4, retries=2, use_cache=True):
+        """Analyze a long report chunk by chunk, then merge the results.
+
+        Yields {'chunk': index, 'total': n, 'text': analysis} as each chunk
+        finishes (in completion order), then the merged analysis as
+        {'chunk': None, 'total': n, 'text': analysis}.
+        """
+        body = self._lab_report_body(report_text, lab_values)
+        try:
+            cache_key = self._cache_key('lab_report_long', body, use_cache=use_cache)
+            cached = self.cache.get(cache_key) if cache_key else None
+        except Exception as e:
+            yield {'chunk': None, 'total': 0, 'text': f"Error analyzing lab report: {str(e)}"}
+            return
+        if cached is not None:
+            yield {'chunk': None, 'total': 0, 'text': cached}
+            return
+        
+        chunks = split_report(body)
+        partials = [None] * len(chunks)
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            # Each chunk runs in a copy of this context so its spans join the caller's trace
+            futures = {
+                executor.submit(
+                    contextvars.copy_context().run,
+                    self._analyze_report_chunk, chunk, index, len(chunks), retries
+                ): index
+                for index, chunk in enumerate(chunks)
+            }
+            failed = []
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    partials[index] = future.result()
+                except Exception as e:
+                    partials[index] = f"Error analyzing part {index + 1}: {str(e)}"
+                    failed.append(index + 1)
+                yield {'chunk': index, 'total': len(chunks), 'text': partials[index]}
+        finally:
+            # Stop queued chunks if the caller abandons the analysis
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        # A merge of incomplete parts would be cached and served as if it were whole
+        if failed:
+            parts = ", ".join(str(number) for number in sorted(failed))
+            yield {'chunk': None, 'total': len(chunks), 'text': f"Error analyzing lab report: part(s) {parts} could not be analyzed. Please try again."}
+            return
+        
+        try:
+            final = self._merge_report_analyses(partials, retries)
+        except Exception as e:
+            yield {'chunk': None, 'total': len(chunks), 'text': f"Error analyzing lab report: {str(e)}"}
+            return
+        if cache_key:
+            self.cache.put(cache_key, final)
+        yield {'chunk': None, 'total': len(chunks), 'text': final}
+    
+    def _generate_with_retries(self, prompt, retries):
+        """Generate batch text; rate limits and server errors are retried with jittered backoff"""
+        return self.llm.generate(self.lab_model, prompt, priority=PRIORITY_BATCH, retries=retries)
+    
+    def _analyze_report_chunk(self, chunk, index, total, retries):
+        """Analyze one part of a long report"""
+        prompt = f"""This is part {index + 1} of {total} of a single lab report.
+            List the tests in this part, any values outside normal ranges and other notable findings.
+            Be concise and do not give a diagnosis.
+            
+            Lab Report (part {index + 1} of {total}):
+            {chunk}
+            """
+        with span('gemini.lab_report_section'):
+            return self._generate_with_retries(prompt, retries)
+    
+    def _merge_report_analyses(self, partials, retries):
+        """Reduce the per-chunk analyses into one report analysis"""
+        parts = "\n\n".join(f"Part {index + 1}:\n{text}" for index, text in enumerate(partials))
+        prompt = f"""The following are analyses of consecutive parts of one lab report.
+            Combine them into a single analysis that provides:
             1. A summary of the key findings
             2. Any values that are outside normal ranges
             3. General interpretation (without diagnosis)
             4. Recommendations for follow-up
             
-            Lab Report:
-            {report_text}
+            Partial Analyses:
+            {parts}
             """
+        with span('gemini.lab_report_merge'):
+            return self._generate_with_retries(prompt, retries)
+    
+    def _lab_report_body(self, report_text, lab_values=None):
+        """The report content sent to the model: the parsed table when available, else the raw text"""
+        if lab_values and len(lab_values) >= MIN_ROWS_FOR_TABLE:
+            return format_lab_table(lab_values)
+        return report_text
+    
+    def _lab_report_prompt(self, report_text, lab_values=None):
+        """Build the lab report analysis prompt"""
+        # A parsed and pre-flagged table is far shorter than the raw report,
+        # which is only sent when too few values could be parsed locally
+        if lab_values and len(lab_values) >= MIN_ROWS_FOR_TABLE:
+            return f"""Analyze the following lab results. They were extracted from a lab report and
+            checked against their reference ranges; Flag is H (high), L (low) or empty (in range).
+            Provide:
+            1. A summary of the key findings
+            2. What the flagged values may indicate (without diagnosis)
+            3. Recommendations for follow-up
             
+            Lab Results:
+            {format_lab_table(lab_values)}
+            """
+        return f"""Analyze the following lab report and provide:
+            1. A summary of the key findings
+            2. Any values that are outside normal ranges
+            3. General interpretation (without diagnosis)
+            4. Recommendations for follow-up
             
-            response = self.model.generate_content(prompt)
-            return response.text
+            Lab Report:
+            {report_text}
+            """
+    
+    def _stream_content(self, model, contents, error_message, on_complete=None, priority=PRIORITY_INTERACTIVE):
+        """Stream generated text chunks, ending with error_message if generation fails"""
+        streamed = []
+        try:
+            with span('gemini.stream'):
+                for text in self.llm.stream(model, contents, priority=priority):
+                    streamed.append(text)
+                    yield text
         
+        except RateLimitExceeded:
+            yield BUSY_MESSAGE
+            return
         except Exception as e:
-            return f"Error analyzing lab report: {str(e)}" 
\ No newline at end of file
+            separator = "\n\n" if streamed else ""
+            yield separator + error_message.format(error=str(e))
+            return
+
+        # A stream that produced no text is not a result worth keeping
+        response = "".join(streamed)
+        if on_complete is not None and response.strip():
+            on_complete(response)
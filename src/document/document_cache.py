@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+from src.document.lab_parser import PARSER_VERSION
+
+LAB_VALUES_NAME = f"lab_values_v{PARSER_VERSION}.json"
+
+
+class DocumentCache:
+    """On-disk cache of extracted text and analyses, keyed by document content hash"""
+
+    def __init__(self, root='data/cache/documents', max_bytes=500 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Running total of cached bytes, counted from disk on the first write
+        self._size = None
+
+    @staticmethod
+    def content_hash(data):
+        """SHA-256 hex digest of document bytes"""
+        return hashlib.sha256(data).hexdigest()
+
+    def get_text(self, digest):
+        """Return the cached extracted text of a document, or None"""
+        return self._read(digest, 'text.txt')
+
+    def put_text(self, digest, text):
+        """Cache the extracted text of a document"""
+        self._write(digest, 'text.txt', text)
+
+    def get_analysis(self, digest, variant):
+        """Return the cached analysis of a document for a prompt/model variant, or None"""
+        return self._read(digest, self._analysis_name(variant))
+
+    def put_analysis(self, digest, variant, analysis):
+        """Cache the analysis of a document for a prompt/model variant"""
+        self._write(digest, self._analysis_name(variant), analysis)
+
+    def get_lab_values(self, digest):
+        """Return the cached parsed lab values of a document, or None"""
+        content = self._read(digest, LAB_VALUES_NAME)
+        return json.loads(content) if content is not None else None
+
+    def put_lab_values(self, digest, lab_values):
+        """Cache the parsed lab values of a document"""
+        self._write(digest, LAB_VALUES_NAME, json.dumps(lab_values))
+
+    def size_bytes(self):
+        """Total size of all cached entries"""
+        return sum(size for _, _, size in self._entries())
+
+    def _analysis_name(self, variant):
+        """File name of an analysis variant"""
+        return "analysis_" + re.sub(r'[^A-Za-z0-9_.-]', '_', variant) + ".txt"
+
+    def _entry_dir(self, digest):
+        """Directory holding everything cached for a digest"""
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _read(self, digest, name):
+        """Read a cached file, marking the entry as recently used"""
+        path = os.path.join(self._entry_dir(digest), name)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(self._entry_dir(digest))
+        except OSError:
+            pass
+        return content
+
+    def _write(self, digest, name, content):
+        """Atomically write a cached file, then evict beyond the size limit"""
+        directory = self._entry_dir(digest)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, name)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        added = os.path.getsize(tmp_path) - replaced
+        os.replace(tmp_path, path)
+        os.utime(directory)
+        self._add_size(added)
+
+    def _entries(self):
+        """List (last_used, path, size) for every cached entry"""
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for prefix in os.listdir(self.root):
+            prefix_dir = os.path.join(self.root, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for digest in os.listdir(prefix_dir):
+                directory = os.path.join(prefix_dir, digest)
+                try:
+                    size = sum(entry.stat().st_size for entry in os.scandir(directory))
+                    entries.append((os.stat(directory).st_mtime, directory, size))
+                except OSError:
+                    continue
+        return entries
+
+    def _add_size(self, added):
+        """Count written bytes, evicting only once the running total passes max_bytes"""
+        with self._lock:
+            if self._size is None:
+                self._size = self.size_bytes()
+            else:
+                self._size += added
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes.
+
+        The directory is rescanned here, which also picks up entries written
+        by other processes since the last scan. Called with the lock held.
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, _, size in entries)
+        for _, directory, size in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(directory, ignore_errors=True)
+            total -= size
+        self._size = total
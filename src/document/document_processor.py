@@ -1,92 +1,394 @@
-import pdfplumber
-import pytesseract
-from PIL import Image
+import hashlib
+import importlib.util
 import os
 import sys
+from src.document import ocr
+from src.utils.metrics import get_metrics, span
+from src.utils.process_pool import SharedProcessPool
 
-try:
-    import fitz  
-    PYMUPDF_AVAILABLE = True
-except ImportError:
-    PYMUPDF_AVAILABLE = False
+# The PDF, OCR and imaging libraries are imported on first use so that
+# loading this module stays cheap for pages that never process documents
+PYMUPDF_AVAILABLE = importlib.util.find_spec('fitz') is not None
+
+# Documents shorter than this are extracted in-process; below it the cost
+# of handing pages to worker processes outweighs the parallel speed-up
+PARALLEL_PAGE_THRESHOLD = 8
+PAGES_PER_TASK = 4
+
+# Pages with at least this many vector drawings are checked for ruled tables
+TABLE_DRAWINGS_THRESHOLD = 6
+
+# Embedded images narrower or shorter than this (in pixels) are bullets,
+# icons and rules rather than content, and are never extracted
+MIN_IMAGE_SIDE = 50
+
+# Scanned pages whose usable images cover less than this fraction of the
+# page are rasterized instead, as their content may be vector drawings
+MIN_IMAGE_COVERAGE = 0.5
+
+# Fewer distinct images than this are extracted in-process
+PARALLEL_IMAGE_THRESHOLD = 8
+IMAGES_PER_TASK = 4
+
+# The process pool shared by all PDF extractions
+_page_pool = SharedProcessPool()
+
+
+def _pdf_page_count(pdf_path):
+    """Number of pages in a PDF"""
+    if PYMUPDF_AVAILABLE:
+        import fitz
+        with fitz.open(pdf_path) as pdf:
+            return pdf.page_count
+    import pdfplumber
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+
+def _has_tables(page):
+    """Whether a PyMuPDF page looks table-heavy"""
+    try:
+        if len(page.get_drawings()) < TABLE_DRAWINGS_THRESHOLD:
+            return False
+        return len(page.find_tables().tables) > 0
+    except Exception:
+        return False
+
+
+def _iter_page_range(pdf_path, start, end):
+    """Yield the text of pages [start, end) from a single open document"""
+    if not PYMUPDF_AVAILABLE:
+        import pdfplumber
+        with pdfplumber.open(pdf_path) as pdf:
+            for index in range(start, end):
+                yield pdf.pages[index].extract_text() or ""
+        return
+
+    # PyMuPDF is the fast path; pdfplumber keeps table rows together better,
+    # so it is only opened for pages that contain tables
+    import fitz
+    plumber_pdf = None
+    try:
+        with fitz.open(pdf_path) as pdf:
+            for index in range(start, end):
+                page = pdf[index]
+                if _has_tables(page):
+                    if plumber_pdf is None:
+                        import pdfplumber
+                        plumber_pdf = pdfplumber.open(pdf_path)
+                    yield plumber_pdf.pages[index].extract_text() or ""
+                else:
+                    yield page.get_text() or ""
+    finally:
+        if plumber_pdf is not None:
+            plumber_pdf.close()
+
+
+def _extract_page_range(pdf_path, start, end):
+    """Extract the text of pages [start, end); runs in worker processes"""
+    return list(_iter_page_range(pdf_path, start, end))
+
+
+def _list_page_images(pdf_path, pages, min_side):
+    """Map each image xref to its size, display DPI and, per page, its coverage and placement.
+
+    Only image references are read here; nothing is decoded, so this is
+    cheap even for long documents.
+    """
+    import fitz
+
+    found = {}
+    with fitz.open(pdf_path) as pdf:
+        for index in pages:
+            page = pdf[index]
+            for image in page.get_images():
+                xref, width, height = image[0], image[2], image[3]
+                if min(width, height) < min_side:
+                    continue
+                placements = page.get_image_rects(xref, transform=True)
+                rects = [rect for rect, _ in placements]
+                entry = found.get(xref)
+                if entry is None:
+                    # The resolution OCR needs follows from how large the image is drawn
+                    dpi = round(width * 72 / rects[0].width) if rects and rects[0].width else None
+                    entry = found[xref] = {
+                        'xref': xref, 'width': width, 'height': height, 'dpi': dpi,
+                        'pages': [], 'coverage': {}, 'upright': {}, 'position': {}
+                    }
+                if index + 1 not in entry['pages']:
+                    entry['pages'].append(index + 1)
+                    page_area = abs(page.rect) or 1
+                    entry['coverage'][index + 1] = min(1.0, sum(abs(rect & page.rect) for rect in rects) / page_area)
+                    # Rotated or mirrored images (or pages) would reach OCR sideways
+                    entry['upright'][index + 1] = page.rotation == 0 and all(
+                        matrix.b == 0 and matrix.c == 0 and matrix.a > 0 and matrix.d > 0
+                        for _, matrix in placements
+                    )
+                    entry['position'][index + 1] = min(((rect.y0, rect.x0) for rect in rects), default=(0.0, 0.0))
+    return found
+
+
+def _extract_image_xrefs(pdf_path, xrefs):
+    """Return (xref, extension, bytes) for each image xref; runs in worker processes"""
+    import fitz
+
+    extracted = []
+    with fitz.open(pdf_path) as pdf:
+        for xref in xrefs:
+            image = pdf.extract_image(xref)
+            if image:
+                extracted.append((xref, image['ext'], image['image']))
+    return extracted
 
 class DocumentProcessor:
-    def __init__(self):
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
         
         if sys.platform == 'win32':
             tesseract_path = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
             if os.path.exists(tesseract_path):
+                import pytesseract
                 pytesseract.pytesseract.tesseract_cmd = tesseract_path
     
+    def warm_up(self):
+        """Check that Tesseract OCR is installed"""
+        if not ocr.tesseract_available():
+            raise RuntimeError("Tesseract OCR is not installed")
+    
     def extract_text_from_pdf(self, pdf_path):
         """Extract text from PDF file"""
         try:
-            text = ""
-            with pdfplumber.open(pdf_path) as pdf:
-                for page in pdf.pages:
-                    text += page.extract_text() + "\n"
-            return text
+            with span('document.pdf_text'):
+                texts = [text for _, text in self.iter_pdf_pages(pdf_path)]
+            return "\n".join(texts) + "\n" if texts else ""
         except Exception as e:
             return f"Error extracting text from PDF: {str(e)}"
     
+    def iter_pdf_pages(self, pdf_path, start=0, end=None):
+        """Yield (page_index, text) for pages [start, end) in order, as soon as each is ready"""
+        page_count = _pdf_page_count(pdf_path)
+        end = page_count if end is None else min(end, page_count)
+        if start >= end:
+            return
+        
+        if end - start < PARALLEL_PAGE_THRESHOLD or self.max_workers < 2:
+            for index, text in enumerate(_iter_page_range(pdf_path, start, end), start):
+                yield index, text
+            return
+        
+        task_starts = list(range(start, end, PAGES_PER_TASK))
+        done = _page_pool.iter_done(
+            self.max_workers,
+            _extract_page_range,
+            [(pdf_path, task_start, min(task_start + PAGES_PER_TASK, end)) for task_start in task_starts]
+        )
+        try:
+            for task_start, future in zip(task_starts, done):
+                for offset, text in enumerate(future.result()):
+                    yield task_start + offset, text
+        finally:
+            # Drop work nobody will read if the caller stops early
+            done.close()
+    
     def extract_text_from_image(self, image_path):
         """Extract text from image using OCR"""
         try:
-            
-            try:
-                pytesseract.get_tesseract_version()
-            except Exception:
+            if not ocr.tesseract_available():
                 return "Tesseract OCR is not installed. Please install Tesseract OCR to enable image text extraction."
             
             
-            image = Image.open(image_path)
-            
-            
-            text = pytesseract.image_to_string(image)
-            return text
+            with span('document.image_ocr'):
+                return ocr.ocr_image_file(image_path)['text']
         except Exception as e:
             return f"Error extracting text from image: {str(e)}"
     
     def process_document(self, file_path):
         """Process document based on file type"""
+        return self.process_document_detailed(file_path)['text']
+    
+    def process_document_detailed(self, file_path):
+        """Process a document; return its text plus per-page OCR timing and confidence"""
         file_extension = os.path.splitext(file_path)[1].lower()
         
         if file_extension == '.pdf':
-            return self.extract_text_from_pdf(file_path)
+            return self.extract_pdf_with_ocr(file_path)
         elif file_extension in ['.jpg', '.jpeg', '.png']:
-            return self.extract_text_from_image(file_path)
+            if not ocr.tesseract_available():
+                return {'text': self.extract_text_from_image(file_path), 'ocr_pages': [], 'error': True}
+            try:
+                with span('document.image_ocr'):
+                    result = ocr.ocr_image_file(file_path)
+                get_metrics().increment('document_pages_total', kind='ocr')
+                result['page'] = 1
+                return {'text': result['text'], 'ocr_pages': [result], 'error': False}
+            except Exception as e:
+                return {'text': f"Error extracting text from image: {str(e)}", 'ocr_pages': [], 'error': True}
         else:
-            return "Unsupported file format. Please upload a PDF or image file."
+            return {'text': "Unsupported file format. Please upload a PDF or image file.", 'ocr_pages': [], 'error': True}
     
-    def extract_images_from_pdf(self, pdf_path, output_dir):
-        """Extract images from PDF file"""
-        if not PYMUPDF_AVAILABLE:
-            return "PyMuPDF is not installed. Please install it to enable image extraction from PDFs."
-            
+    def extract_pdf_with_ocr(self, pdf_path):
+        """Extract PDF text, OCRing pages that have no text layer"""
         try:
+            with span('document.pdf_text'):
+                texts = [text for _, text in self.iter_pdf_pages(pdf_path)]
+            scanned = [index for index, text in enumerate(texts) if ocr.needs_ocr(text)]
+            metrics = get_metrics()
+            metrics.increment('document_pages_total', len(texts) - len(scanned), kind='text')
             
-            os.makedirs(output_dir, exist_ok=True)
+            ocr_pages = []
+            if scanned and not ocr.tesseract_available():
+                # Blank pages must not be cached or analyzed as if they were the report
+                return {
+                    'text': f"{len(scanned)} page(s) of this PDF are scanned images. Please install Tesseract OCR to extract their text.",
+                    'ocr_pages': [],
+                    'error': True
+                }
+            if scanned:
+                with span('document.pdf_ocr'):
+                    ocr_pages = self.ocr_scanned_pages(pdf_path, scanned)
+                metrics.increment('document_pages_total', len(ocr_pages), kind='ocr')
+                for result in ocr_pages:
+                    texts[result['page'] - 1] = result['text']
             
+            return {
+                'text': "\n".join(texts) + "\n" if texts else "",
+                'ocr_pages': ocr_pages,
+                'error': False
+            }
+        except Exception as e:
+            return {'text': f"Error extracting text from PDF: {str(e)}", 'ocr_pages': [], 'error': True}
+    
+    def extract_table_rows(self, pdf_path):
+        """Extract the rows of all tables in a PDF"""
+        try:
+            import pdfplumber
+            rows = []
+            with span('document.tables'), pdfplumber.open(pdf_path) as pdf:
+                for page in pdf.pages:
+                    for table in page.extract_tables():
+                        rows.extend(row for row in table if any(row))
+            return rows
+        except Exception:
+            return []
+    
+    def extract_images_from_pdf(self, pdf_path, output_dir=None, pages=None, min_side=MIN_IMAGE_SIDE):
+        """Extract the distinct images of a PDF in native format, in page order.
+
+        An image drawn on many pages (a letterhead logo, say) is extracted
+        once, by xref and then by content hash for copies stored under
+        several xrefs. Each result has xref, ext, width, height, dpi, hash
+        and the 1-based pages it appears on, plus its bytes as data, or as
+        a file under output_dir when one is given. Per page it also has
+        coverage, the share of the page's area it is drawn over, upright,
+        whether it is drawn unrotated on an unrotated page, and position,
+        the (top, left) of its first placement.
+        """
+        if not PYMUPDF_AVAILABLE:
+            return "PyMuPDF is not installed. Please install it to enable image extraction from PDFs."
             
-            pdf_document = fitz.open(pdf_path)
+        try:
+            with span('document.images'):
+                if pages is None:
+                    pages = range(_pdf_page_count(pdf_path))
+                found = _list_page_images(pdf_path, pages, min_side)
+                xrefs = list(found)
             
+                if len(xrefs) < PARALLEL_IMAGE_THRESHOLD or self.max_workers < 2:
+                    extracted = _extract_image_xrefs(pdf_path, xrefs)
+                else:
+                    done = _page_pool.iter_done(
+                        self.max_workers,
+                        _extract_image_xrefs,
+                        [(pdf_path, xrefs[start:start + IMAGES_PER_TASK]) for start in range(0, len(xrefs), IMAGES_PER_TASK)]
+                    )
+                    extracted = [item for future in done for item in future.result()]
             
-            image_paths = []
-            for page_num in range(len(pdf_document)):
-                page = pdf_document[page_num]
-                image_list = page.get_images()
-                
-                for img_index, img in enumerate(image_list):
-                    xref = img[0]
-                    base_image = pdf_document.extract_image(xref)
-                    image_bytes = base_image["image"]
-                    
-                    
-                    image_path = os.path.join(output_dir, f"page_{page_num + 1}_img_{img_index + 1}.png")
-                    with open(image_path, "wb") as img_file:
-                        img_file.write(image_bytes)
-                    image_paths.append(image_path)
+            images = []
+            by_hash = {}
+            for xref, ext, data in extracted:
+                entry = found[xref]
+                digest = hashlib.sha256(data).hexdigest()
+                if digest in by_hash:
+                    # The same picture stored twice; merge where it appears
+                    duplicate = by_hash[digest]
+                    duplicate['pages'] = sorted(set(duplicate['pages']) | set(entry['pages']))
+                    for page, share in entry['coverage'].items():
+                        duplicate['coverage'][page] = min(1.0, duplicate['coverage'].get(page, 0.0) + share)
+                        duplicate['upright'][page] = duplicate['upright'].get(page, True) and entry['upright'][page]
+                        duplicate['position'][page] = min(duplicate['position'].get(page, entry['position'][page]), entry['position'][page])
+                    continue
+                entry.update(ext=ext, hash=digest)
+                if output_dir is not None:
+                    os.makedirs(output_dir, exist_ok=True)
+                    entry['path'] = os.path.join(output_dir, f"{digest[:16]}.{ext}")
+                    if not os.path.exists(entry['path']):
+                        with open(entry['path'], "wb") as f:
+                            f.write(data)
+                else:
+                    entry['data'] = data
+                by_hash[digest] = entry
+                images.append(entry)
             
-            return image_paths
+            get_metrics().increment('document_images_total', len(images), kind='distinct')
+            get_metrics().increment('document_images_total', len(extracted) - len(images), kind='duplicate')
+            images.sort(key=lambda image: (image['pages'][0], image['xref']))
+            return images
         except Exception as e:
-            return f"Error extracting images from PDF: {str(e)}" 
\ No newline at end of file
+            return f"Error extracting images from PDF: {str(e)}"
+    
+    def ocr_scanned_pages(self, pdf_path, page_indices):
+        """OCR pages without a text layer from their embedded images.
+
+        Each distinct image is OCR'd once at its native resolution and its
+        text is placed on the first page showing it, so a logo repeated on
+        every page is neither OCR'd nor reported 40 times; a page's texts
+        follow the layout, top to bottom. Pages without images of their own
+        covering most of the page, with rotated pages or images, or whose
+        images cannot be decoded, are rasterized and OCR'd whole as before.
+        """
+        images = self.extract_images_from_pdf(pdf_path, pages=page_indices) if PYMUPDF_AVAILABLE else []
+        if isinstance(images, str):
+            images = []
+        
+        coverage = {}
+        rotated = set()
+        for image in images:
+            rotated.update(page for page, upright in image['upright'].items() if not upright)
+            # An image on several pages is a letterhead or logo, not the page's content
+            if len(image['pages']) > 1:
+                continue
+            for page, share in image['coverage'].items():
+                coverage[page] = coverage.get(page, 0.0) + share
+        covered = {page for page, share in coverage.items() if share >= MIN_IMAGE_COVERAGE and page not in rotated}
+        # Each image's text goes on the first covered page showing it
+        placed = []
+        for image in images:
+            pages = [page for page in image['pages'] if page in covered]
+            if pages:
+                placed.append((image, pages))
+        
+        image_results = ocr.ocr_images([(image['data'], image['dpi']) for image, _ in placed], self.max_workers)
+        page_results = {page: {'page': page, 'parts': [], 'confidences': [], 'seconds': 0.0} for page in covered}
+        for (image, pages), result in zip(placed, image_results):
+            if result is None:
+                # Undecodable on one page means rasterizing every page it is on
+                covered.difference_update(pages)
+                continue
+            page = page_results[pages[0]]
+            page['parts'].append((image['position'][pages[0]], result['text']))
+            page['confidences'].append(result['confidence'])
+            page['seconds'] += result['seconds']
+        
+        results = []
+        for page in covered:
+            # Pages whose images all appeared on earlier pages have no text of their own
+            confidences = page_results[page]['confidences']
+            results.append({
+                'page': page,
+                'text': "\n".join(text for _, text in sorted(page_results[page]['parts']) if text),
+                'confidence': round(sum(confidences) / len(confidences), 1) if confidences else 0.0,
+                'seconds': round(page_results[page]['seconds'], 3)
+            })
+        fallback = [index for index in page_indices if index + 1 not in covered]
+        results.extend(ocr.ocr_pdf_pages(pdf_path, fallback, self.max_workers))
+        return sorted(results, key=lambda result: result['page']) 
\ No newline at end of file
@@ -0,0 +1,225 @@
+import re
+
+# Unit spellings mapped to (canonical unit, factor applied to the value)
+UNIT_ALIASES = {
+    'mg/dl': ('mg/dL', 1),
+    'g/dl': ('g/dL', 1),
+    'g/l': ('g/dL', 0.1),
+    'mmol/l': ('mmol/L', 1),
+    'umol/l': ('µmol/L', 1),
+    'µmol/l': ('µmol/L', 1),
+    'μmol/l': ('µmol/L', 1),
+    'u/l': ('U/L', 1),
+    'iu/l': ('U/L', 1),
+    'ng/ml': ('ng/mL', 1),
+    'ng/dl': ('ng/dL', 1),
+    'pg/ml': ('pg/mL', 1),
+    'ug/dl': ('µg/dL', 1),
+    'µg/dl': ('µg/dL', 1),
+    'mcg/dl': ('µg/dL', 1),
+    'miu/l': ('µIU/mL', 1),
+    'uiu/ml': ('µIU/mL', 1),
+    'µiu/ml': ('µIU/mL', 1),
+    'μiu/ml': ('µIU/mL', 1),
+    'miu/ml': ('mIU/mL', 1),
+    # mEq/L equals mmol/L only for monovalent ions (Na, K, Cl), so it is kept as is
+    'meq/l': ('mEq/L', 1),
+    '%': ('%', 1),
+    'fl': ('fL', 1),
+    'pg': ('pg', 1),
+    'mm/hr': ('mm/h', 1),
+    'mm/h': ('mm/h', 1),
+    '10^3/ul': ('10^3/µL', 1),
+    '10^3/µl': ('10^3/µL', 1),
+    'x10^3/ul': ('10^3/µL', 1),
+    '10^9/l': ('10^3/µL', 1),
+    'x10^9/l': ('10^3/µL', 1),
+    'thou/mm3': ('10^3/µL', 1),
+    'thou/ul': ('10^3/µL', 1),
+    '/cumm': ('10^3/µL', 0.001),
+    'cells/cumm': ('10^3/µL', 0.001),
+    '/ul': ('10^3/µL', 0.001),
+    '10^6/ul': ('10^6/µL', 1),
+    '10^6/µl': ('10^6/µL', 1),
+    'x10^6/ul': ('10^6/µL', 1),
+    '10^12/l': ('10^6/µL', 1),
+    'mill/mm3': ('10^6/µL', 1),
+    'million/cumm': ('10^6/µL', 1),
+    'mill/cumm': ('10^6/µL', 1),
+    'millions/cumm': ('10^6/µL', 1),
+    'mill/ul': ('10^6/µL', 1),
+    'lakhs/cumm': ('10^3/µL', 100),
+}
+
+# Digits grouped with commas, Western (7,500 / 1,000,000) or Indian (1,50,000)
+_GROUPED_NUMBER = r'\d{1,3}(?:,\d{2,3})*,\d{3}(?![\d,])(?:\.\d+)?'
+_GROUPED_NUMBER_RE = re.compile(_GROUPED_NUMBER)
+
+# A grouped number, or one that may use a comma as the decimal separator (7,5)
+NUMBER = rf'(?:{_GROUPED_NUMBER}|\d+(?:[.,]\d+)?)'
+
+# A value must not be glued to letters, so "HbA1c" or "B12" are not read as values
+_VALUE_RE = re.compile(rf'(?P<comparator>[<>]=?)?\s*(?<![A-Za-z0-9.,])(?P<value>{NUMBER})')
+_RANGE_RE = re.compile(rf'(?P<low>{NUMBER})\s*(?:-|–|to)\s*(?P<high>{NUMBER})')
+_BOUND_RE = re.compile(rf'(?P<op><=?|>=?|≤|≥|up to|upto|below|above)\s*(?P<bound>{NUMBER})', re.IGNORECASE)
+_UNIT_RE = re.compile(r'(?:x\s*)?(?:10\^\d+|/?[a-zA-Zµμ%][a-zA-Zµμ0-9^%]*)(?:/[a-zA-Zµμ0-9^]+)?')
+_FLAG_RE = re.compile(r'(?<!\S)\*?(H|L|HIGH|LOW)\*?(?!\S)')
+
+# Lines starting with these words are report boilerplate, not results
+_SKIP_PREFIXES = (
+    'patient', 'name', 'age', 'sex', 'gender', 'date', 'time', 'ref', 'referred', 'doctor', 'dr',
+    'page', 'sample', 'specimen', 'collected', 'received', 'reported', 'id', 'lab no', 'phone', 'tel',
+    'address', 'report', 'bill', 'reg', 'uhid', 'mrn'
+)
+
+# Bumped whenever parsing changes, so values cached by an older parser are not reused
+PARSER_VERSION = 3
+
+# At least this many parsed rows are needed before the compact table replaces the raw text
+MIN_ROWS_FOR_TABLE = 3
+
+
+def _to_float(text):
+    """Parse a number whose commas are either digit grouping or the decimal separator"""
+    if _GROUPED_NUMBER_RE.fullmatch(text):
+        return float(text.replace(',', ''))
+    return float(text.replace(',', '.'))
+
+
+def normalize_unit(unit):
+    """Return (canonical unit, value factor) for a unit spelling"""
+    if not unit:
+        return '', 1
+    key = unit.strip().lower().replace(' ', '').replace('μ', 'µ').replace('cu.mm', 'cumm').replace('/mm³', '/mm3')
+    if key in UNIT_ALIASES:
+        return UNIT_ALIASES[key]
+    return unit.strip(), 1
+
+
+def _parse_reference(text):
+    """Parse a reference range; return (low, high, original text) or None"""
+    match = _RANGE_RE.search(text)
+    if match:
+        return _to_float(match.group('low')), _to_float(match.group('high')), match.group(0)
+    match = _BOUND_RE.search(text)
+    if match:
+        bound = _to_float(match.group('bound'))
+        op = match.group('op').lower()
+        if op in ('<', '<=', '≤', 'up to', 'upto', 'below'):
+            return None, bound, match.group(0)
+        return bound, None, match.group(0)
+    return None
+
+
+def parse_line(line):
+    """Parse one 'analyte value unit reference' line into a result row, or None"""
+    line = " ".join(line.replace('\t', ' ').split())
+    if not line or line.lower().startswith(_SKIP_PREFIXES):
+        return None
+
+    # Analyte names may start with a number ("25-OH Vitamin D"), so the value
+    # is the first number with a name in front of it. Names can be a single
+    # letter ("K", "T3"); like every row they still need a unit or range below
+    for value_match in _VALUE_RE.finditer(line):
+        analyte = line[:value_match.start()].strip(" :.-|")
+        if re.search(r'[A-Za-z]', analyte):
+            break
+    else:
+        return None
+    if len(analyte) > 60:
+        return None
+
+    rest = line[value_match.end():]
+    reference = _parse_reference(rest)
+    before_reference = rest[:rest.find(reference[2])] if reference else rest
+
+    printed_flag = None
+    flag_match = _FLAG_RE.search(before_reference)
+    if flag_match:
+        printed_flag = flag_match.group(1)[0]
+        before_reference = before_reference[:flag_match.start()] + before_reference[flag_match.end():]
+
+    unit_match = _UNIT_RE.search(before_reference.strip(" ()[]|"))
+    raw_unit = unit_match.group(0) if unit_match else ''
+    unit, factor = normalize_unit(raw_unit)
+
+    # Without a reference range or a recognised unit the line is much more
+    # likely to be boilerplate ("Page 1 of 3") than a result
+    if reference is None and raw_unit.strip().lower().replace(' ', '') not in UNIT_ALIASES:
+        return None
+
+    value = _to_float(value_match.group('value')) * factor
+    low = high = None
+    if reference:
+        low = reference[0] * factor if reference[0] is not None else None
+        high = reference[1] * factor if reference[1] is not None else None
+        # An inverted range means the numbers were misread
+        if low is not None and high is not None and low > high:
+            return None
+
+    return {
+        'analyte': analyte,
+        'value': round(value, 4),
+        'comparator': value_match.group('comparator') or '',
+        'unit': unit,
+        'low': low,
+        'high': high,
+        'flag': _flag(value, low, high, printed_flag)
+    }
+
+
+def _flag(value, low, high, printed_flag=None):
+    """Deterministically flag a value against its reference range"""
+    if low is not None and value < low:
+        return 'L'
+    if high is not None and value > high:
+        return 'H'
+    if low is None and high is None and printed_flag:
+        return printed_flag
+    return ''
+
+
+def parse_lab_values(text, table_rows=None):
+    """Extract lab result rows from report text and optional table rows"""
+    lines = [" ".join(cell or '' for cell in row) for row in (table_rows or [])]
+    lines.extend(text.splitlines())
+
+    results = []
+    seen = set()
+    for line in lines:
+        row = parse_line(line)
+        if row is None:
+            continue
+        key = (row['analyte'].lower(), row['value'])
+        if key in seen:
+            continue
+        seen.add(key)
+        results.append(row)
+    return results
+
+
+def format_reference(row):
+    """Human readable reference range of a row"""
+    if row['low'] is not None and row['high'] is not None:
+        return f"{row['low']:g}-{row['high']:g}"
+    if row['high'] is not None:
+        return f"<{row['high']:g}"
+    if row['low'] is not None:
+        return f">{row['low']:g}"
+    return ""
+
+
+def format_lab_table(rows):
+    """Compact pipe-separated table of parsed results for the model prompt"""
+    lines = ["Analyte | Value | Unit | Reference | Flag"]
+    for row in rows:
+        lines.append(
+            f"{row['analyte']} | {row['comparator']}{row['value']:g} | {row['unit']} | "
+            f"{format_reference(row)} | {row['flag']}"
+        )
+    return "\n".join(lines)
+
+
+def out_of_range(rows):
+    """Rows flagged as high or low"""
+    return [row for row in rows if row['flag'] in ('H', 'L')]
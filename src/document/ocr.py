@@ -0,0 +1,186 @@
+import functools
+import io
+import os
+import time
+from src.utils.process_pool import SharedProcessPool
+
+# Resolution OCR works best at; larger scans are downscaled to it
+TARGET_DPI = 300
+
+# Resolution assumed for images that carry no DPI metadata
+DEFAULT_SOURCE_DPI = 300
+
+# Upper bound on the long side of an image handed to Tesseract
+MAX_IMAGE_SIDE = 4000
+
+# PDF pages with fewer extracted characters than this are treated as scanned
+MIN_TEXT_LAYER_CHARS = 20
+
+# The bounded process pool shared by all OCR work
+_ocr_pool = SharedProcessPool()
+
+
+@functools.lru_cache(maxsize=1)
+def tesseract_available():
+    """Whether Tesseract is installed; checked once per process"""
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+def needs_ocr(text):
+    """Whether extracted page text is too sparse to be a real text layer"""
+    return len(text.strip()) < MIN_TEXT_LAYER_CHARS
+
+
+def _otsu_threshold(histogram):
+    """Grey level that best separates a 256-bin histogram into two classes"""
+    total = sum(histogram)
+    weighted_total = sum(level * count for level, count in enumerate(histogram))
+    background_count = 0
+    background_sum = 0
+    best_threshold = 127
+    best_variance = 0.0
+    for level, count in enumerate(histogram):
+        background_count += count
+        if background_count == 0:
+            continue
+        foreground_count = total - background_count
+        if foreground_count == 0:
+            break
+        background_sum += level * count
+        background_mean = background_sum / background_count
+        foreground_mean = (weighted_total - background_sum) / foreground_count
+        variance = background_count * foreground_count * (background_mean - foreground_mean) ** 2
+        if variance > best_variance:
+            best_variance = variance
+            best_threshold = level
+    return best_threshold
+
+
+def preprocess_image(image, source_dpi=None, target_dpi=TARGET_DPI):
+    """Downscale an image to the target DPI and binarize it for OCR"""
+    from PIL import Image
+
+    if source_dpi is None:
+        dpi = image.info.get('dpi')
+        source_dpi = dpi[0] if dpi and dpi[0] else DEFAULT_SOURCE_DPI
+
+    image = image.convert('L')
+    scale = min(1.0, target_dpi / source_dpi, MAX_IMAGE_SIDE / max(image.size))
+    if scale < 1.0:
+        size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+        image = image.resize(size, Image.LANCZOS)
+
+    threshold = _otsu_threshold(image.histogram())
+    return image.point(lambda level: 255 if level > threshold else 0, mode='1')
+
+
+def ocr_image(image, source_dpi=None):
+    """OCR a PIL image; return a dict with text, mean word confidence and timing"""
+    import pytesseract
+
+    start = time.perf_counter()
+    prepared = preprocess_image(image, source_dpi=source_dpi)
+    data = pytesseract.image_to_data(prepared, output_type=pytesseract.Output.DICT)
+
+    lines = {}
+    confidences = []
+    for index, word in enumerate(data['text']):
+        if not word.strip():
+            continue
+        key = (data['block_num'][index], data['par_num'][index], data['line_num'][index])
+        lines.setdefault(key, []).append(word)
+        confidence = float(data['conf'][index])
+        if confidence >= 0:
+            confidences.append(confidence)
+
+    return {
+        'text': "\n".join(" ".join(words) for words in lines.values()),
+        'confidence': round(sum(confidences) / len(confidences), 1) if confidences else 0.0,
+        'seconds': round(time.perf_counter() - start, 3)
+    }
+
+
+def ocr_image_file(image_path):
+    """OCR an image file"""
+    from PIL import Image
+
+    with Image.open(image_path) as image:
+        image.load()
+        return ocr_image(image)
+
+
+def ocr_image_bytes(data, source_dpi=None):
+    """OCR an encoded image (PNG, JPEG, ...) held in memory; runs in worker processes"""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        return ocr_image(image, source_dpi=source_dpi)
+
+
+def _rasterize_pdf_page(pdf_path, index, dpi):
+    """Render one PDF page to a PIL image"""
+    from PIL import Image
+
+    try:
+        import fitz
+    except ImportError:
+        import pdfplumber
+        with pdfplumber.open(pdf_path) as pdf:
+            return pdf.pages[index].to_image(resolution=dpi).original.copy()
+
+    with fitz.open(pdf_path) as pdf:
+        pixmap = pdf[index].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+        return Image.frombytes('L', (pixmap.width, pixmap.height), pixmap.samples)
+
+
+def ocr_pdf_page(pdf_path, index, dpi=TARGET_DPI):
+    """Rasterize and OCR one PDF page; runs in worker processes"""
+    start = time.perf_counter()
+    image = _rasterize_pdf_page(pdf_path, index, dpi)
+    result = ocr_image(image, source_dpi=dpi)
+    result['page'] = index + 1
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def ocr_pdf_pages(pdf_path, page_indices, max_workers=None):
+    """OCR several PDF pages in parallel; return their results in page order"""
+    if not page_indices:
+        return []
+    if len(page_indices) == 1 or max_workers == 1:
+        return [ocr_pdf_page(pdf_path, index) for index in page_indices]
+
+    done = _ocr_pool.iter_done(
+        max_workers or min(4, os.cpu_count() or 1),
+        ocr_pdf_page,
+        [(pdf_path, index) for index in page_indices]
+    )
+    return [future.result() for future in done]
+
+
+def ocr_images(images, max_workers=None):
+    """OCR several in-memory images given as (data, source_dpi) pairs, in parallel.
+
+    Returns the results in order, with None for images that could not be
+    decoded (e.g. JBIG2 scans PIL cannot open).
+    """
+    if not images:
+        return []
+    if len(images) == 1 or max_workers == 1:
+        futures = None
+    else:
+        futures = list(_ocr_pool.iter_done(max_workers or min(4, os.cpu_count() or 1), ocr_image_bytes, images))
+
+    results = []
+    for index, (data, dpi) in enumerate(images):
+        try:
+            results.append(futures[index].result() if futures else ocr_image_bytes(data, dpi))
+        except Exception:
+            results.append(None)
+    return results
@@ -0,0 +1,64 @@
+import os
+from src.document.lab_parser import parse_lab_values
+from src.services.services import get_chatbot, get_document_cache, get_document_processor
+
+
+def extract_report(file_path, processor=None):
+    """Extract a report's text and parse its lab values; returns {'text', 'lab_values', 'error'}"""
+    processor = processor if processor is not None else get_document_processor()
+    result = processor.process_document_detailed(file_path)
+    if result['error']:
+        return {'text': None, 'lab_values': [], 'error': result['text']}
+    table_rows = []
+    if os.path.splitext(file_path)[1].lower() == '.pdf':
+        table_rows = processor.extract_table_rows(file_path)
+    return {'text': result['text'], 'lab_values': parse_lab_values(result['text'], table_rows), 'error': None}
+
+
+def cached_extraction(digest):
+    """The cached text and lab values of a report, or None when it has not been extracted"""
+    document_cache = get_document_cache()
+    text = document_cache.get_text(digest)
+    lab_values = document_cache.get_lab_values(digest) if text is not None else None
+    if lab_values is None:
+        return None
+    return {'text': text, 'lab_values': lab_values, 'error': None}
+
+
+def cache_extraction(digest, extraction):
+    """Cache a successful extraction"""
+    if not extraction['error']:
+        document_cache = get_document_cache()
+        document_cache.put_text(digest, extraction['text'])
+        document_cache.put_lab_values(digest, extraction['lab_values'])
+
+
+def analyze_extraction(digest, text, lab_values):
+    """Analyze extracted report text, reusing a cached analysis; returns {'analysis', 'error'}"""
+    document_cache = get_document_cache()
+    chatbot = get_chatbot()
+    variant = chatbot.analysis_variant(lab_values)
+    analysis = document_cache.get_analysis(digest, variant)
+    if analysis is None:
+        if chatbot.is_long_report(text, lab_values):
+            # Only the merged result matters here; it is the last event
+            for event in chatbot.iter_long_report_analysis(text, lab_values=lab_values):
+                analysis = event['text']
+        else:
+            analysis = chatbot.analyze_lab_report(text, lab_values=lab_values)
+        if analysis.startswith("Error analyzing lab report"):
+            return {'analysis': None, 'error': analysis}
+        document_cache.put_analysis(digest, variant, analysis)
+    return {'analysis': analysis, 'error': None}
+
+
+def analyze_report(file_path, digest):
+    """Extract, parse and analyze a stored report, reusing every cached step"""
+    extraction = cached_extraction(digest)
+    if extraction is None:
+        extraction = extract_report(file_path)
+        if extraction['error']:
+            return {'error': extraction['error'], 'lab_values': [], 'analysis': None}
+        cache_extraction(digest, extraction)
+    result = analyze_extraction(digest, extraction['text'], extraction['lab_values'])
+    return {'error': result['error'], 'lab_values': extraction['lab_values'], 'analysis': result['analysis']}
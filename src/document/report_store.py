@@ -0,0 +1,91 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+# Uploads are copied to disk in blocks of this size, never as one buffer
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(ValueError):
+    """Raised when an upload is larger than the configured cap"""
+
+
+class ReportStore:
+    """Uploaded reports on disk, named by content hash and removed after a retention period.
+
+    The same report uploaded twice, by anyone, is stored once, and two
+    different reports never collide however they were named. Saving a report
+    again refreshes its modification time, which is what retention is
+    measured from.
+    """
+
+    def __init__(self, root='data/reports', max_upload_bytes=10 * 1024 * 1024, retention_days=30, cleanup_interval=3600):
+        self.root = root
+        self.max_upload_bytes = max_upload_bytes
+        self.retention_seconds = retention_days * 24 * 3600
+        self.cleanup_interval = cleanup_interval
+        self._last_cleanup = 0.0
+        self._lock = threading.Lock()
+
+    def save(self, source, filename):
+        """Stream a file object to disk; return (digest, path).
+
+        Raises UploadTooLarge once more than max_upload_bytes have been read.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        extension = os.path.splitext(filename)[1].lower()
+        digest = hashlib.sha256()
+        size = 0
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        fd, temp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for block in iter(lambda: source.read(CHUNK_SIZE), b""):
+                    size += len(block)
+                    if size > self.max_upload_bytes:
+                        raise UploadTooLarge(f"File is larger than the {self.max_upload_bytes // (1024 * 1024)}MB upload limit")
+                    digest.update(block)
+                    f.write(block)
+            path = os.path.join(self.root, digest.hexdigest() + extension)
+            if os.path.exists(path):
+                os.remove(temp_path)
+                os.utime(path)
+            else:
+                os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.maybe_cleanup()
+        return digest.hexdigest(), path
+
+    def maybe_cleanup(self):
+        """Run cleanup if it has not run for cleanup_interval seconds"""
+        with self._lock:
+            if time.time() - self._last_cleanup < self.cleanup_interval:
+                return 0
+            self._last_cleanup = time.time()
+        return self.cleanup()
+
+    def cleanup(self):
+        """Remove reports (and abandoned partial uploads) older than the retention period"""
+        if not os.path.isdir(self.root):
+            return 0
+        cutoff = time.time() - self.retention_seconds
+        # Partial uploads are only alive while being written
+        temp_cutoff = time.time() - 3600
+        removed = 0
+        for entry in os.scandir(self.root):
+            try:
+                if not entry.is_file():
+                    continue
+                modified = entry.stat().st_mtime
+                if modified < cutoff or (entry.name.endswith('.tmp') and modified < temp_cutoff):
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                continue
+        return removed
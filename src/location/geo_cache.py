@@ -0,0 +1,214 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+EARTH_RADIUS_METERS = 6371000
+
+
+def geohash_encode(lat, lng, precision=6):
+    """Encode a coordinate as a geohash string"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        value_range, value = (lng_range, lng) if even else (lat_range, lat)
+        middle = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            value_range[0] = middle
+        else:
+            value_range[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+def geohash_bounds(geohash):
+    """Return (min_lat, min_lng, max_lat, max_lng) of a geohash cell"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = _GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            value_range = lng_range if even else lat_range
+            middle = (value_range[0] + value_range[1]) / 2
+            if bits >> shift & 1:
+                value_range[0] = middle
+            else:
+                value_range[1] = middle
+            even = not even
+    return lat_range[0], lng_range[0], lat_range[1], lng_range[1]
+
+
+def haversine_meters(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two coordinates in meters"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = math.radians(lat2 - lat1)
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(a))
+
+
+def cell_center_and_radius(geohash):
+    """Center of a geohash cell and the distance from it to the farthest corner"""
+    min_lat, min_lng, max_lat, max_lng = geohash_bounds(geohash)
+    center_lat = (min_lat + max_lat) / 2
+    center_lng = (min_lng + max_lng) / 2
+    corner_distance = max(
+        haversine_meters(center_lat, center_lng, lat, lng)
+        for lat in (min_lat, max_lat) for lng in (min_lng, max_lng)
+    )
+    return center_lat, center_lng, corner_distance
+
+
+def normalize_address(address):
+    """Normalize an address so trivially different spellings share a cache entry"""
+    address = re.sub(r"[^\w\s]", " ", address.lower())
+    return " ".join(address.split())
+
+
+class GeoCache:
+    """Persistent geocode cache plus nearby-search results indexed by geohash cell.
+
+    A nearby search is fetched once per cell from the cell's center, with the
+    radius widened by the center-to-corner distance. Any later query point in
+    the same cell whose search circle fits inside the fetched circle is then
+    answered locally, filtered by haversine distance.
+    """
+
+    def __init__(self, db_path='data/cache/geo.db', geocode_ttl=30 * 24 * 3600, nearby_ttl=24 * 3600, precision=6):
+        self.db_path = db_path
+        self.geocode_ttl = geocode_ttl
+        self.nearby_ttl = nearby_ttl
+        self.precision = precision
+        self.geocode_hits = 0
+        self.geocode_misses = 0
+        self.nearby_hits = 0
+        self.nearby_misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS geocodes (
+                address TEXT PRIMARY KEY,
+                lat REAL NOT NULL,
+                lng REAL NOT NULL,
+                created_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS nearby_searches (
+                cell TEXT NOT NULL,
+                place_type TEXT NOT NULL,
+                keyword TEXT NOT NULL,
+                radius REAL NOT NULL,
+                center_lat REAL NOT NULL,
+                center_lng REAL NOT NULL,
+                places TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (cell, place_type, keyword, radius)
+            )"""
+        )
+        self._conn.commit()
+
+    def cell_for(self, lat, lng):
+        """Geohash cell containing a coordinate"""
+        return geohash_encode(lat, lng, self.precision)
+
+    def get_geocode(self, address):
+        """Return the cached (lat, lng) of an address, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT lat, lng FROM geocodes WHERE address = ? AND created_at >= ?",
+                (normalize_address(address), time.time() - self.geocode_ttl)
+            ).fetchone()
+            if row is None:
+                self.geocode_misses += 1
+                return None
+            self.geocode_hits += 1
+            return row[0], row[1]
+
+    def put_geocode(self, address, lat, lng):
+        """Cache the coordinates of an address"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geocodes (address, lat, lng, created_at) VALUES (?, ?, ?, ?)",
+                (normalize_address(address), lat, lng, time.time())
+            )
+            self._conn.commit()
+
+    def find_nearby(self, lat, lng, radius, place_type, keyword):
+        """Return cached places within radius of a point, or None if no fetched search covers it"""
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT radius, center_lat, center_lng, places FROM nearby_searches
+                   WHERE cell = ? AND place_type = ? AND keyword = ? AND created_at >= ?
+                   ORDER BY radius ASC""",
+                (self.cell_for(lat, lng), place_type, keyword, time.time() - self.nearby_ttl)
+            ).fetchall()
+            for fetched_radius, center_lat, center_lng, places in rows:
+                if haversine_meters(center_lat, center_lng, lat, lng) + radius <= fetched_radius:
+                    self.nearby_hits += 1
+                    return filter_places_within(json.loads(places), lat, lng, radius)
+            self.nearby_misses += 1
+            return None
+
+    def put_nearby(self, cell, place_type, keyword, center_lat, center_lng, radius, places):
+        """Cache the places returned by a nearby search fetched for a cell"""
+        with self._lock:
+            self._conn.execute(
+                """INSERT OR REPLACE INTO nearby_searches
+                   (cell, place_type, keyword, radius, center_lat, center_lng, places, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (cell, place_type, keyword, radius, center_lat, center_lng, json.dumps(places), time.time())
+            )
+            self._conn.commit()
+
+    def purge_expired(self):
+        """Delete expired geocodes and nearby searches"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("DELETE FROM geocodes WHERE created_at < ?", (now - self.geocode_ttl,))
+            self._conn.execute("DELETE FROM nearby_searches WHERE created_at < ?", (now - self.nearby_ttl,))
+            self._conn.commit()
+
+    def stats(self):
+        """Return hit/miss counters and hit rates"""
+        geocode_lookups = self.geocode_hits + self.geocode_misses
+        nearby_lookups = self.nearby_hits + self.nearby_misses
+        return {
+            'geocode_hits': self.geocode_hits,
+            'geocode_misses': self.geocode_misses,
+            'geocode_hit_rate': self.geocode_hits / geocode_lookups if geocode_lookups else 0.0,
+            'nearby_hits': self.nearby_hits,
+            'nearby_misses': self.nearby_misses,
+            'nearby_hit_rate': self.nearby_hits / nearby_lookups if nearby_lookups else 0.0
+        }
+
+
+def filter_places_within(places, lat, lng, radius):
+    """Places whose location lies within radius meters of a point"""
+    nearby = []
+    for place in places:
+        location = place.get('geometry', {}).get('location')
+        if location is None or haversine_meters(lat, lng, location['lat'], location['lng']) <= radius:
+            nearby.append(place)
+    return nearby
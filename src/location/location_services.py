@@ -1,63 +1,290 @@
-import googlemaps
+import contextvars
+import html
+import math
 import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 import json
+from src.cache.memory_cache import TTLCache
+from src.location.geo_cache import GeoCache, cell_center_and_radius, filter_places_within, geohash_encode, normalize_address
+from src.utils.metrics import get_metrics, span
+from src.utils.rate_limiter import PRIORITY_INTERACTIVE, get_rate_limiter
+
+# Largest radius the Places nearby search accepts
+MAX_PLACES_RADIUS = 50000
+
+# Most destinations a single Distance Matrix request may carry
+MAX_MATRIX_DESTINATIONS = 25
+
+PLACE_DETAIL_FIELDS = ['name', 'formatted_address', 'rating', 'opening_hours', 'website', 'formatted_phone_number']
+
+
+class LocationNotFound(Exception):
+    """Raised when an address cannot be geocoded"""
+
+
+def plain_instruction(html_instruction):
+    """Directions step text without the HTML the Directions API wraps it in"""
+    # Notes such as "Destination will be on the right" come in their own <div>
+    text = re.sub(r'<div[^>]*>', '. ', html_instruction)
+    text = html.unescape(re.sub(r'<[^>]+>', '', text))
+    return " ".join(text.split())
+
 
 class LocationServices:
-    def __init__(self):
+    def __init__(self, client=None, pool_size=20, detail_workers=8, detail_ttl=24 * 3600, geo_cache=None, use_geo_cache=True, rate_limiter=None):
         load_dotenv()
+        # Shared by every instance so the process as a whole stays within the Maps quota
+        self.rate_limiter = rate_limiter or get_rate_limiter('maps')
+        if geo_cache is None and use_geo_cache:
+            geo_cache = GeoCache()
+        self.geo_cache = geo_cache
+        self.detail_workers = detail_workers
+        self.details_cache = TTLCache(max_entries=5000, ttl_seconds=detail_ttl)
+        # Travel times are cached per origin geohash cell, so nearby origins share them
+        self.travel_time_cache = TTLCache(max_entries=20000, ttl_seconds=15 * 60)
+        # Directions follow live traffic too, so they expire as quickly
+        self.directions_cache = TTLCache(max_entries=5000, ttl_seconds=15 * 60)
+        self._executor = None
+        self._executor_lock = threading.Lock()
         self.api_key = os.getenv('GOOGLE_MAPS_API_KEY')
-        self.client = googlemaps.Client(key=self.api_key)
+        if client is None:
+            import googlemaps
+            import requests
+            
+            # One pooled HTTP session is shared by every thread using this instance
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('https://', adapter)
+            client = googlemaps.Client(key=self.api_key, requests_session=session)
+        self.client = client
+        get_metrics().register_collector('location_cache', self.cache_stats)
+    
+    def warm_up(self):
+        """Open a pooled connection to the Maps API without spending quota"""
+        session = getattr(self.client, 'session', None)
+        if session is not None:
+            session.head("https://maps.googleapis.com", timeout=5)
     
     def find_nearby_healthcare(self, location, radius=5000, type='hospital'):
         """Find nearby healthcare facilities"""
         try:
+            results = list(self.iter_nearby_healthcare(location, radius=radius, type=type))
             
-            geocode_result = self.client.geocode(location)
-            if not geocode_result:
-                return "Location not found. Please try again with a more specific address."
-            
-            
-            lat = geocode_result[0]['geometry']['location']['lat']
-            lng = geocode_result[0]['geometry']['location']['lng']
-            
-            
-            places_result = self.client.places_nearby(
+            # Keep the order Places returned, not the order details arrived in
+            results.sort(key=lambda result: result['rank'])
+            return results
+        
+        except LocationNotFound as e:
+            return str(e)
+        except Exception as e:
+            return f"Error finding healthcare facilities: {str(e)}"
+    
+    def iter_nearby_healthcare(self, location, radius=5000, type='hospital'):
+        """Yield nearby healthcare facilities as their details arrive"""
+        coordinates = self.geocode(location)
+        if coordinates is None:
+            raise LocationNotFound("Location not found. Please try again with a more specific address.")
+        lat, lng = coordinates
+        places = self.nearby_places(lat, lng, radius, type, 'healthcare')
+        # Cached details are served straight away; the rest are fetched
+        # concurrently and yielded in the order they complete
+        pending = {}
+        for rank, place in enumerate(places):
+            details = self.details_cache.get(place['place_id'])
+            if details is not None:
+                yield self._clinic_result(place, details, rank)
+            else:
+                # Run in a copy of this context so the detail calls join the caller's trace
+                future = self._get_executor().submit(
+                    contextvars.copy_context().run, self._fetch_place_details, place['place_id']
+                )
+                pending[future] = (rank, place)
+        try:
+            for future in as_completed(pending):
+                rank, place = pending[future]
+                try:
+                    details = future.result()
+                except Exception:
+                    # Fall back to what the nearby search already returned
+                    details = {'name': place.get('name'), 'formatted_address': place.get('vicinity'), 'rating': place.get('rating')}
+                yield self._clinic_result(place, details, rank)
+        finally:
+            for future in pending:
+                future.cancel()
+    
+    def geocode(self, location):
+        """Return the (lat, lng) of an address, or None if it cannot be found"""
+        if self.geo_cache is not None:
+            cached = self.geo_cache.get_geocode(location)
+            if cached is not None:
+                return cached
+        
+        geocode_result = self._call('geocode', location)
+        if not geocode_result:
+            return None
+        
+        lat = geocode_result[0]['geometry']['location']['lat']
+        lng = geocode_result[0]['geometry']['location']['lng']
+        if self.geo_cache is not None:
+            self.geo_cache.put_geocode(location, lat, lng)
+        return lat, lng
+    
+    def nearby_places(self, lat, lng, radius, type, keyword):
+        """Return the Places nearby search results around a point, served from the geohash cache when possible"""
+        if self.geo_cache is None:
+            return self._call(
+                'places_nearby',
                 location=(lat, lng),
                 radius=radius,
                 type=type,
-                keyword='healthcare'
-            )
-            
-            
-            results = []
-            for place in places_result.get('results', []):
+                keyword=keyword
+            ).get('results', [])
+        
+        cached = self.geo_cache.find_nearby(lat, lng, radius, type, keyword)
+        if cached is not None:
+            return cached
+        
+        # Search from the center of the point's cell, widened so the result
+        # covers this radius from anywhere in the cell
+        cell = self.geo_cache.cell_for(lat, lng)
+        center_lat, center_lng, corner_distance = cell_center_and_radius(cell)
+        fetch_radius = min(MAX_PLACES_RADIUS, radius + math.ceil(corner_distance))
+        places = self._call(
+            'places_nearby',
+            location=(center_lat, center_lng),
+            radius=fetch_radius,
+            type=type,
+            keyword=keyword
+        ).get('results', [])
+        self.geo_cache.put_nearby(cell, type, keyword, center_lat, center_lng, fetch_radius, places)
+        return filter_places_within(places, lat, lng, radius)
+    
+    def cache_stats(self):
+        """Hit rates of the geocode, nearby-search, place-details and travel-time caches"""
+        stats = {
+            'details': self.details_cache.stats(),
+            'travel_time': self.travel_time_cache.stats(),
+            'directions': self.directions_cache.stats()
+        }
+        if self.geo_cache is not None:
+            stats.update(self.geo_cache.stats())
+        return stats
                 
-                place_details = self.client.place(
-                    place['place_id'],
-                    fields=['name', 'formatted_address', 'rating', 'opening_hours', 'website', 'formatted_phone_number']
-                )['result']
+    def _call(self, method, *args, priority=PRIORITY_INTERACTIVE, **kwargs):
+        """Call a Maps client method once the rate limiter allows it"""
+        # googlemaps.Client already retries over-query-limit and 5xx responses
+        # with jittered backoff, so only the rate limit is applied here
+        self.rate_limiter.acquire(priority)
+        get_metrics().increment('upstream_calls_total', api='maps', method=method)
+        with span(f"maps.{method}"):
+            return getattr(self.client, method)(*args, **kwargs)
+    
+    def _get_executor(self):
+        """Return the thread pool used for place detail requests"""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.detail_workers, thread_name_prefix="place-details")
+            return self._executor
                 
-                result = {
-                    'name': place_details.get('name'),
-                    'address': place_details.get('formatted_address'),
-                    'rating': place_details.get('rating'),
-                    'phone': place_details.get('formatted_phone_number'),
-                    'website': place_details.get('website'),
-                    'opening_hours': place_details.get('opening_hours', {}).get('weekday_text', [])
-                }
-                results.append(result)
+    def _fetch_place_details(self, place_id):
+        """Fetch and cache the details of one place"""
+        details = self._call('place', place_id, fields=PLACE_DETAIL_FIELDS)['result']
+        self.details_cache.put(place_id, details)
+        return details
+    
+    def _clinic_result(self, place, place_details, rank):
+        """Build the clinic dict shown to users"""
+        location = place.get('geometry', {}).get('location', {})
+        return {
+            'name': place_details.get('name'),
+            'address': place_details.get('formatted_address'),
+            'rating': place_details.get('rating'),
+            'phone': place_details.get('formatted_phone_number'),
+            'website': place_details.get('website'),
+            'opening_hours': place_details.get('opening_hours', {}).get('weekday_text', []),
+            'place_id': place['place_id'],
+            'lat': location.get('lat'),
+            'lng': location.get('lng'),
+            'rank': rank
+        }
+    
+    def rank_by_travel_time(self, origin, clinics, mode='driving'):
+        """Sort clinics by travel time from origin using batched Distance Matrix requests"""
+        try:
+            if isinstance(origin, str):
+                origin = self.geocode(origin)
+                if origin is None:
+                    return "Location not found. Please try again with a more specific address."
+            origin_cell = geohash_encode(origin[0], origin[1], 6)
             
-            return results
+            travel_times = {}
+            missing = []
+            for clinic in clinics:
+                destination = self._matrix_destination(clinic)
+                cached = self.travel_time_cache.get((origin_cell, destination, mode))
+                if cached is not None:
+                    travel_times[destination] = cached
+                elif destination not in missing:
+                    missing.append(destination)
+            
+            for start in range(0, len(missing), MAX_MATRIX_DESTINATIONS):
+                batch = missing[start:start + MAX_MATRIX_DESTINATIONS]
+                matrix = self._call(
+                    'distance_matrix',
+                    origins=[origin],
+                    destinations=batch,
+                    mode=mode,
+                    departure_time=datetime.now()
+                )
+                for destination, element in zip(batch, matrix['rows'][0]['elements']):
+                    travel_time = None
+                    if element.get('status') == 'OK':
+                        duration = element.get('duration_in_traffic') or element['duration']
+                        travel_time = {
+                            'seconds': duration['value'],
+                            'duration': duration['text'],
+                            'distance': element['distance']['text']
+                        }
+                    # Unreachable destinations are cached too, as an empty dict
+                    self.travel_time_cache.put((origin_cell, destination, mode), travel_time or {})
+                    travel_times[destination] = travel_time or {}
+            
+            ranked = []
+            for clinic in clinics:
+                travel_time = travel_times.get(self._matrix_destination(clinic), {})
+                ranked.append(dict(
+                    clinic,
+                    travel_seconds=travel_time.get('seconds'),
+                    travel_duration=travel_time.get('duration'),
+                    travel_distance=travel_time.get('distance')
+                ))
+            ranked.sort(key=lambda clinic: (clinic['travel_seconds'] is None, clinic['travel_seconds'] or 0))
+            return ranked
         
         except Exception as e:
-            return f"Error finding healthcare facilities: {str(e)}"
+            return f"Error ranking clinics by travel time: {str(e)}"
+    
+    def _matrix_destination(self, clinic):
+        """Distance Matrix destination for a clinic: its place_id, coordinates or address"""
+        if clinic.get('place_id'):
+            return f"place_id:{clinic['place_id']}"
+        if clinic.get('lat') is not None and clinic.get('lng') is not None:
+            return f"{clinic['lat']},{clinic['lng']}"
+        return clinic['address']
     
-    def get_directions(self, origin, destination):
-        """Get directions between two locations"""
+    def get_directions(self, origin, destination, place_id=None):
+        """Get directions between two locations; cached by origin and place_id (or destination)"""
+        cache_key = (normalize_address(origin), place_id or destination)
+        cached = self.directions_cache.get(cache_key)
+        if cached is not None:
+            return cached
         try:
-            directions = self.client.directions(
+            directions = self._call(
+                'directions',
                 origin,
                 destination,
                 mode="driving",
@@ -74,16 +301,18 @@ class LocationServices:
             for leg in route['legs']:
                 for step in leg['steps']:
                     steps.append({
-                        'instruction': step['html_instructions'],
+                        'instruction': plain_instruction(step['html_instructions']),
                         'distance': step['distance']['text'],
                         'duration': step['duration']['text']
                     })
             
-            return {
+            result = {
                 'total_distance': route['legs'][0]['distance']['text'],
                 'total_duration': route['legs'][0]['duration']['text'],
                 'steps': steps
             }
+            self.directions_cache.put(cache_key, result)
+            return result
         
         except Exception as e:
             return f"Error getting directions: {str(e)}"
@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+
+# Service objects are shared by every session in the process; each one is
+# built on first use under a lock so concurrent sessions never race to
+# construct duplicates
+_instances = {}
+_instances_lock = threading.Lock()
+
+_warm_up_thread = None
+_warm_up_results = {}
+
+
+def _shared(name, factory):
+    """Return the process-wide instance for name, creating it on first use"""
+    instance = _instances.get(name)
+    if instance is None:
+        with _instances_lock:
+            instance = _instances.get(name)
+            if instance is None:
+                instance = factory()
+                _instances[name] = instance
+    return instance
+
+
+def get_chatbot():
+    """Return the shared MedicalChatbot"""
+    from src.chatbot.chatbot import MedicalChatbot
+    return _shared('chatbot', MedicalChatbot)
+
+
+def get_voice_assistant():
+    """Return the shared VoiceAssistant"""
+    from src.voice.voice_assistant import VoiceAssistant
+    return _shared('voice_assistant', VoiceAssistant)
+
+
+def get_document_processor():
+    """Return the shared DocumentProcessor"""
+    from src.document.document_processor import DocumentProcessor
+    return _shared('document_processor', DocumentProcessor)
+
+
+def get_location_services():
+    """Return the shared LocationServices"""
+    from src.location.location_services import LocationServices
+    return _shared('location_services', LocationServices)
+
+
+def get_document_cache():
+    """Return the shared DocumentCache"""
+    from src.document.document_cache import DocumentCache
+    max_bytes = int(os.getenv('DOCUMENT_CACHE_MAX_BYTES', 500 * 1024 * 1024))
+    return _shared('document_cache', lambda: DocumentCache(max_bytes=max_bytes))
+
+
+def get_report_store():
+    """Return the shared ReportStore for uploaded reports"""
+    from src.document.report_store import ReportStore
+    max_upload_bytes = int(os.getenv('MAX_UPLOAD_SIZE', 10 * 1024 * 1024))
+    retention_days = float(os.getenv('REPORT_RETENTION_DAYS', 30))
+    return _shared('report_store', lambda: ReportStore(max_upload_bytes=max_upload_bytes, retention_days=retention_days))
+
+
+def _timed_check(name, check):
+    """Run a warm-up check, recording its outcome and duration"""
+    start = time.perf_counter()
+    try:
+        check()
+        status = "ok"
+    except Exception as e:
+        status = f"error: {str(e)}"
+    _warm_up_results[name] = {
+        'status': status,
+        'seconds': round(time.perf_counter() - start, 3)
+    }
+
+
+WARM_UP_CHECKS = {
+    'gemini': lambda: get_chatbot().warm_up(),
+    'maps': lambda: get_location_services().warm_up(),
+    'tesseract': lambda: get_document_processor().warm_up(),
+    'voice': get_voice_assistant
+}
+
+# Only the chat service is warmed up by default: Chat is the landing mode,
+# and building the others would import their heavy dependencies up front
+DEFAULT_WARM_UP = ('gemini',)
+
+
+def warm_up(services=None):
+    """Build the shared services and pre-establish upstream connections.
+
+    services defaults to DEFAULT_WARM_UP; 'all' runs every check.
+    """
+    if services is None:
+        services = DEFAULT_WARM_UP
+    elif services == 'all':
+        services = WARM_UP_CHECKS
+    for name in services:
+        name = name.strip()
+        if name in WARM_UP_CHECKS:
+            _timed_check(name, WARM_UP_CHECKS[name])
+    return dict(_warm_up_results)
+
+
+def start_warm_up(services=None):
+    """Run warm_up once per process in a background thread"""
+    global _warm_up_thread
+    with _instances_lock:
+        if _warm_up_thread is None:
+            _warm_up_thread = threading.Thread(
+                target=warm_up,
+                args=(services,),
+                name="service-warm-up",
+                daemon=True
+            )
+            _warm_up_thread.start()
+    return _warm_up_thread
+
+
+def warm_up_results():
+    """Return the outcome of the warm-up checks run so far"""
+    return dict(_warm_up_results)
@@ -0,0 +1,246 @@
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within one process
+    fcntl = None
+
+
+class ChatHistoryStore:
+    """Append-only chat history, sharded into JSONL segment files per session.
+
+    Each session lives in its own directory of fixed-size segments, so an
+    append only touches the newest segment and reading the tail of a
+    conversation never parses the whole history. Every closed segment holds
+    exactly ``segment_size`` messages, which lets a message index be mapped
+    straight to its segment.
+
+    Several processes may share a store: appends hold a lock file per
+    session, and a cached message count is only trusted while the newest
+    segment is unchanged on disk.
+
+    With max_messages set, a session is compacted down to its most recent
+    max_messages once it has grown a segment beyond that. Message indices
+    stay stable: the number of messages dropped is kept in an offset file
+    and added back by count() and read_range().
+    """
+
+    def __init__(self, root='data/chats/sessions', segment_size=500, max_messages=None):
+        self.root = root
+        self.segment_size = segment_size
+        self.max_messages = max_messages
+        self._lock = threading.Lock()
+        self._session_locks = {}
+        self._counts = {}
+
+    def append(self, session_id, messages):
+        """Append messages to a session's history"""
+        if not messages:
+            return
+        with self._write_lock(session_id):
+            self._repair_torn_tail(session_id)
+            count = self._load_count(session_id)
+            remaining = list(messages)
+            while remaining:
+                segment = count // self.segment_size
+                room = self.segment_size - count % self.segment_size
+                batch, remaining = remaining[:room], remaining[room:]
+                data = "".join(json.dumps(message, ensure_ascii=False) + "\n" for message in batch)
+                self._append_bytes(self._segment_path(session_id, segment), data.encode('utf-8'))
+                count += len(batch)
+            self._remember_count(session_id, count)
+        if self.max_messages and count >= self.max_messages + self.segment_size:
+            self.compact(session_id, keep_last=self.max_messages)
+
+    def count(self, session_id):
+        """Number of messages ever stored for a session, including compacted ones"""
+        with self._session_lock(session_id):
+            return self._read_offset(session_id) + self._load_count(session_id)
+
+    def tail(self, session_id, limit):
+        """Return the most recent messages of a session, oldest first"""
+        total = self.count(session_id)
+        return self.read_range(session_id, max(0, total - limit), total)
+
+    def read_range(self, session_id, start, end):
+        """Return messages with indices in [start, end), oldest first; compacted ones are gone"""
+        with self._session_lock(session_id):
+            offset = self._read_offset(session_id)
+            start = max(start - offset, 0)
+            end = min(end - offset, self._load_count(session_id))
+            messages = []
+            if start >= end:
+                return messages
+            first_segment = start // self.segment_size
+            last_segment = (end - 1) // self.segment_size
+            for segment in range(first_segment, last_segment + 1):
+                offset = segment * self.segment_size
+                lines = self._read_segment(self._segment_path(session_id, segment))
+                lo = max(start - offset, 0)
+                hi = min(end - offset, len(lines))
+                messages.extend(json.loads(line) for line in lines[lo:hi])
+            return messages
+
+    def compact(self, session_id, keep_last=None):
+        """Rewrite a session into full segments, dropping torn lines and optionally old messages"""
+        if not os.path.isdir(self._session_dir(session_id)):
+            return 0
+        with self._write_lock(session_id):
+            directory = self._session_dir(session_id)
+            messages = []
+            stored = 0
+            for name in self._segment_names(directory):
+                for line in self._read_segment(os.path.join(directory, name)):
+                    stored += 1
+                    try:
+                        messages.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+            if keep_last is not None:
+                messages = messages[-keep_last:] if keep_last else []
+            # Later messages keep their indices however many were dropped
+            self._write_offset(session_id, self._read_offset(session_id) + stored - len(messages))
+
+            # Write the new segments next to the old ones, then swap them in
+            # one by one with atomic renames and drop any leftovers
+            old_names = set(self._segment_names(directory))
+            new_names = set()
+            for segment in range(0, len(messages), self.segment_size):
+                path = self._segment_path(session_id, segment // self.segment_size)
+                batch = messages[segment:segment + self.segment_size]
+                tmp_path = path + ".tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.writelines(json.dumps(message, ensure_ascii=False) + "\n" for message in batch)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, path)
+                new_names.add(os.path.basename(path))
+            for name in old_names - new_names:
+                os.remove(os.path.join(directory, name))
+
+            self._remember_count(session_id, len(messages))
+            return len(messages)
+
+    def import_json(self, session_id, path):
+        """Append the messages of a legacy JSON history file to a session"""
+        with open(path, 'r', encoding='utf-8') as f:
+            self.append(session_id, json.load(f))
+
+    def _session_lock(self, session_id):
+        """Return the lock serializing access to one session"""
+        with self._lock:
+            if session_id not in self._session_locks:
+                self._session_locks[session_id] = threading.Lock()
+            return self._session_locks[session_id]
+
+    @contextmanager
+    def _write_lock(self, session_id):
+        """Hold a session's lock against other threads and, where supported, other processes"""
+        with self._session_lock(session_id):
+            if fcntl is None:
+                yield
+                return
+            directory = self._session_dir(session_id)
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, '.lock'), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                yield
+
+    def _session_dir(self, session_id):
+        """Directory holding a session's segments"""
+        safe_id = re.sub(r'[^A-Za-z0-9_-]', '_', session_id)
+        return os.path.join(self.root, safe_id)
+
+    def _segment_path(self, session_id, segment):
+        """Path of a numbered segment file"""
+        return os.path.join(self._session_dir(session_id), f"segment_{segment:06d}.jsonl")
+
+    def _segment_names(self, directory):
+        """Sorted segment file names in a session directory"""
+        return sorted(name for name in os.listdir(directory) if name.endswith('.jsonl'))
+
+    def _load_count(self, session_id):
+        """Return the message count, rescanning the newest segment when another process wrote to it"""
+        cached = self._counts.get(session_id)
+        if cached is not None:
+            count, size = cached
+            segment = max(count - 1, 0) // self.segment_size
+            if (self._file_size(self._segment_path(session_id, segment)) == size
+                    and not os.path.exists(self._segment_path(session_id, segment + 1))):
+                return count
+
+        directory = self._session_dir(session_id)
+        names = self._segment_names(directory) if os.path.isdir(directory) else []
+        if not names:
+            count = 0
+        else:
+            last_path = os.path.join(directory, names[-1])
+            count = (len(names) - 1) * self.segment_size + len(self._read_segment(last_path))
+        self._remember_count(session_id, count)
+        return count
+
+    def _remember_count(self, session_id, count):
+        """Cache a count along with the size of the newest segment it was read from"""
+        segment = max(count - 1, 0) // self.segment_size
+        self._counts[session_id] = (count, self._file_size(self._segment_path(session_id, segment)))
+
+    def _read_offset(self, session_id):
+        """Number of messages dropped from the start of a session by compaction"""
+        try:
+            with open(os.path.join(self._session_dir(session_id), 'offset'), 'r') as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _write_offset(self, session_id, offset):
+        """Atomically record a session's offset; call with the write lock held"""
+        path = os.path.join(self._session_dir(session_id), 'offset')
+        with open(path + ".tmp", 'w') as f:
+            f.write(str(offset))
+        os.replace(path + ".tmp", path)
+
+    def _file_size(self, path):
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            return -1
+
+    def _repair_torn_tail(self, session_id):
+        """Truncate a partially written last line left behind by a crash; call with the write lock held"""
+        directory = self._session_dir(session_id)
+        names = self._segment_names(directory) if os.path.isdir(directory) else []
+        if not names:
+            return
+        with open(os.path.join(directory, names[-1]), 'rb+') as f:
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) != b"\n":
+                f.seek(0)
+                data = f.read()
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def _append_bytes(self, path, data):
+        """Append data with a single O_APPEND write"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            while data:
+                data = data[os.write(fd, data):]
+        finally:
+            os.close(fd)
+
+    def _read_segment(self, path):
+        """Return the complete lines of a segment file"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                # The text after the last newline is a write still in progress
+                # (or torn by a crash), never a message
+                return [line for line in f.read().split("\n")[:-1] if line]
+        except FileNotFoundError:
+            return []
@@ -0,0 +1,300 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds, in seconds, of the stage duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+logger = logging.getLogger('medical_chatbot.metrics')
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+
+
+def _label_key(labels):
+    """Hashable, ordered form of a label dict"""
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key):
+    """Prometheus label set for a label key"""
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in key) + "}"
+
+
+class Metrics:
+    """Process-wide counters, stage duration histograms and collected gauges"""
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1, **labels):
+        """Add value to a counter"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        """Record a duration in a histogram"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {'buckets': [0] * len(DURATION_BUCKETS), 'count': 0, 'sum': 0.0}
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    histogram['buckets'][index] += 1
+            histogram['count'] += 1
+            histogram['sum'] += seconds
+
+    def register_collector(self, name, collect):
+        """Export the numeric values of collect() (e.g. cache stats) as gauges prefixed with name.
+
+        A second instance registering under a taken name gets a numbered
+        prefix (name_2, name_3, ...) rather than replacing the first.
+        Returns the prefix used.
+        """
+        with self._lock:
+            prefix = name
+            number = 1
+            while prefix in self._collectors:
+                if self._collectors[prefix] == collect:
+                    return prefix
+                number += 1
+                prefix = f"{name}_{number}"
+            self._collectors[prefix] = collect
+            return prefix
+
+    def _collected_gauges(self):
+        """Call every collector and flatten the results into {gauge name: value}"""
+        with self._lock:
+            collectors = dict(self._collectors)
+        gauges = {}
+        for prefix, collect in collectors.items():
+            try:
+                values = collect()
+            except Exception:
+                continue
+            pending = [(prefix, values)]
+            while pending:
+                name, value = pending.pop()
+                if isinstance(value, dict):
+                    pending.extend((f"{name}_{key}", item) for key, item in value.items())
+                elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                    gauges[name] = value
+        return gauges
+
+    def snapshot(self):
+        """All metrics as a JSON-serializable dict"""
+        with self._lock:
+            counters = [
+                {'name': name, 'labels': dict(key), 'value': value}
+                for (name, key), value in self._counters.items()
+            ]
+            histograms = [
+                {'name': name, 'labels': dict(key), 'count': data['count'], 'sum': round(data['sum'], 6)}
+                for (name, key), data in self._histograms.items()
+            ]
+        return {'counters': counters, 'histograms': histograms, 'gauges': self._collected_gauges()}
+
+    def prometheus_text(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, dict(data, buckets=list(data['buckets']))) for key, data in self._histograms.items())
+
+        typed = set()
+        for (name, key), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_format_labels(key)} {value}")
+
+        for (name, key), data in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            for bound, count in zip(DURATION_BUCKETS, data['buckets']):
+                lines.append(f"{name}_bucket{_format_labels(key + (('le', f'{bound:g}'),))} {count}")
+            lines.append(f"{name}_bucket{_format_labels(key + (('le', '+Inf'),))} {data['count']}")
+            lines.append(f"{name}_sum{_format_labels(key)} {data['sum']:.6f}")
+            lines.append(f"{name}_count{_format_labels(key)} {data['count']}")
+
+        for name, value in sorted(self._collected_gauges().items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """Return the process-wide metrics registry"""
+    return _metrics
+
+
+class Trace:
+    """Timing breakdown of one user request: every span recorded while it is current"""
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.seconds = None
+        self.spans = []
+        self.tokens = {'prompt': 0, 'response': 0}
+
+    def add_span(self, stage, start, seconds, error=None):
+        self.spans.append({
+            'stage': stage,
+            'offset': round(start - self.started, 4),
+            'seconds': round(seconds, 4),
+            'error': error
+        })
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'seconds': round(self.seconds, 4) if self.seconds is not None else None,
+            'tokens': dict(self.tokens),
+            'spans': list(self.spans)
+        }
+
+
+def current_trace():
+    """The trace of the request being handled in this context, or None"""
+    return _current_trace.get()
+
+
+def set_current_trace(trace):
+    """Make trace current in this context, e.g. inside a task started for the request"""
+    _current_trace.set(trace)
+
+
+@contextmanager
+def start_trace(name):
+    """Trace a request; when JSON logging is on, the finished trace is logged as one line"""
+    trace = Trace(name)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        trace.seconds = time.perf_counter() - trace.started
+        _current_trace.reset(token)
+        _metrics.observe('request_duration_seconds', trace.seconds, request=name)
+        if json_logging_enabled():
+            _ensure_log_handler()
+            logger.info(json.dumps({'type': 'trace', **trace.to_dict()}))
+
+
+@contextmanager
+def span(stage):
+    """Time a stage; errors are counted by class and re-raised"""
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = type(e).__name__
+        _metrics.increment('errors_total', stage=stage, error=error)
+        raise
+    finally:
+        record_stage(stage, time.perf_counter() - start, error, start=start)
+
+
+def record_stage(stage, seconds, error=None, start=None):
+    """Record a stage timed elsewhere, e.g. from a timings dict"""
+    _metrics.observe('stage_duration_seconds', seconds, stage=stage)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(stage, start if start is not None else time.perf_counter() - seconds, seconds, error)
+
+
+def record_error(stage, error):
+    """Count an error that was handled without propagating"""
+    _metrics.increment('errors_total', stage=stage, error=type(error).__name__)
+
+
+def record_tokens(usage_metadata):
+    """Count the prompt and response tokens reported by a Gemini response"""
+    if usage_metadata is None:
+        return
+    prompt = getattr(usage_metadata, 'prompt_token_count', 0) or 0
+    response = getattr(usage_metadata, 'candidates_token_count', 0) or 0
+    _metrics.increment('gemini_tokens_total', prompt, kind='prompt')
+    _metrics.increment('gemini_tokens_total', response, kind='response')
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.tokens['prompt'] += prompt
+        trace.tokens['response'] += response
+
+
+def json_logging_enabled():
+    """Whether finished traces are written as structured JSON log lines"""
+    return os.getenv('METRICS_JSON_LOG', 'false').lower() in ('1', 'true', 'yes')
+
+
+def _ensure_log_handler():
+    """Write trace log lines to stderr unless logging was configured elsewhere"""
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] == '/metrics':
+            body = _metrics.prometheus_text().encode('utf-8')
+            content_type = 'text/plain; version=0.0.4'
+        elif self.path.split('?')[0] == '/metrics.json':
+            body = json.dumps(_metrics.snapshot()).encode('utf-8')
+            content_type = 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_error = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port, host='127.0.0.1'):
+    """Serve /metrics (Prometheus) and /metrics.json from a background thread, once per process.
+
+    Binds to localhost unless a host is given, as the endpoints have no auth.
+    If the port cannot be bound the error is logged once and None is
+    returned; later calls do not retry.
+    """
+    global _server, _server_error
+    with _server_lock:
+        if _server is None and _server_error is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as e:
+                _server_error = e
+                _ensure_log_handler()
+                logger.warning(f"Metrics server disabled: could not bind {host}:{port} ({e})")
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+        return _server
@@ -0,0 +1,75 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+def pool_context():
+    """Multiprocessing context for worker pools: forkserver where available, else spawn.
+
+    Forking a process that already runs threads (the LLM event loop, gRPC,
+    Streamlit's script threads) copies their locks in whatever state they
+    are in, and a worker can hang on one forever.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+class SharedProcessPool:
+    """A process pool shared by every thread, started on first use and replaced when it breaks.
+
+    A worker killed by the OS (out of memory, say) breaks the whole pool;
+    without replacing it every later call would fail until a restart.
+    """
+
+    def __init__(self):
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def get(self, max_workers):
+        """Return the pool, starting it with max_workers processes if needed"""
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=pool_context())
+            return self._pool
+
+    def reset(self, broken):
+        """Drop a broken pool so the next get() starts a fresh one"""
+        with self._lock:
+            if self._pool is broken:
+                self._pool = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def iter_done(self, max_workers, fn, calls):
+        """Run fn(*args) for each args in calls; yield each future in order once it is done.
+
+        If the pool breaks, the calls not yet finished are resubmitted once
+        to a fresh pool. Futures the caller never reaches are cancelled.
+        """
+        calls = list(calls)
+        pool, futures = self._submit(max_workers, fn, calls)
+        retried = False
+        index = 0
+        try:
+            while index < len(futures):
+                future = futures[index]
+                if isinstance(future.exception(), BrokenProcessPool) and not retried:
+                    retried = True
+                    self.reset(pool)
+                    pool, futures[index:] = self._submit(max_workers, fn, calls[index:])
+                    continue
+                yield future
+                index += 1
+        finally:
+            for future in futures[index:]:
+                future.cancel()
+
+    def _submit(self, max_workers, fn, calls):
+        pool = self.get(max_workers)
+        try:
+            return pool, [pool.submit(fn, *args) for args in calls]
+        except BrokenProcessPool:
+            # Broken by a worker that died during an earlier call
+            self.reset(pool)
+            pool = self.get(max_workers)
+            return pool, [pool.submit(fn, *args) for args in calls]
@@ -0,0 +1,176 @@
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from src.utils.metrics import get_metrics
+
+# Lower numbers are served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+# HTTP statuses worth retrying: rate limited or a transient server error
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a request cannot be queued or waits longer than allowed"""
+
+
+class RateLimiter:
+    """Token bucket shared by every caller of one upstream API.
+
+    Callers that find the bucket empty wait in a bounded priority queue, so
+    interactive requests are served before batch work. When the queue is
+    full, or a request would wait longer than max_wait, RateLimitExceeded is
+    raised instead of piling up more work.
+    """
+
+    def __init__(self, name, rate, burst=None, max_queue=100, max_wait=60):
+        self.name = name
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.granted = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_observed_wait = 0.0
+        self.max_observed_depth = 0
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def _refill(self, now):
+        """Add the tokens earned since the last refill"""
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, priority=PRIORITY_INTERACTIVE):
+        """Take a token, waiting behind higher priority requests; return the seconds waited"""
+        start = time.monotonic()
+        with self._condition:
+            self._refill(start)
+            if not self._waiting and self._tokens >= 1:
+                self._tokens -= 1
+                self.granted += 1
+                return 0.0
+            if len(self._waiting) >= self.max_queue:
+                self.rejected += 1
+                raise RateLimitExceeded(f"{self.name} request queue is full")
+
+            entry = (priority, next(self._sequence))
+            heapq.heappush(self._waiting, entry)
+            self.max_observed_depth = max(self.max_observed_depth, len(self._waiting))
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._waiting[0] == entry and self._tokens >= 1:
+                        self._tokens -= 1
+                        break
+                    if now - start >= self.max_wait:
+                        self.rejected += 1
+                        raise RateLimitExceeded(
+                            f"{self.name} request waited more than {self.max_wait} seconds"
+                        )
+                    next_token = max(0.0, (1 - self._tokens) / self.rate)
+                    self._condition.wait(min(next_token or 0.01, self.max_wait - (now - start)))
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                # Let the next request in line check for a token
+                self._condition.notify_all()
+
+            waited = time.monotonic() - start
+            self.granted += 1
+            self.total_wait += waited
+            self.max_observed_wait = max(self.max_observed_wait, waited)
+            return waited
+
+    def stats(self):
+        """Return queue depth, wait times and request counters"""
+        with self._condition:
+            return {
+                'queue_depth': len(self._waiting),
+                'max_queue_depth': self.max_observed_depth,
+                'granted': self.granted,
+                'rejected': self.rejected,
+                'average_wait': self.total_wait / self.granted if self.granted else 0.0,
+                'max_wait': self.max_observed_wait
+            }
+
+
+def is_retryable(error):
+    """Whether an upstream error is a rate limit or transient server failure"""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    for attribute in ('code', 'status_code'):
+        status = getattr(error, attribute, None)
+        if callable(status):
+            try:
+                status = status()
+            except Exception:
+                status = None
+        if isinstance(status, int) and status in RETRYABLE_STATUS_CODES:
+            return True
+    return '429' in str(error) or 'Resource has been exhausted' in str(error)
+
+
+def backoff_delay(attempt, base_delay=1.0, max_delay=30.0):
+    """Exponential backoff with full jitter for a zero-based retry attempt"""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+def call_with_retries(func, *args, limiter=None, priority=PRIORITY_INTERACTIVE, retries=3, **kwargs):
+    """Call func under the rate limiter, retrying retryable errors with backoff"""
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.acquire(priority)
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if attempt == retries or not is_retryable(e):
+                raise
+            time.sleep(backoff_delay(attempt))
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def _configured_rate(name):
+    """Requests per second and burst size of an upstream API, read from the environment"""
+    if name == 'gemini':
+        return float(os.getenv('GEMINI_REQUESTS_PER_MINUTE', 60)) / 60, int(os.getenv('GEMINI_BURST', 5))
+    if name == 'maps':
+        return float(os.getenv('MAPS_REQUESTS_PER_SECOND', 20)), int(os.getenv('MAPS_BURST', 20))
+    raise KeyError(f"No rate limit configured for {name}")
+
+
+def get_rate_limiter(name):
+    """Return the process-wide rate limiter for an upstream API"""
+    with _limiters_lock:
+        if name not in _limiters:
+            rate, burst = _configured_rate(name)
+            _limiters[name] = RateLimiter(
+                name,
+                rate,
+                burst=burst,
+                max_queue=int(os.getenv('RATE_LIMIT_MAX_QUEUE', 100)),
+                max_wait=float(os.getenv('RATE_LIMIT_MAX_WAIT', 60))
+            )
+        return _limiters[name]
+
+
+def rate_limiter_stats():
+    """Return the stats of every rate limiter created so far"""
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {name: limiter.stats() for name, limiter in limiters.items()}
+
+
+get_metrics().register_collector('rate_limiter', rate_limiter_stats)
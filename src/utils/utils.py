@@ -1,25 +1,108 @@
 import os
 import json
+import threading
 from datetime import datetime
+from src.utils.history_store import ChatHistoryStore
+from src.utils.metrics import span
 
-def save_chat_history(chat_history):
+# The single history file used before chats were stored per session; it is
+# imported once into LEGACY_SESSION_ID and renamed so it is not imported again.
+# The app hands that session to the first browser that opens it afterwards,
+# as the old file was the one conversation of a single-user install.
+LEGACY_HISTORY_FILE = 'data/chats/chat_history.json'
+LEGACY_SESSION_ID = 'default'
+
+_history_store = None
+_history_store_lock = threading.Lock()
+
+def get_history_store():
+    """Return the process-wide chat history store"""
+    global _history_store
+    with _history_store_lock:
+        if _history_store is None:
+            max_messages = int(os.getenv('CHAT_HISTORY_MAX_MESSAGES', 5000)) or None
+            store = ChatHistoryStore(max_messages=max_messages)
+            migrate_legacy_history(store)
+            _history_store = store
+    return _history_store
+
+def migrate_legacy_history(store, path=LEGACY_HISTORY_FILE):
+    """Import the legacy JSON history file into the store, once across processes"""
+    migrated_path = path + '.migrated'
+    try:
+        # The rename is atomic, so only one process gets to import the file
+        os.rename(path, migrated_path)
+    except FileNotFoundError:
+        return False
+    except OSError as e:
+        print(f"Error migrating chat history from {path}: {str(e)}")
+        return False
+    try:
+        store.import_json(LEGACY_SESSION_ID, migrated_path)
+        # Marks the imported session as waiting for its owner to claim it
+        open(path + '.unclaimed', 'w').close()
+    except Exception as e:
+        print(f"Error migrating chat history from {path}: {str(e)}")
+        return False
+    return True
+
+def claim_legacy_session(path=LEGACY_HISTORY_FILE):
+    """Return LEGACY_SESSION_ID to the first caller after a migration, None to everyone else"""
+    get_history_store()
+    try:
+        # Removing the marker is atomic, so only one caller can claim the session
+        os.remove(path + '.unclaimed')
+    except OSError:
+        return None
+    return LEGACY_SESSION_ID
+
+def append_chat_messages(session_id, messages):
+    """Append new messages to a session's chat history"""
+    try:
+        with span('history.append'):
+            get_history_store().append(session_id, messages)
+        return "Chat history saved successfully"
+    
+    except Exception as e:
+        return f"Error saving chat history: {str(e)}"
+
+def save_chat_history(chat_history, session_id='default'):
     """Save chat history to file"""
     try:
-        # Create chats directory if it doesn't exist
-        os.makedirs('data/chats', exist_ok=True)
-        
-        # Use a fixed filename instead of timestamp-based
-        chat_file = 'data/chats/chat_history.json'
+        # Only messages not yet in the store are written; the history is
+        # append-only, so earlier messages never need rewriting
+        store = get_history_store()
+        with span('history.append'):
+            store.append(session_id, chat_history[store.count(session_id):])
         
-        # Save to single file
-        with open(chat_file, 'w', encoding='utf-8') as f:
-            json.dump(chat_history, f, indent=4)
-        
-        return f"Chat history saved successfully: {chat_file}"
+        return "Chat history saved successfully"
     
     except Exception as e:
         return f"Error saving chat history: {str(e)}"
 
+def load_recent_chat_history(session_id, limit=50):
+    """Load the most recent messages of a session's chat history"""
+    try:
+        with span('history.load'):
+            return get_history_store().tail(session_id, limit)
+    except Exception as e:
+        return f"Error loading chat history: {str(e)}"
+
+def load_chat_history_range(session_id, start, end):
+    """Load the messages of a session's chat history with indices in [start, end)"""
+    try:
+        with span('history.load'):
+            return get_history_store().read_range(session_id, start, end)
+    except Exception as e:
+        return f"Error loading chat history: {str(e)}"
+
+def count_chat_messages(session_id):
+    """Number of messages stored for a session"""
+    try:
+        return get_history_store().count(session_id)
+    except Exception as e:
+        return f"Error loading chat history: {str(e)}"
+
 def load_chat_history(filename):
     """Load chat history from file"""
     try:
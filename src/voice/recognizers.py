@@ -0,0 +1,51 @@
+import os
+
+
+class GoogleRecognizer:
+    """Google Web Speech API; needs a network round trip per phrase"""
+
+    name = 'google'
+    offline = False
+
+    def transcribe(self, recognizer, audio):
+        return recognizer.recognize_google(audio)
+
+
+class WhisperRecognizer:
+    """Local Whisper model (needs the openai-whisper package); no network needed"""
+
+    name = 'whisper'
+    offline = True
+
+    def __init__(self, model=None):
+        self.model = model or os.getenv('WHISPER_MODEL', 'base.en')
+
+    def transcribe(self, recognizer, audio):
+        # speech_recognition keeps the loaded model on the recognizer,
+        # so only the first call pays for loading it
+        return recognizer.recognize_whisper(audio, model=self.model, language='english').strip()
+
+
+class SphinxRecognizer:
+    """CMU PocketSphinx (needs the pocketsphinx package); fast but less accurate"""
+
+    name = 'sphinx'
+    offline = True
+
+    def transcribe(self, recognizer, audio):
+        return recognizer.recognize_sphinx(audio)
+
+
+RECOGNIZER_ENGINES = {
+    'google': GoogleRecognizer,
+    'whisper': WhisperRecognizer,
+    'sphinx': SphinxRecognizer
+}
+
+
+def get_recognizer_engine(name=None):
+    """Return the speech recognizer engine for a name, defaulting to SPEECH_RECOGNIZER"""
+    name = (name or os.getenv('SPEECH_RECOGNIZER', 'google')).strip().lower()
+    if name not in RECOGNIZER_ENGINES:
+        raise ValueError(f"Unknown speech recognizer '{name}'. Choose from: {', '.join(RECOGNIZER_ENGINES)}")
+    return RECOGNIZER_ENGINES[name]()
@@ -0,0 +1,204 @@
+import contextvars
+import hashlib
+import io
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from src.utils.metrics import get_metrics, span
+
+# gTTS splits long input itself, but shorter pieces come back sooner
+MAX_SENTENCE_CHARS = 300
+
+# Sentences of one utterance being synthesized at once; the rest wait their
+# turn, so one long answer cannot take every worker from other sessions
+SENTENCES_IN_FLIGHT = 2
+
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+|\n+')
+_MARKDOWN_RE = re.compile(r'[*_#`>|]+')
+
+
+def clean_for_speech(text):
+    """Strip markdown symbols that would otherwise be read aloud"""
+    return " ".join(_MARKDOWN_RE.sub(' ', text).split())
+
+
+def split_sentences(text, max_chars=MAX_SENTENCE_CHARS):
+    """Split text into speakable sentences of at most max_chars"""
+    sentences = []
+    for piece in _SENTENCE_END_RE.split(text):
+        piece = clean_for_speech(piece)
+        while len(piece) > max_chars:
+            cut = piece.rfind(' ', 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            sentences.append(piece[:cut])
+            piece = piece[cut:].strip()
+        if piece:
+            sentences.append(piece)
+    return sentences
+
+
+class AudioCache:
+    """Thread-safe LRU cache of synthesized clips, bounded by total bytes"""
+
+    def __init__(self, max_bytes=20 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._clips = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(text, lang):
+        """Cache key of a sentence spoken in a language"""
+        return hashlib.sha256(f"{lang}\n{text}".encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return the cached clip for key, or None"""
+        with self._lock:
+            clip = self._clips.get(key)
+            if clip is None:
+                self.misses += 1
+                return None
+            self._clips.move_to_end(key)
+            self.hits += 1
+            return clip
+
+    def put(self, key, clip):
+        """Store a clip, evicting the least recently used clips beyond max_bytes"""
+        if len(clip) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._clips:
+                self.size_bytes -= len(self._clips.pop(key))
+            self._clips[key] = clip
+            self.size_bytes += len(clip)
+            while self.size_bytes > self.max_bytes:
+                _, evicted = self._clips.popitem(last=False)
+                self.size_bytes -= len(evicted)
+
+    def stats(self):
+        """Return hit/miss counters and the current size"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'clips': len(self._clips),
+            'size_bytes': self.size_bytes
+        }
+
+
+class TTSPipeline:
+    """Synthesizes speech sentence by sentence on background workers"""
+
+    def __init__(self, lang='en', cache=None, workers=2):
+        self.lang = lang
+        self.cache = cache if cache is not None else AudioCache()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tts")
+        get_metrics().register_collector('tts_cache', self.cache.stats)
+
+    def synthesize(self, sentence):
+        """Return the MP3 bytes of one sentence, from the cache when possible"""
+        key = self.cache.make_key(sentence, self.lang)
+        clip = self.cache.get(key)
+        if clip is None:
+            from gtts import gTTS
+            buffer = io.BytesIO()
+            get_metrics().increment('upstream_calls_total', api='gtts')
+            with span('tts.synthesize'):
+                gTTS(text=sentence, lang=self.lang).write_to_fp(buffer)
+            clip = buffer.getvalue()
+            self.cache.put(key, clip)
+        return clip
+
+    def start(self):
+        """Begin a new utterance that text can be fed into while it is generated"""
+        return Utterance(self)
+
+    def submit(self, sentence):
+        """Queue a sentence for synthesis and return its future"""
+        # Run in a copy of this context so synthesis time joins the caller's trace
+        return self._executor.submit(contextvars.copy_context().run, self.synthesize, sentence)
+
+
+class Utterance:
+    """One spoken response, synthesized as its sentences become complete.
+
+    Feeding the streamed response text in as it arrives means most of the
+    audio is ready by the time the text has finished streaming. At most
+    max_in_flight sentences are queued on the shared pipeline at a time.
+    """
+
+    def __init__(self, pipeline, max_in_flight=SENTENCES_IN_FLIGHT):
+        self.pipeline = pipeline
+        self.max_in_flight = max_in_flight
+        self._pending = ""
+        self._sentences = []
+        self._futures = []
+        self._in_flight = 0
+        # Number of clips already handed out by ready_clips() or clips()
+        self._taken = 0
+        # Reentrant: a future that is already done runs its callback at once
+        self._condition = threading.Condition(threading.RLock())
+
+    def feed(self, text):
+        """Add streamed text, queueing every sentence it completes"""
+        self._pending += text
+        pieces = _SENTENCE_END_RE.split(self._pending)
+        # The last piece may still be mid-sentence
+        self._pending = pieces.pop()
+        for piece in pieces:
+            self._queue(piece)
+
+    def finish(self):
+        """Queue whatever text is left after the stream ends"""
+        self._queue(self._pending)
+        self._pending = ""
+
+    def _queue(self, text):
+        with self._condition:
+            self._sentences.extend(split_sentences(text))
+            self._submit_next()
+
+    def _submit_next(self):
+        """Submit waiting sentences while there is room in this utterance's window"""
+        with self._condition:
+            while self._in_flight < self.max_in_flight and len(self._futures) < len(self._sentences):
+                future = self.pipeline.submit(self._sentences[len(self._futures)])
+                self._futures.append(future)
+                self._in_flight += 1
+                future.add_done_callback(self._sentence_done)
+            self._condition.notify_all()
+
+    def _sentence_done(self, future):
+        with self._condition:
+            self._in_flight -= 1
+            self._submit_next()
+
+    def ready_clips(self):
+        """Yield, in order, the clips not yet handed out that are ready now; never waits"""
+        while True:
+            with self._condition:
+                if self._taken >= len(self._futures) or not self._futures[self._taken].done():
+                    return
+                future = self._futures[self._taken]
+                self._taken += 1
+            yield future.result()
+
+    def clips(self):
+        """Yield the MP3 clip of each remaining sentence in order as it becomes ready"""
+        self.finish()
+        while True:
+            with self._condition:
+                if self._taken >= len(self._sentences):
+                    return
+                self._condition.wait_for(lambda: self._taken < len(self._futures))
+                future = self._futures[self._taken]
+                self._taken += 1
+            yield future.result()
+
+    def audio(self):
+        """The whole response as one MP3; MP3 frames can simply be concatenated"""
+        return b"".join(self.clips())
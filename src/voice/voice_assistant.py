@@ -1,16 +1,53 @@
-import speech_recognition as sr
-from gtts import gTTS
+import io
 import os
-import tempfile
+import threading
 import time
-import sys
-import subprocess
+from src.cache.memory_cache import TTLCache
+from src.utils.metrics import get_metrics, record_error, record_stage
+from src.voice.recognizers import get_recognizer_engine
+from src.voice.tts import AudioCache, TTSPipeline
+
+SPEECH_RECOGNITION_MISSING = "SpeechRecognition is not installed. Please install SpeechRecognition to enable voice input."
 
 class VoiceAssistant:
-    def __init__(self):
-        self.recognizer = sr.Recognizer()
+    def __init__(self, engine=None, listen_timeout=5, phrase_time_limit=15, pause_threshold=0.6, calibration_ttl=600):
+        self._recognizer = None
+        self._tts = None
+        self.engine = engine or get_recognizer_engine()
+        # Give up if no speech starts within listen_timeout, cut phrases at
+        # phrase_time_limit, and end a phrase after pause_threshold of silence
+        self.listen_timeout = listen_timeout
+        self.phrase_time_limit = phrase_time_limit
+        self.pause_threshold = pause_threshold
+        # Ambient noise levels measured per session, reused until they expire
+        self.calibrations = TTLCache(max_entries=1000, ttl_seconds=calibration_ttl)
+        get_metrics().register_collector('voice_calibration_cache', self.calibrations.stats)
         self.pyaudio_available = self._check_pyaudio()
-        os.makedirs('temp', exist_ok=True)
+        # The recognizer and microphone are shared by all sessions
+        self._listen_lock = threading.Lock()
+        self._tts_lock = threading.Lock()
+    
+    @property
+    def recognizer(self):
+        """Speech recognizer, created (and speech_recognition imported) on first use"""
+        if self._recognizer is None:
+            import speech_recognition as sr
+            recognizer = sr.Recognizer()
+            recognizer.pause_threshold = self.pause_threshold
+            recognizer.non_speaking_duration = min(recognizer.non_speaking_duration, self.pause_threshold)
+            # A calibrated threshold is kept as is rather than drifting between sessions
+            recognizer.dynamic_energy_threshold = False
+            self._recognizer = recognizer
+        return self._recognizer
+    
+    @property
+    def tts(self):
+        """Text-to-speech pipeline shared by all sessions, so its audio cache is too"""
+        with self._tts_lock:
+            if self._tts is None:
+                cache = AudioCache(max_bytes=int(os.getenv('TTS_CACHE_MAX_BYTES', 20 * 1024 * 1024)))
+                self._tts = TTSPipeline(cache=cache, workers=int(os.getenv('TTS_WORKERS', 4)))
+            return self._tts
     
     def _check_pyaudio(self):
         """Check if PyAudio is available"""
@@ -20,58 +57,129 @@ class VoiceAssistant:
         except ImportError:
             return False
     
-    def listen(self):
-        """Listen for user's voice input and convert to text"""
+    def _speech_recognition(self):
+        """Import speech_recognition, or return None if it is not installed"""
+        try:
+            import speech_recognition as sr
+            return sr
+        except ImportError:
+            return None
+    
+    def listen(self, session_id='default'):
+        """Listen for user's voice input and convert to text; return (text, error)"""
+        text, error, _ = self.listen_with_timings(session_id)
+        return text, error
+    
+    def listen_with_timings(self, session_id='default', recalibrate=False):
+        """Listen on the microphone; return (text, error, seconds spent per stage).
+
+        text is None when error is set. endpoint_estimate is not measured:
+        speech_recognition does not report when speech ended, so it is the
+        pause_threshold of silence a phrase is assumed to have ended with.
+        """
+        timings = {'calibrate': 0.0, 'capture': 0.0, 'endpoint_estimate': 0.0, 'recognize': 0.0}
         if not self.pyaudio_available:
-            return "PyAudio is not installed. Please install PyAudio to enable voice input."
+            return None, "PyAudio is not installed. Please install PyAudio to enable voice input.", timings
+        sr = self._speech_recognition()
+        if sr is None:
+            return None, SPEECH_RECOGNITION_MISSING, timings
         
         try:
-            with sr.Microphone() as source:
-                print("Listening...")
-                self.recognizer.adjust_for_ambient_noise(source)
-                audio = self.recognizer.listen(source)
+            with self._listen_lock, sr.Microphone() as source:
+                threshold = None if recalibrate else self.calibrations.get(session_id)
+                if threshold is None:
+                    start = time.perf_counter()
+                    self.recognizer.adjust_for_ambient_noise(source, duration=0.5)
+                    timings['calibrate'] = time.perf_counter() - start
+                    self.calibrations.put(session_id, self.recognizer.energy_threshold)
+                else:
+                    self.recognizer.energy_threshold = threshold
                 
-                print("Processing speech...")
-                text = self.recognizer.recognize_google(audio)
-                return text
+                print("Listening...")
+                start = time.perf_counter()
+                audio = self.recognizer.listen(
+                    source,
+                    timeout=self.listen_timeout,
+                    phrase_time_limit=self.phrase_time_limit
+                )
+                listened = time.perf_counter() - start
                 
-        except sr.RequestError as e:
-            return f"Could not request results; {str(e)}"
-        except sr.UnknownValueError:
-            return "Could not understand audio"
+            # Unless the phrase hit its time limit it presumably ended after
+            # pause_threshold of silence; that wait is the endpointing cost
+            spoken = len(audio.frame_data) / (audio.sample_rate * audio.sample_width)
+            if spoken < self.phrase_time_limit:
+                timings['endpoint_estimate'] = min(self.pause_threshold, listened)
+            timings['capture'] = listened - timings['endpoint_estimate']
+        except sr.WaitTimeoutError as e:
+            record_error('voice.capture', e)
+            return None, "No speech detected", timings
         except Exception as e:
+            record_error('voice.capture', e)
             if "pyaudio" in str(e).lower():
-                return "PyAudio is not installed. Please install PyAudio to enable voice input."
-            return f"Error: {str(e)}"
+                return None, "PyAudio is not installed. Please install PyAudio to enable voice input.", timings
+            return None, f"Error: {str(e)}", timings
+        
+        # Recognition runs outside the lock so the microphone is free for the next session
+        print("Processing speech...")
+        return self._recognize(audio, timings)
     
-    def speak(self, text):
-        """Convert text to speech and play it"""
+    def transcribe_audio(self, audio_data):
+        """Transcribe an uploaded or recorded WAV/AIFF/FLAC buffer; return (text, error, seconds per stage)"""
+        timings = {'calibrate': 0.0, 'capture': 0.0, 'endpoint_estimate': 0.0, 'recognize': 0.0}
+        sr = self._speech_recognition()
+        if sr is None:
+            return None, SPEECH_RECOGNITION_MISSING, timings
         try:
-            
-            temp_file = os.path.join('temp', 'response.mp3')
-            
-           
-            tts = gTTS(text=text, lang='en')
-            
-            
-            tts.save(temp_file)
-            
-            
-            if sys.platform.startswith('win'): 
-                os.startfile(temp_file)
-            else:
-                
-                opener = 'open' if sys.platform == 'darwin' else 'xdg-open'
-                subprocess.call([opener, temp_file])
-            
-            
-            time.sleep(len(text.split()) * 0.3)
-            
-            
-            try:
-                os.remove(None)
-            except:
-                pass
+            start = time.perf_counter()
+            if isinstance(audio_data, bytes):
+                audio_data = io.BytesIO(audio_data)
+            with sr.AudioFile(audio_data) as source:
+                audio = self.recognizer.record(source)
+            timings['capture'] = time.perf_counter() - start
+        except Exception as e:
+            record_error('voice.capture', e)
+            return None, f"Error: {str(e)}", timings
+        return self._recognize(audio, timings)
+    
+    def _recognize(self, audio, timings):
+        """Run the configured recognizer engine on captured audio"""
+        import speech_recognition as sr
+        start = time.perf_counter()
+        text, error = None, None
+        try:
+            if not self.engine.offline:
+                get_metrics().increment('upstream_calls_total', api=f"speech_{self.engine.name}")
+            text = self.engine.transcribe(self.recognizer, audio)
+        except sr.RequestError as e:
+            record_error('voice.recognize', e)
+            error = f"Could not request results; {str(e)}"
+        except sr.UnknownValueError as e:
+            record_error('voice.recognize', e)
+            error = "Could not understand audio"
+        except Exception as e:
+            record_error('voice.recognize', e)
+            error = f"Error: {str(e)}"
+        if error is None and not (text or "").strip():
+            text, error = None, "Could not understand audio"
+        timings['recognize'] = time.perf_counter() - start
+        for stage, seconds in timings.items():
+            if seconds:
+                record_stage(f"voice.{stage}", seconds)
+        return text, error, timings
+    
+    def start_speech(self):
+        """Start an utterance; feed it streamed text so synthesis overlaps generation"""
+        return self.tts.start()
+    
+    def speak(self, text=None, utterance=None):
+        """Convert text (or a fed utterance) to speech and return it as MP3 bytes"""
+        try:
+            if utterance is None:
+                utterance = self.start_speech()
+                utterance.feed(text)
+            return utterance.audio()
                 
         except Exception as e:
-            print(f"Error in text-to-speech: {str(e)}") 
\ No newline at end of file
+            record_error('tts.synthesize', e)
+            print(f"Error in text-to-speech: {str(e)}")
+            return None 
\ No newline at end of file
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the application as src.*, like app.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,23 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fakes import FakeGenerativeModel
+from src.chatbot.async_client import AsyncLLMClient
+
+
+def test_identical_prompts_in_flight_share_one_upstream_call():
+    client = AsyncLLMClient(max_concurrency=4)
+    model = FakeGenerativeModel(latency=0.3, words=5)
+    contents = [{"role": "user", "parts": ["What causes headaches?"]}]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        answers = list(pool.map(lambda _: client.generate(model, contents), range(8)))
+    assert model.calls == {'generate_content_async': 1}
+    assert len(set(answers)) == 1
+    assert client.stats()['coalesced_calls'] == 7
+
+
+def test_different_prompts_are_not_coalesced():
+    client = AsyncLLMClient(max_concurrency=4)
+    model = FakeGenerativeModel(latency=0.05, words=5)
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        list(pool.map(lambda i: client.generate(model, [{"role": "user", "parts": [f"Question {i}"]}]), range(3)))
+    assert model.calls == {'generate_content_async': 3}
@@ -0,0 +1,33 @@
+import json
+
+import pytest
+
+from src.batch.batch_analyze import OutputInUse, fcntl, load_checkpoint, lock_output
+
+
+def record(digest, status='done'):
+    return json.dumps({'hash': digest, 'status': status}) + "\n"
+
+
+def test_damaged_middle_line_is_skipped_and_kept(tmp_path):
+    output = tmp_path / 'results.jsonl'
+    content = record('a') + '{"hash": "b", "sta\n' + record('c') + record('d', 'failed')
+    output.write_text(content, encoding='utf-8')
+    assert load_checkpoint(str(output)) == {'a', 'c'}
+    assert output.read_text(encoding='utf-8') == content
+
+
+def test_torn_final_line_is_truncated(tmp_path):
+    output = tmp_path / 'results.jsonl'
+    output.write_text(record('a') + '{"hash": "b", "status": "do', encoding='utf-8')
+    assert load_checkpoint(str(output)) == {'a'}
+    assert output.read_text(encoding='utf-8') == record('a')
+
+
+@pytest.mark.skipif(fcntl is None, reason="file locks need fcntl")
+def test_second_run_cannot_lock_output(tmp_path):
+    path = tmp_path / 'results.jsonl'
+    with open(path, 'a') as first, open(path, 'a') as second:
+        lock_output(first)
+        with pytest.raises(OutputInUse):
+            lock_output(second)
@@ -0,0 +1,47 @@
+from src.chatbot.chatbot import Conversation, MedicalChatbot
+
+
+def message(role, content):
+    return {"role": role, "content": content, "timestamp": "2024-01-01 10:00:00"}
+
+
+def roles(conversation):
+    return [turn["role"] for turn in conversation.turns]
+
+
+def test_history_starting_with_assistant_is_trimmed():
+    history = [message("assistant", "Hello"), message("user", "Hi"), message("assistant", "How can I help?")]
+    assert roles(Conversation.from_history(history)) == ["user", "assistant"]
+
+
+def test_broken_pairs_are_merged_and_unanswered_question_dropped():
+    history = [
+        message("user", "I have a headache"),
+        message("user", "since yesterday"),
+        message("assistant", "How severe is it?"),
+        message("user", "Quite bad"),
+    ]
+    conversation = Conversation.from_history(history)
+    assert roles(conversation) == ["user", "assistant"]
+    assert conversation.turns[0]["content"] == "I have a headache\n\nsince yesterday"
+    contents = conversation.build_contents("Should I take ibuprofen?")
+    assert [item["role"] for item in contents] == ["user", "model", "user"]
+
+
+class FailingStream:
+    def stats(self):
+        return {}
+
+    def stream(self, model, contents, priority=None):
+        yield "Partial "
+        raise RuntimeError("connection reset")
+
+
+def test_failed_stream_is_not_recorded():
+    conversation = Conversation()
+    completed = []
+    bot = MedicalChatbot(llm_client=FailingStream(), use_cache=False)
+    text = "".join(bot.stream_response("Is 38C a fever?", conversation=conversation, on_complete=completed.append))
+    assert "I apologize" in text
+    assert completed == []
+    assert conversation.turns == []
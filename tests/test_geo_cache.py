@@ -0,0 +1,28 @@
+from benchmarks.fakes import FakeMapsClient
+from src.location.geo_cache import GeoCache, cell_center_and_radius
+from src.location.location_services import LocationServices
+from src.utils.rate_limiter import RateLimiter
+
+
+def test_point_in_fetched_cell_is_answered_locally(tmp_path):
+    client = FakeMapsClient(latency=0)
+    geo_cache = GeoCache(db_path=str(tmp_path / 'geo.db'))
+    services = LocationServices(client=client, geo_cache=geo_cache, rate_limiter=RateLimiter('maps', rate=1000))
+    lat, lng, _ = cell_center_and_radius(geo_cache.cell_for(28.6, 77.2))
+
+    first = services.nearby_places(lat, lng, 2000, 'hospital', 'healthcare')
+    # About 50 m away, so still inside the same geohash cell
+    second = services.nearby_places(lat + 0.0004, lng + 0.0004, 2000, 'hospital', 'healthcare')
+
+    assert client.calls['places_nearby'] == 1
+    assert first and second
+    assert geo_cache.stats()['nearby_hits'] == 1
+
+
+def test_directions_are_fetched_once_per_origin_and_clinic(tmp_path):
+    client = FakeMapsClient(latency=0)
+    services = LocationServices(client=client, use_geo_cache=False, rate_limiter=RateLimiter('maps', rate=1000))
+    first = services.get_directions("Connaught Place", "1 Fake Street", place_id='fake_1')
+    second = services.get_directions("connaught place ", "1 Fake Street", place_id='fake_1')
+    assert first == second
+    assert client.calls['directions'] == 1
@@ -0,0 +1,52 @@
+import json
+
+from src.utils.history_store import ChatHistoryStore
+from src.utils.utils import claim_legacy_session, migrate_legacy_history
+
+
+def messages(*contents):
+    return [{"role": "user", "content": content} for content in contents]
+
+
+def test_count_follows_appends_from_another_store(tmp_path):
+    first = ChatHistoryStore(str(tmp_path), segment_size=2)
+    second = ChatHistoryStore(str(tmp_path), segment_size=2)
+    first.append('s', messages('a'))
+    assert second.count('s') == 1
+    second.append('s', messages('b', 'c'))
+    first.append('s', messages('d'))
+    assert [m['content'] for m in first.tail('s', 10)] == ['a', 'b', 'c', 'd']
+    assert second.count('s') == 4
+
+
+def test_partial_last_line_is_not_a_message(tmp_path):
+    store = ChatHistoryStore(str(tmp_path))
+    store.append('s', messages('a'))
+    with open(store._segment_path('s', 0), 'a', encoding='utf-8') as f:
+        f.write('{"role": "us')
+    assert store.count('s') == 1
+    store.append('s', messages('b'))
+    assert [m['content'] for m in store.tail('s', 10)] == ['a', 'b']
+
+
+def test_legacy_history_is_imported_and_claimed_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    legacy = tmp_path / 'chat_history.json'
+    legacy.write_text(json.dumps(messages('old')), encoding='utf-8')
+    store = ChatHistoryStore(str(tmp_path / 'sessions'))
+    assert migrate_legacy_history(store, str(legacy))
+    assert not migrate_legacy_history(store, str(legacy))
+    assert [m['content'] for m in store.tail('default', 10)] == ['old']
+    assert claim_legacy_session(str(legacy)) == 'default'
+    assert claim_legacy_session(str(legacy)) is None
+
+
+def test_compaction_keeps_message_indices(tmp_path):
+    store = ChatHistoryStore(str(tmp_path), segment_size=2, max_messages=3)
+    store.append('s', messages('a', 'b', 'c', 'd'))
+    store.append('s', messages('e'))
+    assert store.count('s') == 5
+    assert [m['content'] for m in store.read_range('s', 0, 5)] == ['c', 'd', 'e']
+    assert [m['content'] for m in store.read_range('s', 3, 4)] == ['d']
+    store.append('s', messages('f'))
+    assert [m['content'] for m in store.tail('s', 2)] == ['e', 'f']
@@ -0,0 +1,52 @@
+from src.document.lab_parser import normalize_unit, parse_line
+
+
+def test_thousands_separator():
+    row = parse_line("Total WBC Count 7,500 cells/cumm 4,000 - 11,000")
+    assert (row['value'], row['unit'], row['low'], row['high'], row['flag']) == (7.5, '10^3/µL', 4.0, 11.0, '')
+
+
+def test_lakh_separator():
+    row = parse_line("Platelet Count 1,50,000 /cumm 1,50,000 - 4,10,000")
+    assert (row['value'], row['low'], row['high'], row['flag']) == (150.0, 150.0, 410.0, '')
+
+
+def test_thousands_separator_flags_high():
+    row = parse_line("Sodium 1,000 mmol/L 135-145")
+    assert (row['value'], row['flag']) == (1000.0, 'H')
+
+
+def test_decimal_comma():
+    row = parse_line("Hemoglobin 13,5 g/dL 13,0 - 17,0")
+    assert (row['value'], row['low'], row['high']) == (13.5, 13.0, 17.0)
+
+
+def test_inverted_range_is_rejected():
+    assert parse_line("Glucose 90 mg/dL 110 - 70") is None
+
+
+def test_meq_is_not_converted_to_mmol():
+    row = parse_line("Calcium 4.8 mEq/L 4.5 - 5.5")
+    assert (row['value'], row['unit']) == (4.8, 'mEq/L')
+
+
+def test_analyte_starting_with_a_number():
+    row = parse_line("25-OH Vitamin D 12 ng/mL 30 - 100")
+    assert (row['analyte'], row['value'], row['flag']) == ('25-OH Vitamin D', 12.0, 'L')
+
+
+def test_mill_per_cumm():
+    assert normalize_unit('mill/cumm') == ('10^6/µL', 1)
+    row = parse_line("RBC Count 4.5 mill/cumm 4.5 - 5.5")
+    assert (row['value'], row['unit']) == (4.5, '10^6/µL')
+
+
+def test_short_analyte_names():
+    row = parse_line("T3 1.2 ng/mL 0.8-2.0")
+    assert (row['analyte'], row['value'], row['flag']) == ('T3', 1.2, '')
+    row = parse_line("K 5.8 mmol/L 3.5 - 5.1")
+    assert (row['analyte'], row['flag']) == ('K', 'H')
+
+
+def test_short_name_without_unit_or_range_is_not_a_result():
+    assert parse_line("T 2 of 3") is None
@@ -0,0 +1,27 @@
+import socket
+
+from src.utils import metrics as metrics_module
+from src.utils.metrics import Metrics, start_metrics_server
+
+
+def test_second_collector_with_same_name_is_kept():
+    metrics = Metrics()
+    first = lambda: {'hits': 1}
+    assert metrics.register_collector('cache', first) == 'cache'
+    assert metrics.register_collector('cache', lambda: {'hits': 2}) == 'cache_2'
+    assert metrics.register_collector('cache', first) == 'cache'
+    assert metrics.snapshot()['gauges'] == {'cache_hits': 1, 'cache_2_hits': 2}
+
+
+def test_busy_port_disables_metrics_server_without_retrying(monkeypatch):
+    monkeypatch.setattr(metrics_module, '_server', None)
+    monkeypatch.setattr(metrics_module, '_server_error', None)
+    with socket.socket() as taken:
+        taken.bind(('127.0.0.1', 0))
+        taken.listen()
+        port = taken.getsockname()[1]
+        assert start_metrics_server(port) is None
+        error = metrics_module._server_error
+        assert isinstance(error, OSError)
+        assert start_metrics_server(port) is None
+        assert metrics_module._server_error is error
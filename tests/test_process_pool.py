@@ -0,0 +1,20 @@
+import os
+
+from src.utils.process_pool import SharedProcessPool
+
+
+def exit_once(marker, value):
+    # The first worker to run this dies, as one killed for memory would
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+        os._exit(1)
+    return value * 2
+
+
+def test_broken_pool_is_replaced_and_calls_retried(tmp_path):
+    pool = SharedProcessPool()
+    marker = str(tmp_path / 'died')
+    first = pool.get(2)
+    results = [future.result() for future in pool.iter_done(2, exit_once, [(marker, i) for i in range(4)])]
+    assert results == [0, 2, 4, 6]
+    assert pool.get(2) is not first
@@ -0,0 +1,45 @@
+import threading
+import time
+
+import pytest
+
+from src.utils.rate_limiter import PRIORITY_BATCH, PRIORITY_INTERACTIVE, RateLimiter, RateLimitExceeded
+
+
+def wait_for_queue(limiter, depth):
+    deadline = time.monotonic() + 2
+    while limiter.stats()['queue_depth'] < depth:
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def start_waiter(limiter, priority, served):
+    thread = threading.Thread(target=lambda: (limiter.acquire(priority), served.append(priority)))
+    thread.start()
+    return thread
+
+
+def test_interactive_requests_are_served_before_batch():
+    limiter = RateLimiter('test', rate=4, burst=1)
+    limiter.acquire()
+    served = []
+    threads = [start_waiter(limiter, PRIORITY_BATCH, served)]
+    wait_for_queue(limiter, 1)
+    threads.append(start_waiter(limiter, PRIORITY_INTERACTIVE, served))
+    wait_for_queue(limiter, 2)
+    for thread in threads:
+        thread.join()
+    assert served == [PRIORITY_INTERACTIVE, PRIORITY_BATCH]
+
+
+def test_full_queue_raises():
+    limiter = RateLimiter('test', rate=10, burst=1, max_queue=1)
+    limiter.acquire()
+    served = []
+    thread = start_waiter(limiter, PRIORITY_INTERACTIVE, served)
+    wait_for_queue(limiter, 1)
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire()
+    thread.join()
+    assert served == [PRIORITY_INTERACTIVE]
+    assert limiter.stats()['rejected'] == 1
@@ -0,0 +1,11 @@
+from src.cache.response_cache import normalize_prompt
+
+
+def test_case_spacing_and_trailing_punctuation_are_ignored():
+    assert normalize_prompt("  What is  HbA1c? ") == normalize_prompt("what is hba1c")
+
+
+def test_operators_signs_and_decimals_are_kept():
+    assert normalize_prompt("Is glucose <70 dangerous?") != normalize_prompt("Is glucose >70 dangerous?")
+    assert normalize_prompt("Is a temperature of -5 normal?") != normalize_prompt("Is a temperature of 5 normal?")
+    assert normalize_prompt("Is potassium 5.5 high?") != normalize_prompt("Is potassium 55 high?")